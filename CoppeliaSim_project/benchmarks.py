@@ -0,0 +1,330 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from scipy.spatial import Voronoi
+from shapely.geometry import Polygon
+
+from CoppeliaSim_project.drone import Drone
+from CoppeliaSim_project.fly_controller import FlyController, formation_distance_matrix
+from CoppeliaSim_project.grid_index import GridIndex
+from CoppeliaSim_project.headless_sim import HeadlessSim
+from CoppeliaSim_project.path_engine import BezierPath, bezier_quadratic
+from CoppeliaSim_project.quadtree_survey import QuadtreeSurvey
+from CoppeliaSim_project.sim_bridge import SimBridge
+from CoppeliaSim_project.terrain import Terrain
+from CoppeliaSim_project.tessellation import Tessellation, voronoi_regions
+from CoppeliaSim_project.visual_sensor import N_CLASSES, classify_hue, rgb_to_hue
+from WebApp.telemetry_store import TelemetryStore
+
+
+def lattice_offsets(n_drones, spacing=1.0):
+    """(X,Y) positions of n drones on a square lattice, row by row."""
+    side = int(np.ceil(np.sqrt(n_drones)))
+    index = np.arange(n_drones)
+    return np.column_stack((index % side, index // side)) * spacing
+
+
+def create_swarm(n_drones, spacing=1.0, seed=0):
+    """Create n drones on a jittered square lattice in a headless simulation."""
+    rng = np.random.default_rng(seed)
+    sim = HeadlessSim()
+    drones = [Drone(sim, drone_id=str(i + 1),
+                    starting_config=[x + rng.uniform(-0.1, 0.1), y + rng.uniform(-0.1, 0.1), 1.0])
+              for i, (x, y) in enumerate(lattice_offsets(n_drones, spacing))]
+    return sim, drones
+
+
+def lattice_distance_matrix(n_drones, spacing=1.0, dist_max=None):
+    """Desired inter-drone distances of the square lattice formation used by create_swarm."""
+    return formation_distance_matrix(lattice_offsets(n_drones, spacing), dist_max)
+
+
+def time_call(function, repeats):
+    """Return the average wall time of a call in seconds."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+def benchmark_fly_controller(sizes=(3, 30, 300), repeats=20):
+    """Measure the per-call cost of the formation control for several swarm sizes."""
+    results = []
+    for n_drones in sizes:
+        sim, drones = create_swarm(n_drones)
+        fc = FlyController(sim, drones)
+        desired_dist_matrix = lattice_distance_matrix(n_drones)
+        formation = time_call(lambda: fc.formation_control(0.0001, desired_dist_matrix, 0.1), repeats)
+        matrices = time_call(lambda: fc.update_matrices('f'), repeats)
+        results.append((n_drones, formation, matrices))
+        print(f"{n_drones:>6} drones: formation_control {formation * 1e3:9.3f} ms/call, "
+              f"update_matrices {matrices * 1e3:9.3f} ms/call")
+    return results
+
+
+def matrices_memory(fc):
+    """Return the bytes held by the controller matrices."""
+    total = 0
+    for matrix in (fc.matrix_adj, fc.matrix_norm, fc.matrix_laplacian, fc.matrix_delta,
+                   fc.matrix_interdrones_distance):
+        if hasattr(matrix, 'nnz'):
+            total += matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+        else:
+            total += matrix.nbytes
+    return total
+
+
+def benchmark_sparse_fly_controller(sizes=(300, 1000, 3000), spacing=5.0, repeats=5):
+    """Compare time and memory per formation step of the dense and the sparse controller on large swarms."""
+    results = []
+    for n_drones in sizes:
+        sim, drones = create_swarm(n_drones, spacing)
+        row = [n_drones]
+        for sparse_mode in (False, True):
+            fc = FlyController(sim, drones, sparse_mode=sparse_mode)
+            dist_max = fc.dist_max if sparse_mode else None
+            desired_dist_matrix = lattice_distance_matrix(n_drones, spacing, dist_max)
+            row.append(time_call(lambda: fc.formation_control(0.0001, desired_dist_matrix, 0.1), repeats))
+            row.append(matrices_memory(fc))
+        results.append(row)
+        print(f"{n_drones:>6} drones: dense {row[1] * 1e3:9.3f} ms/step {row[2] / 2 ** 20:8.2f} MiB, "
+              f"sparse {row[3] * 1e3:9.3f} ms/step {row[4] / 2 ** 20:8.2f} MiB")
+    return results
+
+
+def benchmark_topology_cache(sizes=(3, 300, 1000), repeats=20):
+    """
+    Time a formation Laplacian update when one drone moved between calls: rebuilt from scratch (cache cleared) or
+    patched in the rows of the moved drone.
+    """
+    results = []
+    for n_drones in sizes:
+        sim, drones = create_swarm(n_drones)
+        fc = FlyController(sim, drones)
+        fc.matrix_interdrones_distance = lattice_distance_matrix(n_drones)
+        handle = drones[-1].target_handle
+        position = sim.getObjectPosition(handle, sim.handle_world)
+        fc.update_matrices('f')
+        timings = []
+        for clear in (True, False):
+            def move_and_update():
+                position[0] += 0.01
+                sim.setObjectPosition(handle, position, sim.handle_world)
+                if clear:
+                    fc.topology_cache.clear()
+                fc.update_matrices('f')
+            timings.append(time_call(move_and_update, repeats))
+        results.append((n_drones, *timings))
+        print(f"{n_drones:>6} drones, one moved: rebuilt {timings[0] * 1e3:8.3f} ms, "
+              f"rows updated {timings[1] * 1e3:8.3f} ms")
+    return results
+
+
+def benchmark_headless_steps(n_drones=3, steps=20000):
+    """Steps per second of the headless simulator behind the SimBridge, every drone target moved at each step."""
+    sim = HeadlessSim()
+    bridge = SimBridge(sim)
+    drones = [Drone(bridge, drone_id=str(i + 1), starting_config=[i * 0.5, 0, 1]) for i in range(n_drones)]
+    bridge.step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        for drone in drones:
+            x, y, z = drone.get_position()
+            bridge.setObjectPosition(drone.target_handle, [x + 0.001, y, z], sim.handle_world)
+        bridge.step()
+    rate = steps / (time.perf_counter() - start)
+    print(f"{n_drones} drones: {rate:.0f} steps/s, {bridge.average_rpc_per_frame():.1f} bridge calls per step")
+    return rate
+
+
+def validate_virtual_sensor(n_samples=200, altitudes=(1, 2, 3), seed=0):
+    """
+    Compare the render-free virtual sensor with the rendered one over random positions of the terrain.
+
+    Returns the fraction of readings on which the two modes agree and the average time of a reading of each mode.
+    """
+    rng = np.random.default_rng(seed)
+    sim = HeadlessSim()
+    terrain = Terrain(sim)
+    width, length = terrain.get_dimensions()
+    drone = Drone(sim, drone_id='1', starting_config=[0, 0, 1])
+    agreement = []
+    timings = {'average': 0.0, 'virtual': 0.0}
+    for _ in range(n_samples):
+        position = [rng.uniform(0, width), rng.uniform(0, length), float(rng.choice(altitudes))]
+        sim.setObjectPosition(drone.handle_drone, position, sim.handle_world)
+        readings = {}
+        for mode in timings:
+            drone.sensor.mode = mode
+            start = time.perf_counter()
+            readings[mode] = drone.read_sensor()
+            timings[mode] += time.perf_counter() - start
+        agreement.append(readings['average'] == readings['virtual'])
+    rendered, virtual = timings['average'] / n_samples, timings['virtual'] / n_samples
+    print(f"Virtual sensor: {np.mean(agreement) * 100:.1f}% of {n_samples} readings equal to the rendered sensor, "
+          f"{virtual * 1e3:.3f} ms/reading against {rendered * 1e3:.3f} ms/reading")
+    return float(np.mean(agreement)), rendered, virtual
+
+
+def clip_voronoi_per_region(points, width, height):
+    """Previous Tessellation.clip_voronoi: one Polygon per bounded region, unbounded regions dropped."""
+    vor = Voronoi(points)
+    bbox = Polygon([(0, 0), (0, height), (width, height), (width, 0)])
+    regions = []
+    for region_index in vor.regions:
+        if not region_index or -1 in region_index:
+            continue
+        clipped = Polygon([vor.vertices[i] for i in region_index if i >= 0]).intersection(bbox)
+        if not clipped.is_empty:
+            regions.append(clipped)
+    return regions
+
+
+class FieldStub:
+    """Terrain stand-in with only the dimensions, for tessellation benchmarks."""
+
+    def __init__(self, width, length):
+        self.width, self.length = width, length
+
+    def get_dimensions(self):
+        return self.width, self.length
+
+
+def benchmark_voronoi(sizes=(40, 1000, 5000), size=6, repeats=5, seed=0):
+    """Compare the per-region and the bulk Voronoi clipping, then time the priority-weighted Lloyd relaxation."""
+    rng = np.random.default_rng(seed)
+    priority_matrix = rng.integers(1, 4, (size, size)).tolist()
+    results = []
+    for n_points in sizes:
+        points = rng.random((n_points, 2)) * size
+        per_region = time_call(lambda: clip_voronoi_per_region(points, size, size), repeats)
+        bulk = time_call(lambda: voronoi_regions(points, (0, 0, size, size)), repeats)
+        kept_per_region = len(clip_voronoi_per_region(points, size, size))
+        kept_bulk = len(voronoi_regions(points, (0, 0, size, size)))
+
+        tessellation = Tessellation(FieldStub(size, size), n_points, 1, priority_matrix)
+        tessellation.points = points.copy()
+        start = time.perf_counter()
+        iterations = tessellation.lloyd_relaxation()
+        lloyd = time.perf_counter() - start
+        results.append((n_points, per_region, bulk, lloyd))
+        print(f"{n_points:>6} points: per-region {per_region * 1e3:9.3f} ms ({kept_per_region} regions), "
+              f"bulk {bulk * 1e3:9.3f} ms ({kept_bulk} regions), Lloyd {lloyd * 1e3:9.1f} ms ({iterations} it.)")
+    return results
+
+
+def benchmark_quadtree_survey(sizes=(6, 32, 128), view_angle=0.785398):
+    """
+    Count the readings of the quadtree survey against one reading per cell on fields of n x n cells.
+
+    The terrain field is stretched over each field and every block reading is the exact class histogram of its
+    cells, so the result also measures the cells misclassified by accepting mixed blocks.
+    """
+    sim = HeadlessSim()
+    terrain = Terrain(sim)
+    width, length = terrain.get_dimensions()
+    results = []
+    for n in sizes:
+        grid_index = GridIndex(n, n, 1)
+        centers = grid_index.centers
+        colors = terrain.field_colors(centers[..., 0] * width / n, centers[..., 1] * length / n)
+        truth = classify_hue(rgb_to_hue(colors / 255))
+        # block altitudes scale with the field: the coarsest blocks are half the field wide
+        survey = QuadtreeSurvey(grid_index, view_angle, max_altitude=n / 4 / np.tan(view_angle / 2))
+        readings = survey.run(lambda node: np.bincount(
+            truth[node.ix:node.ix + node.nx, node.iy:node.iy + node.ny].ravel(), minlength=N_CLASSES))
+        errors = int((grid_index.results != truth).sum())
+        results.append((n, readings, errors))
+        print(f"{n:>4}x{n:<4} field: {readings:>6} readings instead of {n * n:>6} "
+              f"({readings / (n * n) * 100:5.1f}%), {errors} misclassified cells")
+    return results
+
+
+def benchmark_telemetry(calls=5000):
+    """
+    Compare the cost for the control loop of publishing the drone positions.
+
+    The file version is what set_coordinates did before the TelemetryStore: take three locks and rewrite
+    coordinates.txt at every formation sub-step.
+    """
+    locks = [threading.Lock() for _ in range(3)]
+    points = [[1.0, 2.0, 3.0], [0.5, 1.5, 2.5], [1.5, 2.5, 3.5]]
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "coordinates.txt")
+
+        def write_file():
+            with locks[0], locks[1], locks[2]:
+                with open(file_name, "w") as file:
+                    for n, point in enumerate(points):
+                        file.write(f"list{n + 1}: " + str(point) + "\n")
+
+        file_time = time_call(write_file, calls)
+    store = TelemetryStore()
+    store_time = time_call(lambda: store.write(points), calls)
+    shared_store = TelemetryStore(shared_name=f"telemetry_benchmark_{os.getpid()}")
+    shared_time = time_call(lambda: shared_store.write(points), calls)
+    shared_store.close(unlink=True)
+    print(f"publish positions: file {file_time * 1e6:8.1f} us, store {store_time * 1e6:6.2f} us, "
+          f"shared memory store {shared_time * 1e6:6.2f} us per call ({file_time / store_time:.0f}x)")
+    return file_time, store_time, shared_time
+
+
+def bezier_path_per_segment(waypoints, n=10):
+    """Reference tractor path: n samples per segment whatever its length, one segment at a time."""
+    x, y = waypoints[:, 0], waypoints[:, 1]
+    pieces = []
+    for i in range(len(x) - 1):
+        t = np.linspace(0, 1, n + 1)
+        pieces.append(np.column_stack((bezier_quadratic(t, x[i], (x[i] + x[i + 1]) / 2, x[i + 1]),
+                                       bezier_quadratic(t, y[i], (y[i] + y[i + 1]) / 2, y[i + 1]))))
+    return np.vstack(pieces)
+
+
+def benchmark_bezier_path(route_lengths=(100, 1000, 5000), segment_length=5.0, spacing=0.1, queries=10000,
+                          seed=0):
+    """
+    Build tractor paths of increasing length and query points by distance along them.
+
+    The routes are random walks with segments of about segment_length metres; the reference path has a fixed
+    number of samples per segment, the BezierPath one sample every spacing metres.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for route_length in route_lengths:
+        n_segments = int(route_length / segment_length)
+        angles = rng.uniform(0, 2 * np.pi, n_segments)
+        steps = segment_length * rng.uniform(0.2, 1.8, (n_segments, 1)) * np.column_stack((np.cos(angles),
+                                                                                            np.sin(angles)))
+        waypoints = np.vstack(([0, 0], np.cumsum(steps, axis=0)))
+        reference_time = time_call(lambda: bezier_path_per_segment(waypoints), 3)
+        build_time = time_call(lambda: BezierPath(waypoints, spacing=spacing), 3)
+        path = BezierPath(waypoints, spacing=spacing)
+        distances = rng.uniform(0, path.total_length, queries)
+        start = time.perf_counter()
+        for distance in distances:
+            path.point_at(distance)
+        query_time = (time.perf_counter() - start) / queries
+        gaps = np.diff(path.lengths)
+        results.append((route_length, reference_time, build_time, query_time))
+        print(f"{path.total_length:>8.0f} m route, {n_segments:>5} segments: "
+              f"per-segment loop {reference_time * 1e3:7.2f} ms, batched {build_time * 1e3:6.2f} ms "
+              f"({len(path)} samples, max gap {gaps.max():.3f} m), "
+              f"point by distance {query_time * 1e6:.1f} us")
+    return results
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    benchmark_fly_controller()
+    benchmark_sparse_fly_controller()
+    benchmark_topology_cache()
+    benchmark_headless_steps()
+    validate_virtual_sensor()
+    benchmark_voronoi()
+    benchmark_quadtree_survey()
+    benchmark_telemetry()
+    benchmark_bezier_path()
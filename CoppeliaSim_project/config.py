@@ -3,3 +3,31 @@ DRONE_VELOCITY = 10  # Velocity of the drone
 TOLERANCE = 0.1  # Tolerance for reaching the target
 GRID_SIZE = 1  # Size of the grid for tessellation
 N_DRONES = 3  # Number of drones in the simulation
+SIM_BACKEND = 'coppeliasim'  # Simulation backend: 'coppeliasim' (remote API) or 'headless' (NumPy kinematics)
+SUB_DIVIDER = 10  # Formation control sub-steps per frame (fixed integrator)
+ADAPTIVE_SUB_STEPS = False  # Choose the sub-step from the Laplacian spectrum and stop once the formation converged
+MAX_SUB_STEPS = 50  # Maximum formation control sub-steps per frame (adaptive integrator)
+SPARSE_FORMATION = False  # Formation control on scipy.sparse neighbour graphs, for large swarms
+SENSOR_MODE = 'average'  # Vision sensor reading: 'average' colour, per-pixel 'image' or render-free 'virtual' field
+SURVEY_MODE = 'single'  # 'single': leader senses every cell, 'swath': every drone senses a column, 'quadtree': adaptive
+PATH_PLANNER = 's_path'  # 's_path': boustrophedon, 'tsp': shortest route, 'tsp_priority': high priority cells first
+TERRAIN_CACHE_DIR = 'terrain_cache'  # generated terrain textures, keyed by the field parameters (repository root)
+TEXTURE_SIZE = 512  # side of the terrain texture in pixels
+TERRAIN_VERSION = 1  # version of the terrain generator (terrain.py), bump it when the generated field changes
+LLOYD_ITERATIONS = 0  # Priority-weighted Lloyd iterations of the Voronoi tessellation (0: random points)
+QUADTREE_HOMOGENEITY = 0.95  # Quadtree survey: minimum fraction of the dominant class to accept a block
+QUADTREE_MAX_ALTITUDE = 4.5  # Quadtree survey: altitude of the coarsest readings (below the sensor far clipping plane)
+TESSELLATION = 'grid'  # Tessellation flown by the mission: 'grid' or 'voronoi'
+TESSELLATION_PLOTS = 'background'  # Diagnostic tessellation plots: 'background' (worker process) or 'off'
+RANDOM_SEED = 42  # Seed of the random terrain and Voronoi points, set at the start of every mission (None: no seed)
+PREWARM_SIMULATION = False  # Web app: import the simulation stack in a background thread right after startup
+TELEMETRY_PUSH_HZ = 10  # Web app: maximum pushes per second of the telemetry stream to each client
+TELEMETRY_BUFFER_SIZE = 1024  # Web app: telemetry events kept for the clients, older ones are sent as a snapshot
+TELEMETRY_SNAPSHOT_INTERVAL = 0.5  # Web app: seconds between saves of coordinates.txt, off the control loop (None: off)
+TELEMETRY_SHARED_MEMORY = None  # Web app: name of a shared memory block for the drone positions, None = process memory
+RECORD_TRAJECTORY = True  # Record every frame of the mission in data/trajectories (poses, formation error, readings)
+TRAJECTORY_CHUNK_RECORDS = 4096  # Frames per chunk of the trajectory file, only one chunk is mapped in memory
+SIM_ENDPOINTS = [SIM_BACKEND]  # Mission scheduler: one worker per simulator, 'headless', 'coppeliasim' or 'host:port'
+RESULT_CACHE_MAX_ENTRIES = 256  # Web app: mission results kept by the result cache, least recently used evicted first
+TRACTOR_PATH_SPACING = 0.1  # Tractor: distance in metres between the samples of its Bezier path
+TRACTOR_LOOKAHEAD = 0.1  # Tractor: distance along the path of the next target once the current one is reached
@@ -0,0 +1,137 @@
+import logging
+
+import networkx as nx
+import numpy as np
+
+from CoppeliaSim_project.config import GRID_SIZE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def priority_at(priority_matrix, x, y, cell_size=GRID_SIZE):
+    """
+    Return the priority of the field point (x, y), x and y can be arrays of points.
+
+    The priority matrix is stored column by column along the S path, as read by Tessellation.get_grid_centers:
+    the matrix column is the field column along X, the matrix row runs along Y downwards in even columns and upwards
+    in odd ones. Points outside the matrix take the priority of the nearest cell.
+    """
+    matrix = np.asarray(priority_matrix)
+    n_rows, n_cols = matrix.shape
+    col = np.clip(np.floor_divide(x, cell_size).astype(int), 0, n_cols - 1)
+    y_index = np.clip(np.floor_divide(y, cell_size).astype(int), 0, n_rows - 1)
+    row = np.where(col % 2 == 0, n_rows - 1 - y_index, y_index)
+    return matrix[row, col]
+
+
+def center_priorities(centers, priority_matrix, cell_size=GRID_SIZE):
+    """Return the priority of every tessellation center (grid or Voronoi)."""
+    points = np.asarray(centers, dtype=float)
+    return priority_at(priority_matrix, points[:, 0], points[:, 1], cell_size)
+
+
+def flight_cost_matrix(centers, altitude_weight=1.0):
+    """
+    Cost of flying between every pair of centers.
+
+    The cost is the horizontal distance plus altitude_weight times the altitude change, so that routes which keep
+    the drones at the same height are preferred.
+    """
+    points = np.asarray(centers, dtype=float)[:, 0:3]
+    horizontal = np.linalg.norm(points[:, np.newaxis, 0:2] - points[np.newaxis, :, 0:2], axis=2)
+    vertical = np.abs(points[:, np.newaxis, 2] - points[np.newaxis, :, 2])
+    return horizontal + altitude_weight * vertical
+
+
+def two_opt(route, cost, max_passes=50):
+    """
+    Improve an open route with 2-opt moves, keeping its first node fixed.
+
+    Reversing route[i:j + 1] replaces the edges (i - 1, i) and (j, j + 1) with (i - 1, j) and (i, j + 1); the gain
+    of every j is evaluated at once for each i and the best improving move is applied.
+    """
+    route = np.array(route)
+    n = len(route)
+    if n < 4:
+        return route.tolist()
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            j = np.arange(i + 1, n)
+            before, first, last = route[i - 1], route[i], route[j]
+            after = route[np.minimum(j + 1, n - 1)]
+            # the last node has no outgoing edge in an open route
+            open_end = j == n - 1
+            removed = cost[before, first] + np.where(open_end, 0.0, cost[last, after])
+            added = cost[before, last] + np.where(open_end, 0.0, cost[first, after])
+            delta = added - removed
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                route[i:j[best] + 1] = route[i:j[best] + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return route.tolist()
+
+
+def tsp_route(cost, nodes, start):
+    """Order nodes in a short open route starting from start (greedy TSP on a networkx graph, then 2-opt)."""
+    nodes = list(nodes)
+    if len(nodes) <= 2:
+        return [start] + [node for node in nodes if node != start]
+    graph = nx.Graph()
+    for a, u in enumerate(nodes):
+        for v in nodes[a + 1:]:
+            graph.add_edge(u, v, weight=cost[u, v])
+    cycle = nx.approximation.greedy_tsp(graph, source=start)[:-1]
+    return two_opt(cycle, cost)
+
+
+def plan_coverage_route(centers, priority_matrix=None, priority_first=False, altitude_weight=1.0, start=None,
+                        cell_size=GRID_SIZE):
+    """
+    Plan the order in which the leader visits the tessellation centers.
+
+    The route minimizes the flight distance and the altitude changes (TSP heuristic with 2-opt). With priority_first
+    the cells are visited by priority level, high priority (1) first, each level starting from the cell closest to
+    the end of the previous one. start is the (x, y, z) position of the leader, the route begins at the closest
+    center. Works with any number of centers, grid or Voronoi. Returns the ordered list of centers.
+    """
+    if not centers:
+        return []
+    cost = flight_cost_matrix(centers, altitude_weight)
+    points = np.asarray(centers, dtype=float)[:, 0:3]
+    position = points[0] if start is None else np.asarray(start, dtype=float)[0:3]
+
+    if priority_first and priority_matrix is not None:
+        priorities = center_priorities(centers, priority_matrix, cell_size)
+        groups = [np.flatnonzero(priorities == level) for level in np.unique(priorities)]
+    else:
+        groups = [np.arange(len(centers))]
+
+    route = []
+    for group in groups:
+        first = group[np.argmin(np.linalg.norm(points[group] - position, axis=1))]
+        route.extend(tsp_route(cost, group, first))
+        position = points[route[-1]]
+    return [centers[i] for i in route]
+
+
+def path_length(path):
+    """Return the 3D length of a path through the given centers and its total altitude change."""
+    points = np.asarray(path, dtype=float)[:, 0:3]
+    if len(points) < 2:
+        return 0.0, 0.0
+    steps = np.diff(points, axis=0)
+    return float(np.linalg.norm(steps, axis=1).sum()), float(np.abs(steps[:, 2]).sum())
+
+
+def report_route(route, s_path):
+    """Log the planned path length against the S path and return both lengths."""
+    planned_length, planned_climb = path_length(route)
+    s_length, s_climb = path_length(s_path)
+    change = 100 * (planned_length / s_length - 1) if s_length > 0 else 0.0
+    logging.info(f"Planned route: {planned_length:.2f} m ({planned_climb:.2f} m of altitude changes), "
+                 f"S path: {s_length:.2f} m ({s_climb:.2f} m of altitude changes), {change:+.1f}% length")
+    return planned_length, s_length
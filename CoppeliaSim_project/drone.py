@@ -2,6 +2,7 @@ import os
 import numpy as np
 import logging
 
+from CoppeliaSim_project.path_engine import Trajectory
 from CoppeliaSim_project.visual_sensor import VisualSensor
 from CoppeliaSim_project.config import TOLERANCE, DRONE_VELOCITY
 
@@ -67,9 +68,9 @@ class Drone:
 
         self.posAlongPath += self.velocity * t_step
 
-        #config = self.sim.getPathInterpolatedConfig(self.path, self.pathLengths, self.posAlongPath)
-        config = self.sim.getPathInterpolatedConfig(self.path, self.pathLengths, self.posAlongPath, {'type': 'quadraticBezier', 'strength': 1.0,'forceOpen': False})
-        
+        # the path is evaluated locally (quadratic Bezier + slerp), no remote call is needed
+        config = self.trajectory.interpolate(self.posAlongPath).tolist()
+
         if config:
             if len(config) >= 3:
                 self.sim.setObjectPosition(self.target_handle, config[0:3], self.sim.handle_world)
@@ -89,7 +90,8 @@ class Drone:
         actual_pos = self.sim.getObjectPosition(self.target_handle, self.sim.handle_world)
         actual_orientation = self.sim.getObjectQuaternion(self.target_handle, self.sim.handle_world)
         self.path = actual_pos + actual_orientation + self.config_to_reach[0:3] + self.config_to_reach[3:7]
-        self.pathLengths, self.path_total_length = self.sim.getPathLengths(self.path, 7)
+        self.trajectory = Trajectory(self.path, 7)
+        self.pathLengths, self.path_total_length = self.trajectory.lengths, self.trajectory.total_length
         self.posAlongPath = 0
 
     def set_target_position(self, position):
@@ -99,6 +101,10 @@ class Drone:
     def read_sensor(self):
         return self.sensor.read_sensor()
 
+    def read_sensor_histogram(self):
+        """Return the dominant terrain class under the drone and the histogram of its pixels per class."""
+        return self.sensor.read_sensor_histogram()
+
     def get_drone_config_info(self):
         """Get the current position and orientation of the drone."""
         pos = self.sim.getObjectPosition(self.target_handle, self.sim.handle_world)
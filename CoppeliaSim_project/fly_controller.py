@@ -1,12 +1,24 @@
 import numpy as np
 import logging
 
+from scipy import sparse
+from scipy.spatial import cKDTree
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+def formation_distance_matrix(offsets, dist_max=None):
+    """Desired inter-drone distances of a formation from the (X,Y) offsets, sparse up to dist_max if it is given."""
+    offsets = np.asarray(offsets, dtype=float)
+    if dist_max is None:
+        return np.linalg.norm(offsets[:, np.newaxis, :] - offsets[np.newaxis, :, :], axis=2)
+    tree = cKDTree(offsets)
+    return tree.sparse_distance_matrix(tree, dist_max, output_type='coo_matrix').tocsr()
+
+
 class FlyController:
-    def __init__(self, sim, drones_list):
+    def __init__(self, sim, drones_list, sparse_mode=False):
         self.matrix_norm = None
         self.matrix_interdrones_distance = None
         self.matrix_laplacian = None
@@ -17,11 +29,35 @@ class FlyController:
         self.drones_list = drones_list
         self.n_drones = len(drones_list)
         self.dist_max = 17
+        # sparse mode: neighbours are the stored pairs of a sparse desired-distance matrix, matrices are scipy.sparse
+        self.sparse_mode = sparse_mode
+        self.dense_formation = None  # dense desired distances last given to formation_control in sparse mode
+        self.sparse_formation = None  # and their sparse copy, converted once
+        self.formation_error = 0
+        self.converged = False
+
+        # Laplacian data of the last topology seen by each algorithm, reused while the graph does not change
+        self.topology_cache = {}
+        self.topology_key = None
+        self.weight_tolerance = 1e-9  # adjacency weights (and drone coordinates) closer than this are unchanged
+        # moved drones whose rows are updated in place, none for small swarms where a rebuild is cheaper
+        self.incremental_drone_limit = self.n_drones // 10
+        self.cache_hits = 0
+        self.cache_incremental_updates = 0
+        self.cache_misses = 0
 
         self.initialize_matrices()
 
     def initialize_matrices(self):
         """Initialize matrices used in the controller."""
+        if self.sparse_mode:
+            self.matrix_delta = sparse.csr_matrix((self.n_drones, self.n_drones))
+            self.matrix_adj = sparse.csr_matrix((self.n_drones, self.n_drones))
+            self.matrix_laplacian = sparse.csr_matrix((self.n_drones, self.n_drones))
+            self.matrix_interdrones_distance = sparse.csr_matrix((self.n_drones, self.n_drones))
+            self.matrix_norm = sparse.csr_matrix((self.n_drones, self.n_drones))
+            self.matrix_drone_config = np.zeros((self.n_drones, 7))
+            return
         self.matrix_delta = np.zeros((self.n_drones, self.n_drones))
         self.matrix_adj = np.zeros((self.n_drones, self.n_drones))
         self.matrix_laplacian = np.zeros((self.n_drones, self.n_drones))
@@ -31,47 +67,197 @@ class FlyController:
 
     def update_matrices(self, type_of_algorithm):
         """Update the matrices based on the type of algorithm."""
-        self.reset_matrices()
+        if self.sparse_mode:
+            self.compute_sparse_matrices(type_of_algorithm)
+            return
+        self.matrix_drone_config = self.compute_drone_actual_config_matrix()
+        if self.reuse_cached_topology(type_of_algorithm):
+            return
+        self.matrix_adj = np.zeros((self.n_drones, self.n_drones))
         self.compute_adjacency_matrix(type_of_algorithm)
         self.compute_delta_matrix()
         self.compute_laplacian_matrix()
+        self.store_topology(type_of_algorithm)
 
     def reset_matrices(self):
         """Reset the matrices to zero."""
-        self.matrix_delta.fill(0)
-        self.matrix_adj.fill(0)
-        self.matrix_laplacian.fill(0)
+        self.topology_cache.clear()
+        self.matrix_delta = np.zeros((self.n_drones, self.n_drones))
+        self.matrix_adj = np.zeros((self.n_drones, self.n_drones))
+        self.matrix_laplacian = np.zeros((self.n_drones, self.n_drones))
+
+    def store_topology(self, type_of_algorithm):
+        """Remember the matrices of the algorithm and the inputs they were built from."""
+        self.topology_cache[type_of_algorithm] = {
+            'adj': self.matrix_adj,
+            'delta': self.matrix_delta,
+            'laplacian': self.matrix_laplacian,
+            'bound': None
+        }
+        if not self.sparse_mode:
+            self.topology_cache[type_of_algorithm].update({
+                'distances': np.array(self.matrix_interdrones_distance, dtype=float),
+                'config': self.matrix_drone_config.copy(),
+                'norm': self.matrix_norm
+            })
+        self.topology_key = type_of_algorithm
+
+    def reuse_cached_topology(self, type_of_algorithm):
+        """Reuse the cached matrices of the algorithm if built from the same inputs, False if they must be rebuilt."""
+        cached = self.topology_cache.get(type_of_algorithm)
+        if cached is None or not np.array_equal(cached['distances'], self.matrix_interdrones_distance):
+            self.cache_misses += 1
+            return False
+        moved = []
+        if type_of_algorithm == 'f':
+            change = np.abs(self.matrix_drone_config - cached['config']) > self.weight_tolerance
+            moved = np.flatnonzero(change.any(axis=1))
+        if len(moved) > self.incremental_drone_limit:
+            self.cache_misses += 1
+            return False
+
+        if len(moved) == 0:
+            self.cache_hits += 1
+        else:
+            self.update_moved_drones(cached, moved)
+            self.cache_incremental_updates += 1
+
+        self.matrix_adj = cached['adj']
+        self.matrix_delta = cached['delta']
+        self.matrix_laplacian = cached['laplacian']
+        if 'norm' in cached and type_of_algorithm == 'f':
+            self.matrix_norm = cached['norm']
+        self.topology_key = type_of_algorithm
+        return True
+
+    def update_moved_drones(self, cached, moved):
+        """Recompute in place the formation weights of the rows and columns of the moved drones."""
+        config = self.matrix_drone_config
+        distances = cached['distances']
+        adj, norm, laplacian = cached['adj'], cached['norm'], cached['laplacian']
+        # pairs that are allowed to communicate
+        mask = distances[moved] <= self.dist_max
+        mask[np.arange(len(moved)), moved] = False
+        diff = config[moved][:, np.newaxis, :] - config[np.newaxis, :, :]
+        norms = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+        weights = np.zeros_like(norms)
+        weights[mask] = (norms[mask] - distances[moved][mask]) / norms[mask]
+
+        # the weights are symmetric: a changed row i changes the degree of row i and of every j it links to
+        change = weights - adj[moved]
+        degree_change = change.sum(axis=0)
+        degree_change[moved] = change.sum(axis=1)
+        norm[moved] = np.where(mask, norms, norm[moved])
+        norm[:, moved] = norm[moved].T
+        adj[moved] = weights
+        adj[:, moved] = weights.T
+        cached['config'] = config.copy()
+
+        # L = (D - A - s I) / s
+        scale = self.laplacian_scale()
+        diagonal = np.diag_indices(self.n_drones)
+        cached['delta'][diagonal] += degree_change
+        laplacian[moved] = -weights / scale
+        laplacian[:, moved] = -weights.T / scale
+        laplacian[diagonal] = (cached['delta'][diagonal] - scale) / scale
+        cached['bound'] = None
+
+    def topology_cache_stats(self):
+        """Return how many Laplacian updates were served by the cache."""
+        return {
+            'hits': self.cache_hits,
+            'incremental': self.cache_incremental_updates,
+            'misses': self.cache_misses
+        }
 
     def compute_adjacency_matrix(self, type_of_algorithm):
-        """Compute the adjacency matrix based on the algorithm type."""
-        self.matrix_drone_config = self.compute_drone_actual_config_matrix()
-        for i in range(self.n_drones):
-            for j in range(self.n_drones):
-                if i != j and self.matrix_interdrones_distance[i][j] <= self.dist_max:
-                    if type_of_algorithm == 'c':
-                        self.matrix_adj[i, j] = 1
-                    elif type_of_algorithm == 'f':
-                        self.matrix_norm[i, j] = np.linalg.norm(
-                            self.matrix_drone_config[i] - self.matrix_drone_config[j])
-                        self.matrix_adj[i, j] = (self.matrix_norm[i, j] - self.matrix_interdrones_distance[i, j]) / \
-                                                self.matrix_norm[i, j]
+        """Compute the adjacency matrix based on the algorithm type, for the current matrix_drone_config."""
+        # pairs that are allowed to communicate
+        mask = self.matrix_interdrones_distance <= self.dist_max
+        np.fill_diagonal(mask, False)
+        if type_of_algorithm == 'c':
+            self.matrix_adj[mask] = 1
+        elif type_of_algorithm == 'f':
+            # pairwise distances between all the drone configurations at once
+            diff = self.matrix_drone_config[:, np.newaxis, :] - self.matrix_drone_config[np.newaxis, :, :]
+            norms = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+            self.matrix_norm[mask] = norms[mask]
+            self.matrix_adj[mask] = (norms[mask] - self.matrix_interdrones_distance[mask]) / norms[mask]
 
     def compute_delta_matrix(self):
         """Compute the delta matrix."""
-        for i in range(self.n_drones):
-            self.matrix_delta[i, i] = np.sum(self.matrix_adj[i])
+        self.matrix_delta = np.diag(self.matrix_adj.sum(axis=1))
 
     def compute_laplacian_matrix(self):
         """Compute the Laplacian matrix."""
-        self.matrix_laplacian = self.matrix_delta - self.matrix_adj
+        self.matrix_laplacian = self.scale_laplacian(self.matrix_delta - self.matrix_adj,
+                                                     np.identity(self.n_drones))
 
+    def laplacian_scale(self):
+        """Scale factor applied to the Laplacian matrix."""
         # scale the laplacian matriz to have its eigenvalues between 2 desired values
         # convergence speed is directly proportional to the min eigenvalue value
         min_eig = -0.1 * 10 ** (-5)
         max_eig = -min_eig
-        matrix_lap_scaled = (self.matrix_laplacian - ((max_eig - min_eig) / 2 * np.identity(3))) / (
-                    (max_eig - min_eig) / 2)
-        self.matrix_laplacian = matrix_lap_scaled
+        return (max_eig - min_eig) / 2
+
+    def scale_laplacian(self, matrix_laplacian, identity):
+        """Scale the Laplacian matrix (dense or sparse) given an identity matrix of the same kind."""
+        scale = self.laplacian_scale()
+        return (matrix_laplacian - scale * identity) / scale
+
+    def compute_sparse_matrices(self, type_of_algorithm):
+        """Sparse matrices of the algorithm over the pairs with a desired distance up to dist_max."""
+        n = self.n_drones
+        self.matrix_drone_config = self.compute_drone_actual_config_matrix()
+        distances = self.matrix_interdrones_distance.tocoo()
+        keep = (distances.row != distances.col) & (distances.data <= self.dist_max)
+        rows, cols, desired = distances.row[keep], distances.col[keep], distances.data[keep]
+
+        if type_of_algorithm == 'c':
+            weights = np.ones(len(rows))
+        elif type_of_algorithm == 'f':
+            diff = self.matrix_drone_config[rows] - self.matrix_drone_config[cols]
+            norms = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+            weights = (norms - desired) / norms
+            self.matrix_norm = sparse.csr_matrix((norms, (rows, cols)), shape=(n, n))
+            self.formation_error = np.linalg.norm(desired - norms)
+        else:
+            rows, cols, weights = rows[:0], cols[:0], np.zeros(0)
+
+        # the pairs come out of the matrix in a deterministic order: an unchanged graph gives identical arrays
+        cached = self.topology_cache.get(type_of_algorithm)
+        if cached is not None and np.array_equal(cached['rows'], rows) and np.array_equal(cached['cols'], cols) \
+                and np.allclose(cached['weights'], weights, rtol=0, atol=self.weight_tolerance):
+            self.cache_hits += 1
+            self.matrix_adj = cached['adj']
+            self.matrix_delta = cached['delta']
+            self.matrix_laplacian = cached['laplacian']
+            self.topology_key = type_of_algorithm
+            return
+        self.cache_misses += 1
+
+        self.matrix_adj = sparse.csr_matrix((weights, (rows, cols)), shape=(n, n))
+        self.matrix_delta = sparse.diags(np.asarray(self.matrix_adj.sum(axis=1)).ravel(), format='csr')
+        self.matrix_laplacian = self.scale_laplacian(self.matrix_delta - self.matrix_adj,
+                                                     sparse.identity(n, format='csr')).tocsr()
+        self.store_topology(type_of_algorithm)
+        self.topology_cache[type_of_algorithm].update({'rows': rows, 'cols': cols, 'weights': weights})
+
+    def spectral_radius_bound(self):
+        """Upper bound of the eigenvalues magnitude of the scaled Laplacian (Gershgorin circles)."""
+        cached = self.topology_cache.get(self.topology_key)
+        if cached is None or cached['laplacian'] is not self.matrix_laplacian:
+            return abs(self.matrix_laplacian).sum(axis=1).max()
+        if cached['bound'] is None:
+            cached['bound'] = abs(self.matrix_laplacian).sum(axis=1).max()
+        return cached['bound']
+
+    def stable_sub_step(self, safety=1.0):
+        """Largest time step for which the explicit formation update x - dt * L x stays stable."""
+        bound = self.spectral_radius_bound()
+        # explicit Euler is stable for dt * |lambda| < 2, safety = 1 leaves a margin of 2
+        return safety / bound if bound > 0 else np.inf
 
     def compute_drone_actual_config_matrix(self):
         """Compute the actual configuration matrix of the drones."""
@@ -88,7 +274,7 @@ class FlyController:
     def consensus_protocol(self, var_to_sync):
         """Perform the consensus protocol."""
         self.update_matrices('c')
-        z_dot = np.dot(self.matrix_laplacian, var_to_sync)
+        z_dot = self.matrix_laplacian @ var_to_sync
         return np.round(z_dot, 3)
 
     def rendezvous_protocol(self, delta_t):
@@ -114,10 +300,16 @@ class FlyController:
         # Slicing the drone matrix at the first 2 columns such that the formation can work only on the plane X,Y
         self.matrix_drone_config = self.matrix_drone_config[:, :2]
 
-        self.matrix_interdrones_distance = interdrones_distances
-        self.update_matrices('f')
-
-        diff = np.linalg.norm(self.matrix_interdrones_distance - self.matrix_norm)
+        if self.sparse_mode:
+            self.matrix_interdrones_distance = self.sparse_distances(interdrones_distances)
+            self.update_matrices('f')
+            diff = self.formation_error
+        else:
+            self.matrix_interdrones_distance = interdrones_distances
+            self.update_matrices('f')
+            diff = np.linalg.norm(self.matrix_interdrones_distance - self.matrix_norm)
+        self.formation_error = diff
+        self.converged = diff < tolerance
         if diff < tolerance:
             # logging.info("Convergence has been already reached")
             # logging.info(f"Actual inter-drones distances = norm matrix: {self.matrix_norm}")
@@ -129,7 +321,7 @@ class FlyController:
         else:
             # logging.info(f"Lap: \n {self.matrix_laplacian}")
             # logging.info(f"Norm matrix: \n {self.matrix_norm}")
-            rate = np.dot(delta_t, np.dot(self.matrix_laplacian, self.matrix_drone_config))
+            rate = np.dot(delta_t, self.matrix_laplacian @ self.matrix_drone_config)
             new_drone_targets_config = np.subtract(self.matrix_drone_config, rate)
 
             # recomposing the drone matrix with the value computed by the formation algorithm
@@ -137,6 +329,45 @@ class FlyController:
 
             return np.round(new_drone_targets_config, 5).tolist()
 
+    def sparse_distances(self, interdrones_distances):
+        """Desired distances as a CSR matrix, a dense array is converted once and reused while it is the same object."""
+        if sparse.issparse(interdrones_distances):
+            return interdrones_distances.tocsr()
+        if interdrones_distances is not self.dense_formation:
+            self.dense_formation = interdrones_distances
+            self.sparse_formation = sparse.csr_matrix(interdrones_distances)
+        return self.sparse_formation
+
+    def offset_formation_control(self, offsets, tolerance):
+        """
+        Displacement-based formation control limited to the (X,Y) plane.
+
+        Unlike formation_control, which only constrains the inter-drone distances, every slave converges to the
+        leader position plus its offset, so the orientation of the formation is fixed too (e.g. a line of drones
+        across the flight direction). Each slave moves to the average position its neighbours expect for it, the
+        leader is not moved.
+        """
+        self.matrix_drone_config = self.compute_drone_actual_config_matrix()
+        offsets = np.asarray(offsets, dtype=float)[:, 0:2]
+        xy = self.matrix_drone_config[:, 0:2]
+        extra = self.matrix_drone_config[:, 2:].copy()
+        extra[:, 0] = self.matrix_drone_config[0, 2]
+
+        self.matrix_interdrones_distance = formation_distance_matrix(offsets, self.dist_max if self.sparse_mode
+                                                                     else None)
+        self.update_matrices('c')
+        error = xy - offsets
+        self.formation_error = np.linalg.norm(error - error[0])
+        self.converged = self.formation_error < tolerance
+        if self.converged:
+            return np.round(np.concatenate((xy, extra), axis=1), 5).tolist()
+
+        degree = np.asarray(self.matrix_adj.sum(axis=1)).ravel()
+        disagreement = (self.matrix_delta - self.matrix_adj) @ error
+        new_xy = xy - disagreement / np.maximum(degree, 1)[:, np.newaxis]
+        new_xy[0] = xy[0]
+        return np.round(np.concatenate((new_xy, extra), axis=1), 5).tolist()
+
     def get_drones_positions(self):
         """Get the positions of all drones."""
         positions = []
@@ -0,0 +1,89 @@
+import numpy as np
+
+from CoppeliaSim_project.config import GRID_SIZE
+from CoppeliaSim_project.coverage_planner import priority_at
+
+
+class GridIndex:
+    """
+    Regular grid of square cells over the terrain, stored as NumPy arrays.
+
+    Cell (ix, iy) covers [ix * cell_size, (ix + 1) * cell_size) along X and the same along Y; arrays indexed by
+    cell have shape (nx, ny), like the processed matrix grid[ix][iy]. Flat indices follow Tessellation.apply_grid
+    (X in the outer loop): index = ix * ny + iy.
+    """
+
+    def __init__(self, width, height, cell_size=GRID_SIZE, priority_matrix=None):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.nx = max(int(np.ceil(width / cell_size - 1e-9)), 1)
+        self.ny = max(int(np.ceil(height / cell_size - 1e-9)), 1)
+
+        ix, iy = np.meshgrid(np.arange(self.nx), np.arange(self.ny), indexing='ij')
+        self.centers = np.stack(((ix + 0.5) * cell_size, (iy + 0.5) * cell_size), axis=-1)  # (nx, ny, 2)
+        self.priorities = np.full((self.nx, self.ny), 3, dtype=int)  # low priority when no matrix is given
+        if priority_matrix is not None:
+            self.set_priorities(priority_matrix)
+        self.results = np.zeros((self.nx, self.ny), dtype=int)  # sensed terrain class, 0 = not sensed yet
+        self.listener = None  # called as listener(ix, iy, nx, ny, value) when the class of cells is decided
+
+    def set_priorities(self, priority_matrix):
+        """
+        Read the priority of every cell from the priority matrix (column-wise S layout, see priority_at).
+
+        The matrix may have another resolution than the grid: it is stretched over the terrain and each cell takes
+        the priority at its center.
+        """
+        n_rows, n_cols = np.shape(priority_matrix)
+        x = self.centers[..., 0] / (self.width / n_cols)
+        y = self.centers[..., 1] / (self.height / n_rows)
+        self.priorities = np.asarray(priority_at(priority_matrix, x, y, 1), dtype=int)
+
+    def cell_of(self, x, y):
+        """Return the cell (ix, iy) containing the world point (x, y), None if it is outside the grid."""
+        ix = int(np.floor(x / self.cell_size))
+        iy = int(np.floor(y / self.cell_size))
+        if 0 <= ix < self.nx and 0 <= iy < self.ny:
+            return ix, iy
+        return None
+
+    def cells_of(self, x, y):
+        """Vectorized cell_of: cell indices of arrays of points and the mask of the points inside the grid."""
+        ix = np.floor(np.asarray(x, dtype=float) / self.cell_size).astype(int)
+        iy = np.floor(np.asarray(y, dtype=float) / self.cell_size).astype(int)
+        inside = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        return ix, iy, inside
+
+    def record(self, x, y, value):
+        """Store a reading in the cell containing (x, y), return the cell or None if the point is outside."""
+        cell = self.cell_of(x, y)
+        if cell is not None:
+            self.fill(cell[0], cell[1], 1, 1, value)
+        return cell
+
+    def fill(self, ix, iy, nx, ny, value):
+        """Store the same class in the block of cells [ix, ix + nx) x [iy, iy + ny)."""
+        self.results[ix:ix + nx, iy:iy + ny] = value
+        if self.listener is not None:
+            self.listener(ix, iy, nx, ny, int(value))
+
+    def waypoints(self):
+        """Cell centers as drone configurations [x, y, z, qx, qy, qz, qw], the altitude is 4 - priority."""
+        n_cells = self.nx * self.ny
+        configs = np.zeros((n_cells, 7))
+        configs[:, 0:2] = self.centers.reshape(n_cells, 2)
+        configs[:, 2] = 4 - self.priorities.ravel()
+        configs[:, 6] = 1
+        return configs
+
+    def squares(self):
+        """Corners of every cell, in the format of Tessellation.create_square."""
+        x0 = self.centers[..., 0].ravel() - self.cell_size / 2
+        y0 = self.centers[..., 1].ravel() - self.cell_size / 2
+        size = self.cell_size
+        return [[(x, y), (x + size, y), (x + size, y + size), (x, y + size)] for x, y in zip(x0, y0)]
+
+    def results_matrix(self):
+        """Sensed classes as nested lists grid[ix][iy], the format of the processed matrix."""
+        return self.results.tolist()
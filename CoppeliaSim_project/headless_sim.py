@@ -0,0 +1,382 @@
+import os
+import logging
+import math
+
+import numpy as np
+from PIL import Image
+
+from CoppeliaSim_project.path_engine import path_lengths, interpolated_config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Models known by the kinematic simulator, keyed by the file name passed to loadModel
+QUADCOPTER_MODEL = 'Quadcopter.ttm'
+TRACTOR_MODEL = 'dr12.ttm'
+
+# Time constant [s] of the first order lag used to make a quadcopter body follow its target
+QUADCOPTER_TIME_CONSTANT = 0.1
+
+# Differential drive parameters of the tractor model (see Tractor.next_animation_step)
+WHEEL_RADIUS = 0.086  # [m]
+DISTANCE_BETWEEN_WHEELS = 0.152  # [m]
+# Orientation stored in the tractor model file and axis of the model frame pointing forward
+TRACTOR_MODEL_QUATERNION = [0, -math.sqrt(0.5), 0, math.sqrt(0.5)]
+TRACTOR_FORWARD_AXIS = [0, 0, -1]
+
+# Textures are box-filtered down to this size: sensor readings only need the average colour of the footprint
+MAX_TEXTURE_SIZE = 512
+
+
+def quat_multiply(q1, q2):
+    """Hamilton product of two quaternions stored as [x, y, z, w]."""
+    x1, y1, z1, w1 = q1
+    x2, y2, z2, w2 = q2
+    return np.array([
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2
+    ])
+
+
+def quat_conjugate(q):
+    return np.array([-q[0], -q[1], -q[2], q[3]])
+
+
+def quat_rotate(q, v):
+    """Rotate the vector v by the unit quaternion q."""
+    qv = np.array([v[0], v[1], v[2], 0.0])
+    return quat_multiply(quat_multiply(q, qv), quat_conjugate(q))[0:3]
+
+
+class SceneObject:
+    def __init__(self, handle, alias, kind, parent=-1):
+        self.handle = handle
+        self.alias = alias
+        self.kind = kind
+        self.parent = parent
+        # pose relative to the parent
+        self.position = np.zeros(3)
+        self.quaternion = np.array([0.0, 0.0, 0.0, 1.0])
+        self.data = {}
+
+
+class HeadlessSim:
+    """
+    Pure NumPy kinematic replacement for the CoppeliaSim `sim` object.
+
+    It implements the subset of the remote API used by the project, so drones, terrain, sensors and tractors can
+    run without a simulator: quadcopter bodies follow their target with a first order lag, tractors integrate a
+    differential drive model and vision sensors average the terrain texture inside their footprint.
+    """
+
+    handle_world = -1
+    handle_parent = -11
+    primitiveshape_plane = 1
+    primitiveshape_disc = 2
+    primitiveshape_cuboid = 3
+    primitiveshape_spheroid = 4
+    primitiveshape_cylinder = 5
+    primitiveshape_cone = 6
+    texturemap_plane = 0
+    scripttype_customization = 6
+
+    def __init__(self, time_step=0.05):
+        self.time_step = time_step
+        self.simulation_time = 0.0
+        self.running = False
+        self.stepping = False
+        self.objects = {}
+        self.next_handle = 1
+        self.textures = {}
+        self.next_texture_id = 1
+        self.joint_velocities = {}
+
+    # --- simulation control ---
+
+    def setStepping(self, enabled):
+        self.stepping = enabled
+
+    def startSimulation(self):
+        self.running = True
+        self.simulation_time = 0.0
+        logging.info("Headless simulation started")
+
+    def stopSimulation(self):
+        self.running = False
+        logging.info("Headless simulation stopped")
+
+    def getSimulationTime(self):
+        return self.simulation_time
+
+    def step(self):
+        """Advance the simulation by one time step."""
+        dt = self.time_step
+        for obj in list(self.objects.values()):
+            if obj.kind == 'quadcopter':
+                self.update_quadcopter(obj, dt)
+            elif obj.kind == 'tractor':
+                self.update_tractor(obj, dt)
+        self.simulation_time += dt
+
+    def update_quadcopter(self, obj, dt):
+        target = self.objects.get(obj.data['target'])
+        if target is None:
+            return
+        position = self.world_position(obj.handle)
+        target_position = self.world_position(target.handle)
+        alpha = 1 - math.exp(-dt / QUADCOPTER_TIME_CONSTANT)
+        self.set_world_position(obj.handle, position + alpha * (target_position - position))
+
+    def update_tractor(self, obj, dt):
+        wl = self.joint_velocities.get(obj.data['left_joint'], 0)
+        wr = self.joint_velocities.get(obj.data['right_joint'], 0)
+        linear_vel = WHEEL_RADIUS * (wr + wl) / 2
+        angular_vel = WHEEL_RADIUS * (wr - wl) / DISTANCE_BETWEEN_WHEELS
+
+        quaternion = self.world_quaternion(obj.handle)
+        forward = quat_rotate(quaternion, TRACTOR_FORWARD_AXIS)
+        forward[2] = 0
+        norm = np.linalg.norm(forward)
+        if norm > 0:
+            forward /= norm
+        position = self.world_position(obj.handle) + linear_vel * dt * forward
+        half_angle = angular_vel * dt / 2
+        rotation = np.array([0, 0, math.sin(half_angle), math.cos(half_angle)])
+        self.set_world_position(obj.handle, position)
+        self.set_world_quaternion(obj.handle, quat_multiply(rotation, quaternion))
+
+    # --- scene objects ---
+
+    def create_object(self, alias, kind, parent=-1):
+        handle = self.next_handle
+        self.next_handle += 1
+        self.objects[handle] = SceneObject(handle, alias, kind, parent)
+        return handle
+
+    def loadModel(self, path):
+        model = os.path.basename(path)
+        if model == QUADCOPTER_MODEL:
+            handle = self.create_object('Quadcopter', 'quadcopter')
+            # like in the model file, the target is a free object driven by the user
+            self.objects[handle].data['target'] = self.create_object('target', 'dummy')
+        elif model == TRACTOR_MODEL:
+            handle = self.create_object('dr12', 'tractor')
+            self.objects[handle].quaternion = np.array(TRACTOR_MODEL_QUATERNION)
+            self.objects[handle].data['left_joint'] = self.create_object('leftJoint_', 'joint', handle)
+            self.objects[handle].data['right_joint'] = self.create_object('rightJoint_', 'joint', handle)
+        else:
+            logging.error(f"Model {path} is not supported by the headless simulator")
+            return -1
+        return handle
+
+    def getObject(self, path, options=None):
+        options = options or {}
+        alias = path.lstrip(':/').split('/')[-1]
+        matches = [obj.handle for obj in self.objects.values() if obj.alias == alias]
+        index = options.get('index', 0)
+        if index < len(matches):
+            return matches[index]
+        if options.get('noError', False):
+            return -1
+        raise ValueError(f"object does not exist: {path}")
+
+    def setObjectAlias(self, handle, alias):
+        self.objects[handle].alias = alias
+
+    def setObjectParent(self, handle, parent, keep_in_place):
+        position = self.world_position(handle)
+        quaternion = self.world_quaternion(handle)
+        self.objects[handle].parent = parent
+        if keep_in_place:
+            self.set_world_position(handle, position)
+            self.set_world_quaternion(handle, quaternion)
+
+    def createPrimitiveShape(self, shape_type, sizes, options=0):
+        handle = self.create_object('Shape', 'shape')
+        self.objects[handle].data['sizes'] = list(sizes)
+        return handle
+
+    def createVisionSensor(self, options, int_params, float_params):
+        handle = self.create_object('Vision_sensor', 'vision_sensor')
+        self.objects[handle].data['resolution'] = int_params[0:2]
+        self.objects[handle].data['view_angle'] = float_params[2]
+        return handle
+
+    def world_position(self, handle):
+        obj = self.objects[handle]
+        if obj.parent == -1:
+            return obj.position.copy()
+        return self.world_position(obj.parent) + quat_rotate(self.world_quaternion(obj.parent), obj.position)
+
+    def world_quaternion(self, handle):
+        obj = self.objects[handle]
+        if obj.parent == -1:
+            return obj.quaternion.copy()
+        return quat_multiply(self.world_quaternion(obj.parent), obj.quaternion)
+
+    def set_world_position(self, handle, position):
+        obj = self.objects[handle]
+        position = np.array(position[0:3], dtype=float)
+        if obj.parent == -1:
+            obj.position = position
+        else:
+            parent_q = self.world_quaternion(obj.parent)
+            obj.position = quat_rotate(quat_conjugate(parent_q), position - self.world_position(obj.parent))
+
+    def set_world_quaternion(self, handle, quaternion):
+        obj = self.objects[handle]
+        quaternion = np.array(quaternion[0:4], dtype=float)
+        quaternion /= np.linalg.norm(quaternion)
+        if obj.parent == -1:
+            obj.quaternion = quaternion
+        else:
+            obj.quaternion = quat_multiply(quat_conjugate(self.world_quaternion(obj.parent)), quaternion)
+
+    def resolve_arguments(self, handle, arg1, arg2):
+        """Accept both the (handle, value, relativeTo) and the legacy (handle, relativeTo, value) forms."""
+        return (arg2, arg1) if isinstance(arg1, int) else (arg1, arg2)
+
+    def getObjectPosition(self, handle, relative_to=-1):
+        if relative_to == self.handle_parent:
+            return self.objects[handle].position.tolist()
+        return self.world_position(handle).tolist()
+
+    def getObjectQuaternion(self, handle, relative_to=-1):
+        if relative_to == self.handle_parent:
+            return self.objects[handle].quaternion.tolist()
+        return self.world_quaternion(handle).tolist()
+
+    def getObjectPose(self, handle, relative_to=-1):
+        return self.getObjectPosition(handle, relative_to) + self.getObjectQuaternion(handle, relative_to)
+
+    def setObjectPosition(self, handle, arg1, arg2=-1):
+        position, relative_to = self.resolve_arguments(handle, arg1, arg2)
+        if relative_to == self.handle_parent:
+            self.objects[handle].position = np.array(position[0:3], dtype=float)
+        else:
+            self.set_world_position(handle, position)
+
+    def setObjectQuaternion(self, handle, arg1, arg2=-1):
+        quaternion, relative_to = self.resolve_arguments(handle, arg1, arg2)
+        if relative_to == self.handle_parent:
+            self.objects[handle].quaternion = np.array(quaternion[0:4], dtype=float)
+        else:
+            self.set_world_quaternion(handle, quaternion)
+
+    def setObjectPose(self, handle, arg1, arg2=-1):
+        pose, relative_to = self.resolve_arguments(handle, arg1, arg2)
+        self.setObjectPosition(handle, pose[0:3], relative_to)
+        self.setObjectQuaternion(handle, pose[3:7], relative_to)
+
+    def setJointTargetVelocity(self, handle, velocity):
+        self.joint_velocities[handle] = velocity
+
+    # --- scripts ---
+
+    def createScript(self, script_type, code, options=0, lang='lua'):
+        """Create a script object: only the functions of the SimBridge script exist, implemented in Python."""
+        return self.create_object('Script', 'script')
+
+    def callScriptFunction(self, function_name, script_handle, *args):
+        functions = {'getPoses': self.getPoses, 'setPoses': self.setPoses, 'readVisionImage': self.readVisionImage}
+        if self.objects.get(script_handle) is None or function_name not in functions:
+            raise ValueError(f"script function does not exist: {function_name}")
+        return functions[function_name](*args)
+
+    def getPoses(self, handles):
+        """World pose of every object, like the getPoses function of the SimBridge script."""
+        return [self.world_position(handle).tolist() + self.world_quaternion(handle).tolist() for handle in handles]
+
+    def setPoses(self, handles, poses):
+        for handle, pose in zip(handles, poses):
+            self.set_world_position(handle, pose[0:3])
+            self.set_world_quaternion(handle, pose[3:7])
+
+    def readVisionImage(self, handle):
+        self.handleVisionSensor(handle)
+        return self.getVisionSensorImg(handle)
+
+    # --- paths ---
+
+    def getPathLengths(self, path, dof, dist_callback=None):
+        """Return the cumulative length of each path point and the total path length."""
+        return path_lengths(path, dof)
+
+    def getPathInterpolatedConfig(self, path, lengths, t, method=None, types=None):
+        """Return the configuration at the distance t along the path."""
+        return interpolated_config(path, lengths, t, method)
+
+    # --- terrain and sensing ---
+
+    def createTexture(self, file_name, options, plane_sizes=None, scaling_uv=None, xy_g=None, fixed_resolution=0,
+                      resolution=None):
+        image = Image.open(file_name).convert('RGB')
+        if max(image.size) > MAX_TEXTURE_SIZE:
+            scale = MAX_TEXTURE_SIZE / max(image.size)
+            image = image.resize((max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale))),
+                                 Image.BOX)
+        image = np.asarray(image, dtype=float) / 255
+        texture_id = self.next_texture_id
+        self.next_texture_id += 1
+        self.textures[texture_id] = image
+        shape = self.createPrimitiveShape(self.primitiveshape_plane, plane_sizes or [1, 1, 0])
+        return shape, texture_id, list(image.shape[1::-1])
+
+    def setShapeTexture(self, shape, texture_id, mapping_mode, options, uv_scaling, position=None,
+                        orientation=None):
+        self.objects[shape].data['texture'] = texture_id
+        self.objects[shape].data['uv_scaling'] = list(uv_scaling)
+
+    def textured_plane(self):
+        for obj in self.objects.values():
+            if obj.kind == 'shape' and 'texture' in obj.data:
+                return obj
+        return None
+
+    def sample_terrain(self, sensor_handle):
+        """Return the pixels of the terrain texture seen by a downward looking vision sensor."""
+        plane = self.textured_plane()
+        if plane is None:
+            return None
+        image = self.textures[plane.data['texture']]
+        width, length = plane.data['uv_scaling']
+        center = self.world_position(plane.handle)
+        sensor = self.objects[sensor_handle]
+        position = self.world_position(sensor_handle)
+        half_size = max((position[2] - center[2]) * math.tan(sensor.data['view_angle'] / 2), 1e-3)
+
+        # image row 0 is the far end of the plane along y
+        rows, cols = image.shape[0:2]
+        x0, y0 = center[0] - width / 2, center[1] - length / 2
+        col_min = int(np.clip((position[0] - half_size - x0) / width * cols, 0, cols - 1))
+        col_max = int(np.clip((position[0] + half_size - x0) / width * cols, 0, cols - 1))
+        row_min = int(np.clip((1 - (position[1] + half_size - y0) / length) * rows, 0, rows - 1))
+        row_max = int(np.clip((1 - (position[1] - half_size - y0) / length) * rows, 0, rows - 1))
+        return image[row_min:row_max + 1, col_min:col_max + 1]
+
+    def handleVisionSensor(self, sensor_handle):
+        """Return the detection result and the auxiliary packet (min, max and average intensity/RGB/depth)."""
+        pixels = self.sample_terrain(sensor_handle)
+        if pixels is None or pixels.size == 0:
+            return 1, [], []
+        rgb = pixels.reshape(-1, 3)
+        intensity = rgb.mean(axis=1)
+        depth = self.world_position(sensor_handle)[2]
+        aux_packet = ([float(intensity.min())] + rgb.min(axis=0).tolist() + [depth] +
+                      [float(intensity.max())] + rgb.max(axis=0).tolist() + [depth] +
+                      [float(intensity.mean())] + rgb.mean(axis=0).tolist() + [depth])
+        return 0, aux_packet, []
+
+    def getVisionSensorImg(self, sensor_handle, options=0):
+        """Return the RGB image of the sensor as bytes and its resolution."""
+        res_x, res_y = self.objects[sensor_handle].data['resolution']
+        pixels = self.sample_terrain(sensor_handle)
+        if pixels is None or pixels.size == 0:
+            return bytes(res_x * res_y * 3), [res_x, res_y]
+        # nearest neighbour resampling of the footprint, first row at the bottom like CoppeliaSim
+        rows = np.linspace(pixels.shape[0] - 1, 0, res_y).round().astype(int)
+        cols = np.linspace(0, pixels.shape[1] - 1, res_x).round().astype(int)
+        image = (pixels[np.ix_(rows, cols)] * 255).round().astype(np.uint8)
+        return image.tobytes(), [res_x, res_y]
@@ -5,13 +5,22 @@ from coppeliasim_zmqremoteapi_client import RemoteAPIClient
 import sys
 import os
 import json
+import time
 
-from CoppeliaSim_project.config import TOLERANCE, N_DRONES
+from CoppeliaSim_project.config import TOLERANCE, N_DRONES, SIM_BACKEND, SUB_DIVIDER, ADAPTIVE_SUB_STEPS, \
+    MAX_SUB_STEPS, GRID_SIZE, SURVEY_MODE, PATH_PLANNER, TESSELLATION, RANDOM_SEED, RECORD_TRAJECTORY, SPARSE_FORMATION
+from CoppeliaSim_project.coverage_planner import plan_coverage_route, report_route
 from CoppeliaSim_project.drone import Drone
 from CoppeliaSim_project.fly_controller import FlyController
+from CoppeliaSim_project.headless_sim import HeadlessSim
+from CoppeliaSim_project.quadtree_survey import QuadtreeSurvey
+from CoppeliaSim_project.sim_bridge import SimBridge
 from CoppeliaSim_project.terrain import Terrain
 from CoppeliaSim_project.tessellation import apply_tessellation
-from WebApp.api import save_matrix_processed, set_simulation_end, get_priority_matrix, set_coordinates
+from CoppeliaSim_project.trajectory_recorder import TrajectoryRecorder, new_run_id
+from WebApp.api import save_matrix_processed, set_simulation_end, get_priority_matrix, set_coordinates, \
+    publish_cells
+from WebApp.mission_store import record_mission
 
 # Aggiungi il percorso della cartella 'WebApp' a sys.path
 web_app_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../WebApp/'))
@@ -28,16 +37,46 @@ FILE_PATH_PROCESSED = os.path.abspath(FILE_PATH_PROCESSED)  # Assicurati che il
 FILE_PATH = 'data/matrices.json'
 processed_matrix_path = 'data/processed_matrices.json'
 
-grid = [[0 for _ in range(6)] for _ in range(6)]  # Creazione della griglia 6x6
+grid = [[0 for _ in range(6)] for _ in range(6)]  # Griglia dei valori letti, grid[ix][iy] (sostituita a fine missione)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def initialize_simulation():
-    """Initialize the simulation client and start the simulation."""
-    client = RemoteAPIClient()
-    sim = client.require('sim')
+class StageTimer:
+    """Wall time of the consecutive stages of a run, reported in a single log line."""
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        """Close the stage that started at the previous mark."""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def report(self, title):
+        stages = ", ".join(f"{stage} {duration * 1e3:.0f} ms" for stage, duration in self.stages)
+        logging.info(f"{title}: {stages} (total {(self.last - self.start) * 1e3:.0f} ms)")
+        return self.stages
+
+
+def initialize_simulation(backend=SIM_BACKEND):
+    """
+    Initialize the simulation client and start the simulation.
+
+    backend is 'headless', 'coppeliasim' (default remote API port) or 'host:port' of a CoppeliaSim instance.
+    """
+    if backend == 'headless':
+        sim = HeadlessSim()
+    elif ':' in backend:
+        host, port = backend.rsplit(':', 1)
+        client = RemoteAPIClient(host, int(port))
+        sim = client.require('sim')
+    else:
+        client = RemoteAPIClient()
+        sim = client.require('sim')
     sim.setStepping(True)
     sim.startSimulation()
     logging.info("Simulation started")
@@ -55,6 +94,45 @@ def create_s_path(centers, width):
     return s_path
 
 
+def swath_slots(n_drones):
+    """Return the slot (column of the swath) of the leader and the slots of the slaves."""
+    leader_slot = (n_drones - 1) // 2
+    return leader_slot, [k for k in range(n_drones) if k != leader_slot]
+
+
+def swath_offsets(n_drones, cell_size=GRID_SIZE):
+    """Offsets from the leader that put the drones side by side, one cell apart, across the flight direction."""
+    leader_slot, slave_slots = swath_slots(n_drones)
+    offsets = [[0.0, 0.0]]
+    for slot in slave_slots:
+        offsets.append([(slot - leader_slot) * cell_size, 0.0])
+    return np.array(offsets)
+
+
+def create_swath_path(centers, width, n_drones, cell_size=GRID_SIZE):
+    """
+    Create the S-shaped path of the leader for a swath survey.
+
+    The grid centers are grouped in columns of constant X (as in create_s_path); each pass covers n_drones columns
+    at once, with the leader over its own column and the slaves beside it, so the path advances by the swath width.
+    The flight altitude of each step is the lowest one required by the cells of the swath.
+    """
+    columns = [centers[i:i + width] for i in range(0, len(centers), width)]
+    leader_slot, _ = swath_slots(n_drones)
+    s_path = []
+    for n_pass, first in enumerate(range(0, len(columns), n_drones)):
+        swath = columns[first:first + n_drones]
+        x_leader = swath[0][0][0] + leader_slot * cell_size
+        row = []
+        for cells in zip(*swath):
+            altitude = min(cell[2] for cell in cells)
+            row.append([x_leader, cells[0][1], altitude] + list(cells[0][3:7]))
+        if n_pass % 2 == 1:
+            row.reverse()
+        s_path.extend(row)
+    return s_path
+
+
 def initialize_drones(sim, n_drones):
     """Initialize drones with their starting configurations."""
     drones = []
@@ -102,144 +180,332 @@ def create_straight_path(coordinates):
     return path
 
 
-def run_simulation(sim, s_path, drones, fc):
+def formation_sub_step(fc, drones, sub_step, desired_dist_matrix, center, gain=None):
+    """Run the formation control once and move the slave drones towards the computed targets for sub_step."""
+    out = fc.formation_control(sub_step if gain is None else gain, desired_dist_matrix, TOLERANCE)
+
+    # set new target for the slave drones
+    drones[1].calculate_new_path(out[1])
+    drones[2].calculate_new_path(out[2])
+
+    # update animation frame for slave robot
+    drones[1].next_animation_step(sub_step)
+    drones[2].next_animation_step(sub_step)
+
+    target_coordinate_1 = [float(coord) for coord in center[:3]]
+    target_coordinate_2 = [float(coord) for coord in out[1][:3]]
+    target_coordinate_3 = [float(coord) for coord in out[2][:3]]
+
+    # Check if the values of target_coordinate_2 and target_coordinate_3 are within ±1 of target_coordinate_1
+    if all(abs(t2 - t1) <= 0.5 for t1, t2 in zip(target_coordinate_1, target_coordinate_2)) and \
+            all(abs(t3 - t1) <= 0.5 for t1, t3 in zip(target_coordinate_1, target_coordinate_3)):
+        # If the condition is met, use the given target coordinates
+        set_coordinates(target_coordinate_1, target_coordinate_2, target_coordinate_3)
+    else:
+        # If not, adjust target_coordinate_2 and target_coordinate_3 to target_coordinate_1 ± 1
+        adjusted_target_coordinate_2 = [t1 - 0.5 for t1 in target_coordinate_1]
+        adjusted_target_coordinate_3 = [t1 + 0.5 for t1 in target_coordinate_1]
+
+        # Call set_coordinates with adjusted coordinates
+        set_coordinates(target_coordinate_1, adjusted_target_coordinate_2, adjusted_target_coordinate_3)
+    return out
+
+
+def adaptive_formation_control(fc, drones, step, desired_dist_matrix, center):
+    """
+    Run the formation control over one animation step with an adaptive number of sub-steps.
+
+    The gain of each formation update is the largest one the Laplacian spectrum allows for a stable (non
+    overshooting) update, the slaves get the same total time as MAX_SUB_STEPS fixed sub-steps, split in equal parts,
+    and the loop stops as soon as the formation error is below the tolerance.
+    Returns the number of formation control iterations.
+    """
+    sub_step = step * (MAX_SUB_STEPS - 1) / 2 / MAX_SUB_STEPS
+    gain = 0  # the first call only measures the formation error and builds the Laplacian
+    iterations = 0
+    while iterations < MAX_SUB_STEPS:
+        formation_sub_step(fc, drones, sub_step, desired_dist_matrix, center, gain)
+        iterations += 1
+        if fc.converged:
+            break
+        gain = fc.stable_sub_step()
+    return iterations
+
+
+def round_sensor_value(sensor_value):
+    """Round a sensor reading to the terrain class 1, 2 or 3."""
+    if sensor_value < 1.5:
+        return 1
+    elif sensor_value < 2.5:
+        return 2
+    return 3
+
+
+def run_swath_simulation(sim, swath_path, drones, fc, offsets, grid_index, recorder=None):
+    """
+    Survey the field with every drone sensing.
+
+    The leader follows the swath path while the slaves keep their offsets across the flight direction; once the
+    formation is in place over a row of cells, every drone reads its sensor and the reading is stored in the cell
+    below it.
+    """
     prev_time = 0
-    global grid  # Use the global grid variable
-    grid_size = 6  # grid size (6x6)
-    index = 0  # Index for iterating over s_path
+    # same travel time per frame for the slaves as the fixed formation loop
+    sub_steps = SUB_DIVIDER
 
-    # Simulation loop
-    for center in s_path:
-        if index >= grid_size * grid_size:  # If the index exceeds the grid size
-            print("Warning: s_path contains more centers than can be accommodated in the grid.")
-            break  # Stop if there are too many centers for the grid
-
-        # Calculate the average sensor value for the 3 drones
-        total_sensor_value = 0
-        # for i in range(3):  # For each drone
-        #     sensor_value = drones[i].read_sensor()  # Read the sensor value
-        #     print(f"Drone {i + 1} sensor value: {sensor_value}")
-        #     total_sensor_value += sensor_value
-        # average_sensor_value = total_sensor_value / 3
-        sensor_value = drones[0].read_sensor()  # Leggi il valore
-        print(f"Drone 1 sensor value: {sensor_value}")
-
-        # Arrotonda il valore a 1, 2 o 3
-        if sensor_value < 1.5:
-            rounded_value = 1
-        elif sensor_value < 2.5:
-            rounded_value = 2
-        else:
-            rounded_value = 3
+    for center in swath_path:
+        drones[0].calculate_new_path(center)
 
-        # Calcola le coordinate nella griglia
-        row = index // grid_size  # Riga
-        col = index % grid_size  # Colonna
+        formation_ready = False
+        while not formation_ready:
+            step = min((sim.getSimulationTime() - prev_time) / 34, 0.0015)
+            prev_time = sim.getSimulationTime()
+            drones[0].next_animation_step(step)
 
-        # Inserisci il valore arrotondato nella griglia
-        grid[row][col] = rounded_value
+            iterations = 0
+            for p in range(sub_steps):
+                out = fc.offset_formation_control(offsets, TOLERANCE)
+                iterations += 1
+                if fc.converged:
+                    break
+                for drone, target in zip(drones[1:], out[1:]):
+                    drone.calculate_new_path(target)
+                    drone.next_animation_step(step * (sub_steps - 1) / 2 / sub_steps)
+            if len(out) >= 3:
+                set_coordinates(*[[float(coord) for coord in target[:3]] for target in out[:3]])
+            if recorder is not None:
+                recorder.record_frame(prev_time, [drone.get_position() for drone in drones], fc.formation_error,
+                                      iterations)
+
+            formation_ready = drones[0].has_reached_target() and fc.converged
+            sim.step()
 
-        index += 1
-        # Set up formation control parameters
-        desired_dist_matrix = np.array([[0, 0.5, 0.5], [0.5, 0, 1], [0.5, 1, 0]])
+        # every drone senses the cell below it
+        for index, drone in enumerate(drones):
+            sense_cell_below(drone, grid_index, recorder, index)
 
-        # Set a new target for the drone leader
-        drones[0].calculate_new_path(center)
 
-        drone_reached = False
-        while not drone_reached:
-            drone_reached = True
+def sense_cell_below(drone, grid_index, recorder=None, drone_index=0):
+    """Read the sensor of a drone and store the rounded value in the grid cell below it."""
+    position = drone.get_position()
+    if grid_index.cell_of(position[0], position[1]) is not None:
+        sensor_value = drone.read_sensor()
+        logging.debug(f"Drone {drone.id} sensor value: {sensor_value}")
+        cell = grid_index.record(position[0], position[1], round_sensor_value(sensor_value))
+        if recorder is not None:
+            recorder.record_reading(drone_index, sensor_value, cell)
 
-            # standard coppelia sim frame steps are 50ms long, but we need it to be at most 1.5ms
-            step = (sim.getSimulationTime() - prev_time) / 34
-            # logging.info(f"step size:  \n {step}")
 
-            if step > 0.0015:
-                step = 0.0015
-            prev_time = sim.getSimulationTime()
+def save_grid(grid_index, processed_path=FILE_PATH_PROCESSED):
+    """Publish the sensed grid: global grid, processed matrix file and end of the simulation."""
+    global grid
+    grid = grid_index.results_matrix()
+    logging.debug("Griglia finale:\n" + "\n".join(str(row) for row in grid))
+    if processed_path is not None:
+        save_matrix_processed(processed_path, grid)
+    set_simulation_end(True, grid)
+    return grid
 
-            # update animation for the master
-            drones[0].next_animation_step(step)
 
-            # I need to run the formation control multiple times to guarantee the convergence at the desired distances.
-            # So, I need to divide each animation step in subintervals where I launch the fc to adjust slaves positions
-            # theoretical best sub_divider = 50 (by optimization test)
-            sub_divider = 10
-            for p in range(sub_divider):
-                # Compute formation control
-                sub_step = step / sub_divider * p
-                out = fc.formation_control(sub_step, desired_dist_matrix, TOLERANCE)
-
-                # set new target for the slave drones
-                drones[1].calculate_new_path(out[1])
-                drones[2].calculate_new_path(out[2])
-
-                # update animation frame for slave robot
-                drones[1].next_animation_step(sub_step)
-                drones[2].next_animation_step(sub_step)
-
-                target_coordinate_1 = [float(coord) for coord in center[:3]]
-                target_coordinate_2 = [float(coord) for coord in out[1][:3]]
-                target_coordinate_3 = [float(coord) for coord in out[2][:3]]
-
-                # Check if the values of target_coordinate_2 and target_coordinate_3 are within ±1 of target_coordinate_1
-                if all(abs(t2 - t1) <= 0.5 for t1, t2 in zip(target_coordinate_1, target_coordinate_2)) and \
-                        all(abs(t3 - t1) <= 0.5 for t1, t3 in zip(target_coordinate_1, target_coordinate_3)):
-                    # If the condition is met, use the given target coordinates
-                    set_coordinates(target_coordinate_1, target_coordinate_2, target_coordinate_3)
-                else:
-                    # If not, adjust target_coordinate_2 and target_coordinate_3 to target_coordinate_1 ± 1
-                    adjusted_target_coordinate_2 = [t1 - 0.5 for t1 in target_coordinate_1]
-                    adjusted_target_coordinate_3 = [t1 + 0.5 for t1 in target_coordinate_1]
-
-                    # Call set_coordinates with adjusted coordinates
-                    set_coordinates(target_coordinate_1, adjusted_target_coordinate_2, adjusted_target_coordinate_3)
-            if not drones[0].has_reached_target():
-                drone_reached = False
-            sim.step()
+def run_simulation(sim, s_path, drones, fc, grid_index, adaptive=ADAPTIVE_SUB_STEPS, recorder=None):
+    """
+    Fly the leader along s_path with the slaves in formation, sensing the terrain.
 
-    for i in range(grid_size):
-        if i % 2 == 1:  # Se la riga è dispari
-            grid[i].reverse()
-    # Save the processed matrix
-    print("Griglia finale:")
-    for row in grid:
-        print(row)
-    save_matrix_processed(FILE_PATH_PROCESSED, grid)
-    set_simulation_end(True)
+    The leader reads its sensor on each center of the path and the reading is stored in the cell below it, so any
+    route (S path or planned) and any grid size can be used.
+    """
+    prev_time = 0
+    iterations_per_frame = []  # formation control iterations of each frame
 
+    # Simulation loop
+    for center in s_path:
+        # Set up formation control parameters
+        desired_dist_matrix = np.array([[0, 0.5, 0.5], [0.5, 0, 1], [0.5, 1, 0]])
 
-def main():
-    try:
-        sim = initialize_simulation()
+        prev_time = fly_to_center(sim, drones, fc, center, desired_dist_matrix, adaptive, iterations_per_frame,
+                                  prev_time, recorder)
 
-        priority_matrix = get_priority_matrix(FILE_PATH)
+        # Leggi il valore e inseriscilo nella cella sotto il leader
+        sense_cell_below(drones[0], grid_index, recorder)
 
-        terrain = Terrain(sim)
-        tessellation_regular, tessellation_voronoi = apply_tessellation(terrain, priority_matrix)
+    if iterations_per_frame:
+        logging.info(f"Formation control iterations per frame: {np.mean(iterations_per_frame):.2f} on average, "
+                     f"{max(iterations_per_frame)} at most")
 
-        # Decide which type of tassellation to use
-        tessellation = tessellation_regular
 
-        width = terrain.get_dimensions()[0]
-        s_path = create_s_path(tessellation.centers, width)
+def run_quadtree_simulation(sim, drones, fc, grid_index, adaptive=ADAPTIVE_SUB_STEPS, recorder=None):
+    """
+    Survey the field with the adaptive quadtree: coarse blocks from high altitude, mixed blocks revisited lower.
 
-        drones = initialize_drones(sim, N_DRONES)
-        fc = FlyController(sim, drones)
+    Each block is read by the leader as a per-class pixel histogram (rendered, or sampled in 'virtual' sensor
+    mode); the full resolution grid is filled from the accepted blocks.
+    """
+    survey = QuadtreeSurvey(grid_index, drones[0].sensor.sensor_float_param[2])
+    desired_dist_matrix = np.array([[0, 0.5, 0.5], [0.5, 0, 1], [0.5, 1, 0]])
+    iterations_per_frame = []
+    prev_time = 0
 
+    def read_block(node):
+        nonlocal prev_time
+        prev_time = fly_to_center(sim, drones, fc, survey.waypoint(node), desired_dist_matrix, adaptive,
+                                  iterations_per_frame, prev_time, recorder)
+        terrain_class, histogram = drones[0].read_sensor_histogram()
+        if recorder is not None:
+            recorder.record_reading(0, terrain_class, (node.ix, node.iy))
+        logging.debug(f"Drone 1 block {node.nx}x{node.ny} at ({node.ix}, {node.iy}): {histogram[1:]}")
+        return histogram
+
+    n_readings = survey.run(read_block)
+    logging.info(f"Quadtree survey: {n_readings} readings for {grid_index.nx * grid_index.ny} cells, "
+                 f"{len(survey.leaves())} accepted blocks")
+
+
+def fly_to_center(sim, drones, fc, center, desired_dist_matrix, adaptive, iterations_per_frame, prev_time,
+                  recorder=None):
+    """Move the leader to center with the slaves in formation, return the simulation time of the last frame."""
+    # Set a new target for the drone leader
+    drones[0].calculate_new_path(center)
+
+    drone_reached = False
+    while not drone_reached:
+        drone_reached = True
+
+        # standard coppelia sim frame steps are 50ms long, but we need it to be at most 1.5ms
+        step = (sim.getSimulationTime() - prev_time) / 34
+        # logging.info(f"step size:  \n {step}")
+
+        if step > 0.0015:
+            step = 0.0015
+        prev_time = sim.getSimulationTime()
+
+        # update animation for the master
+        drones[0].next_animation_step(step)
+
+        # I need to run the formation control multiple times to guarantee the convergence at the desired distances.
+        # So, I need to divide each animation step in subintervals where I launch the fc to adjust slaves positions
+        # theoretical best sub_divider = 50 (by optimization test)
+        if adaptive:
+            iterations = adaptive_formation_control(fc, drones, step, desired_dist_matrix, center)
+        else:
+            for p in range(SUB_DIVIDER):
+                # Compute formation control
+                sub_step = step / SUB_DIVIDER * p
+                formation_sub_step(fc, drones, sub_step, desired_dist_matrix, center)
+            iterations = SUB_DIVIDER
+        iterations_per_frame.append(iterations)
+        if recorder is not None:
+            recorder.record_frame(prev_time, [drone.get_position() for drone in drones], fc.formation_error,
+                                  iterations)
+
+        if not drones[0].has_reached_target():
+            drone_reached = False
         sim.step()
+    return prev_time
+
+
+def main(backend=SIM_BACKEND, survey_mode=SURVEY_MODE, run_id=None, processed_path=FILE_PATH_PROCESSED,
+         priority_matrix=None, texture_path="texture.png"):
+    """
+    Run a survey mission and return its result: the sensed grid, the number of frames and the recorded run id.
+
+    The priority matrix is read from data/matrices.json if not given; processed_path and texture_path are the files
+    published for the web page, None writes neither. Returns None if the mission failed before the grid was sensed.
+    Every mission, failed or not, is stored in the mission database under its run id.
+    """
+    result = None
+    started = time.time()
+    run_id = run_id or new_run_id()
+    recorder, error = None, None
+    startup = StageTimer()
+    try:
+        if RANDOM_SEED is not None:
+            # same terrain and Voronoi points for every mission (the texture is then served from the cache)
+            np.random.seed(RANDOM_SEED)
+        sim = initialize_simulation(backend)
+        startup.mark("simulation")
+
+        if priority_matrix is None:
+            priority_matrix = get_priority_matrix(FILE_PATH)
+        startup.mark("priorities")
+
+        terrain = Terrain(sim, texture_path)
+        startup.mark("terrain")
+
+        # only the selected tessellation is built, its plot is drawn by a worker process
+        tessellation = apply_tessellation(terrain, priority_matrix, TESSELLATION)
+        startup.mark("tessellation")
+
+        grid_index = tessellation.grid_index
+        # every decided cell is pushed to the web clients
+        grid_index.listener = publish_cells
+        # cells per column of the grid, the S path turns after each column
+        cells_per_column = grid_index.ny
+
+        # drones and controller exchange their poses with the simulator in bulk, once per step
+        bridge = SimBridge(sim)
+        drones = initialize_drones(bridge, N_DRONES)
+        fc = FlyController(bridge, drones, sparse_mode=SPARSE_FORMATION)
+        startup.mark("drones")
+
+        bridge.step()
+        startup.mark("first step")
+        startup.report("Startup")
+
+        # every frame of the mission is appended to a memory-mapped file, served by the replay endpoint
+        recorder = TrajectoryRecorder(run_id, n_drones=N_DRONES) if RECORD_TRAJECTORY else None
 
         # Run the simulation
-        run_simulation(sim, s_path, drones, fc)
+        if survey_mode == 'quadtree':
+            run_quadtree_simulation(bridge, drones, fc, grid_index, recorder=recorder)
+        elif survey_mode == 'swath':
+            swath_path = create_swath_path(tessellation.centers, cells_per_column, N_DRONES)
+            run_swath_simulation(bridge, swath_path, drones, fc, swath_offsets(N_DRONES), grid_index, recorder)
+        else:
+            s_path = create_s_path(tessellation.centers, cells_per_column)
+            # the Voronoi centers are not in grid columns: their route is always planned
+            if PATH_PLANNER == 's_path' and TESSELLATION == 'grid':
+                run_simulation(bridge, s_path, drones, fc, grid_index, recorder=recorder)
+            else:
+                route = plan_coverage_route(tessellation.centers, priority_matrix,
+                                            priority_first=PATH_PLANNER == 'tsp_priority',
+                                            start=drones[0].get_position())
+                report_route(route, s_path)
+                run_simulation(bridge, route, drones, fc, grid_index, recorder=recorder)
+        startup.mark("survey")
+        logging.info(f"Survey completed in {len(bridge.frame_rpc_counts)} frames "
+                     f"({sim.getSimulationTime():.1f} s of simulated time)")
+        result = {'grid': save_grid(grid_index, processed_path), 'frames': len(bridge.frame_rpc_counts),
+                  'run_id': run_id}
+        logging.info(f"Remote API round trips per frame: {bridge.average_rpc_per_frame():.1f} "
+                     f"({bridge.total_rpc_count} in total)")
+        logging.info(f"Laplacian cache: {fc.topology_cache_stats()}")
 
         sim.stopSimulation()
 
-        matrix = load_processed_matrix(processed_matrix_path)
+        matrix = result['grid']
         coordinates = find_value_coordinates(matrix, 3)
         path = create_straight_path(coordinates)
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
+        error = str(e)
+    finally:
+        # also after an error: the last chunk is flushed and the replay endpoint no longer sees the run in progress
+        if recorder is not None:
+            try:
+                recorder.close()
+                logging.info(f"Trajectory recorded: run {recorder.run_id}, {recorder.count} frames")
+            except Exception as e:
+                logging.error(f"Trajectory not closed: {e}")
+
+    record_mission(mission_id=run_id, started=started, priorities=priority_matrix, terrain_seed=RANDOM_SEED,
+                   tessellation=TESSELLATION, survey_mode=survey_mode, planner=PATH_PLANNER, backend=backend,
+                   result=result['grid'] if result is not None else None,
+                   frames=result['frames'] if result is not None else None,
+                   timings={stage: duration for stage, duration in startup.stages},
+                   trajectory=recorder.run_id if recorder is not None else None,
+                   error=error if result is None else None)
+    return result
 
 
 # Ora la griglia globale è accessibile anche all'esterno della funzione:
@@ -260,4 +526,4 @@ def shutdown(sim):
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else SIM_BACKEND)
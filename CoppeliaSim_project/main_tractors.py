@@ -4,9 +4,10 @@ import numpy as np
 import logging
 
 import math
-import matplotlib.pyplot as plt
 
-from CoppeliaSim_project.config import TOLERANCE
+from CoppeliaSim_project.config import TOLERANCE, SIM_BACKEND, TRACTOR_PATH_SPACING, TRACTOR_LOOKAHEAD
+from CoppeliaSim_project.headless_sim import HeadlessSim
+from CoppeliaSim_project.path_engine import BezierPath, bezier_quadratic
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -30,8 +31,9 @@ class Tractor:
 
         # set up path parameters
         self.path=[]
+        self.bezier_path = None
         self.config_to_reach = []
-        self.posAlongPath = 0
+        self.distance_along_path = 0.0  # arc length of the current target along the path
 
         self.previousSimulationTime = 0
 
@@ -62,58 +64,21 @@ class Tractor:
     # Definiamo una funzione per calcolare una curva di Bezier quadratica
     # dati i punti di controllo po, p1, p2 e e un parametro t che varia da 0 a 1.
     def bezier_quadratic(self,t, p0, p1, p2):
-        return (1 - t) ** 2 * p0 + 2 * (1 - t) * t * p1 + t ** 2 * p2
+        return bezier_quadratic(t, p0, p1, p2)
 
     def calculate_new_path(self, input_path):
+        """
+        Build the Bezier path through the configurations of input_path.
 
-        # Convertiamo la lista in un array NumPy per facilitare le operazioni
-        mypath = np.array(input_path)
-
-        # Estraiamo le prime due colonne (i primi due valori di ogni sottoarray)
-        primi_due_valori = mypath[:, :2]
-
-        # Estraiamo i valori di x e y dalla matrice
-        x = mypath[:, 0]
-        y = mypath[:, 1]
-
-        # Numero di punti di interpolazione (ad esempio, 10)
-        n = 10
-        interpolated_values =[]
-
-        # Iteriamo sulle coppie consecutive di punti
-        for i in range(len(x) - 1):
-            # Definisci il punto di controllo (puoi modificarlo per ottenere diverse curve)
-            p_control = (x[i] + x[i + 1]) / 2, (y[i] + y[i + 1]) / 2
-
-            # Creiamo un array con i valori di t per l'interpolazione
-            t = np.linspace(0, 1, n + 1)
-
-            # Calcoliamo i punti sulla curva di Bezier
-            x_intermedi = self.bezier_quadratic(t, x[i], p_control[0], x[i + 1])
-            y_intermedi = self.bezier_quadratic(t, y[i], p_control[1], y[i + 1])
-            interpolated_values.append(np.column_stack((x_intermedi, y_intermedi)))
-        self.path= np.vstack(interpolated_values)
+        All the segments are sampled at once, one point every TRACTOR_PATH_SPACING metres; the target of the
+        tractor then moves along the arc-length table of the path.
+        """
+        self.bezier_path = BezierPath(input_path, spacing=TRACTOR_PATH_SPACING)
+        self.path = self.bezier_path.points
 
         #set up the first point to reach for our tractor
-        self.config_to_reach = self.path[0]
-        self.posAlongPath = 0
-
-        # print(all_interpolated_values)
-        # Estraiamo i valori x e y dai dati interpolati
-        x_interpolated = self.path[:, 0]
-        y_interpolated = self.path[:, 1]
-
-        # Creiamo il grafico
-        #plt.plot(x_interpolated, y_interpolated, '-o', label='Dati interpolati')
-
-        # Aggiungiamo una legenda e dei titoli
-        #plt.xlabel('X')
-        #plt.ylabel('Y')
-        #plt.title('Grafico dei dati interpolati')
-        #plt.legend()
-
-        # Mostriamo il grafico
-        #plt.show()
+        self.distance_along_path = 0.0
+        self.config_to_reach = self.bezier_path.point_at(0.0)
 
 
     def next_animation_step(self, t_step):
@@ -150,29 +115,29 @@ class Tractor:
 
     def has_reached_target(self):
 
-        """Check if the tractor has reached its target position."""
+        """Check if the tractor has reached the end of its path, moving the target forward along the path."""
         # calculating point b_pos
         actual_pos = self.sim.getObjectPosition(self.point_b_handle, self.sim.handle_world)
 
         target_pos = self.config_to_reach
 
-        # Check if the drone is close enough to the target position
+        # Check if the tractor is close enough to the target position
         distance = np.linalg.norm(np.array(actual_pos[0:2]) - target_pos)
-        #print("distance: ", distance)
-        #print("tolerance: ", TOLERANCE)
         if distance < TOLERANCE:
-            self.posAlongPath +=1
-            self.config_to_reach = self.path[self.posAlongPath]
-            if self.posAlongPath < len(self.path):
-                return False
-            else:
+            if self.distance_along_path >= self.bezier_path.total_length:
                 return True
-        else:
-            return False
-
-def run_tractor_simulation():
-    client = RemoteAPIClient()
-    sim = client.require('sim')
+            # next target: TRACTOR_LOOKAHEAD metres further along the path
+            self.distance_along_path = min(self.distance_along_path + TRACTOR_LOOKAHEAD,
+                                           self.bezier_path.total_length)
+            self.config_to_reach = self.bezier_path.point_at(self.distance_along_path)
+        return False
+
+def run_tractor_simulation(backend=SIM_BACKEND):
+    if backend == 'headless':
+        sim = HeadlessSim()
+    else:
+        client = RemoteAPIClient()
+        sim = client.require('sim')
     sim.setStepping(True)
 
     sim.startSimulation()
@@ -202,6 +167,6 @@ def run_tractor_simulation():
     sim.stopSimulation()
 
 
-def main_tractors():
+def main_tractors(backend=SIM_BACKEND):
     print("Simulazione trattori avviata.")
-    run_tractor_simulation()
\ No newline at end of file
+    run_tractor_simulation(backend)
\ No newline at end of file
@@ -0,0 +1,156 @@
+import numpy as np
+
+# Interpolation used by the drones, same options as sim.getPathInterpolatedConfig
+DEFAULT_METHOD = {'type': 'quadraticBezier', 'strength': 1.0, 'forceOpen': False}
+
+
+def path_lengths(path, dof):
+    """
+    In-process equivalent of sim.getPathLengths.
+
+    Returns the distance of each path point from the first one, measured along the path, and the total length.
+    For poses (dof 3 or 7) only the position part is used to measure distances.
+    """
+    configs = np.asarray(path, dtype=float).reshape(-1, dof)
+    metric_part = configs[:, 0:3] if dof in (3, 7) else configs
+    segments = np.linalg.norm(np.diff(metric_part, axis=0), axis=1)
+    lengths = np.concatenate(([0.0], np.cumsum(segments)))
+    return lengths.tolist(), float(lengths[-1])
+
+
+def slerp(q0, q1, s):
+    """Spherical linear interpolation between two [x, y, z, w] quaternions."""
+    q0 = np.asarray(q0, dtype=float)
+    q1 = np.asarray(q1, dtype=float)
+    dot = np.dot(q0, q1)
+    if dot < 0:
+        # take the shortest arc
+        q1 = -q1
+        dot = -dot
+    if dot > 0.9995:
+        q = q0 + s * (q1 - q0)
+    else:
+        theta = np.arccos(dot)
+        q = (np.sin((1 - s) * theta) * q0 + np.sin(s * theta) * q1) / np.sin(theta)
+    return q / np.linalg.norm(q)
+
+
+class Trajectory:
+    """
+    Path evaluated locally instead of with sim.getPathInterpolatedConfig.
+
+    The path points and their cumulative lengths (the arc-length table) are computed once, then each query is a
+    binary search on the table plus a few vector operations. Positions follow the quadratic Bezier interpolation
+    used by CoppeliaSim, the orientation of 7-dof configurations is interpolated with slerp.
+    """
+
+    def __init__(self, path, dof=7, method=None, lengths=None):
+        method = method or DEFAULT_METHOD
+        self.dof = dof
+        self.configs = np.asarray(path, dtype=float).reshape(-1, dof)
+        if lengths is None:
+            lengths, _ = path_lengths(path, dof)
+        self.lengths = np.asarray(lengths, dtype=float)
+        self.total_length = float(self.lengths[-1])
+        self.bezier = method.get('type') == 'quadraticBezier'
+        self.strength = min(max(method.get('strength', 1.0), 0.05), 1.0)
+        # components interpolated as a quaternion
+        self.quaternion = slice(3, 7) if dof == 7 else None
+
+    def corner(self, i, t):
+        """Return the Bezier corner parameter around the inner point i, or None if t is not in the corner."""
+        w = self.strength / 2
+        start = self.lengths[i] - w * (self.lengths[i] - self.lengths[i - 1])
+        end = self.lengths[i] + w * (self.lengths[i + 1] - self.lengths[i])
+        if start <= t <= end and end > start:
+            return (t - start) / (end - start)
+        return None
+
+    def interpolate(self, t):
+        """Return the configuration at the distance t along the path."""
+        configs, lengths = self.configs, self.lengths
+        t = min(max(t, lengths[0]), lengths[-1])
+        n = len(lengths)
+        if n == 1:
+            return configs[0].copy()
+        i = int(np.searchsorted(lengths, t, side='right')) - 1
+        i = min(max(i, 0), n - 2)
+        span = lengths[i + 1] - lengths[i]
+        s = (t - lengths[i]) / span if span > 0 else 0.0
+        config = (1 - s) * configs[i] + s * configs[i + 1]
+
+        if self.bezier and n > 2:
+            # inner points are rounded with a quadratic Bezier going from the middle of the incoming segment to the
+            # middle of the outgoing one (for strength 1) with the point itself as control point
+            for k in (i, i + 1):
+                if 0 < k < n - 1:
+                    u = self.corner(k, t)
+                    if u is not None:
+                        w = self.strength / 2
+                        start = configs[k] + w * (configs[k - 1] - configs[k])
+                        end = configs[k] + w * (configs[k + 1] - configs[k])
+                        config = (1 - u) ** 2 * start + 2 * u * (1 - u) * configs[k] + u ** 2 * end
+                        break
+
+        if self.quaternion is not None:
+            config[self.quaternion] = slerp(configs[i, self.quaternion], configs[i + 1, self.quaternion], s)
+        return config
+
+
+def interpolated_config(path, lengths, t, method=None):
+    """In-process equivalent of sim.getPathInterpolatedConfig."""
+    dof = len(path) // len(lengths)
+    return Trajectory(path, dof, method, lengths).interpolate(t).tolist()
+
+
+def bezier_quadratic(t, p0, p1, p2):
+    """Quadratic Bezier curve with control points p0, p1, p2 at the parameters t (broadcast)."""
+    return (1 - t) ** 2 * p0 + 2 * (1 - t) * t * p1 + t ** 2 * p2
+
+
+class BezierPath:
+    """
+    Planar path through waypoints made of one quadratic Bezier segment per pair of consecutive waypoints.
+
+    Every segment is sampled in a single batched evaluation, with a number of samples proportional to its length
+    (one every `spacing` metres), and the cumulative arc length of the samples is kept as a table: the point at a
+    given distance along the path is a binary search on the table plus a linear interpolation.
+    """
+
+    def __init__(self, waypoints, controls=None, spacing=0.1):
+        waypoints = np.asarray(waypoints, dtype=float)[:, 0:2]
+        if len(waypoints) < 2:
+            self.points = waypoints.copy()
+            self.lengths = np.zeros(len(waypoints))
+            self.total_length = 0.0
+            return
+        p0, p2 = waypoints[:-1], waypoints[1:]
+        # without explicit control points the control point is the middle of the segment
+        p1 = (p0 + p2) / 2 if controls is None else np.asarray(controls, dtype=float)[:, 0:2]
+
+        # the length of a quadratic Bezier is between the chord and the control polygon
+        estimate = (np.linalg.norm(p2 - p0, axis=1) + np.linalg.norm(p1 - p0, axis=1)
+                    + np.linalg.norm(p2 - p1, axis=1)) / 2
+        samples = np.maximum(np.ceil(estimate / spacing).astype(int), 1)
+        segment = np.repeat(np.arange(len(samples)), samples)
+        first_sample = np.repeat(np.cumsum(samples) - samples, samples)
+        t = ((np.arange(len(segment)) - first_sample) / samples[segment])[:, np.newaxis]
+
+        # each segment contributes its samples for t in [0, 1), the last waypoint closes the path
+        self.points = np.vstack((bezier_quadratic(t, p0[segment], p1[segment], p2[segment]), waypoints[-1:]))
+        steps = np.linalg.norm(np.diff(self.points, axis=0), axis=1)
+        self.lengths = np.concatenate(([0.0], np.cumsum(steps)))
+        self.total_length = float(self.lengths[-1])
+
+    def __len__(self):
+        return len(self.points)
+
+    def point_at(self, distance):
+        """Point at the given distance along the path, clamped to the path ends."""
+        if len(self.points) == 1:
+            return self.points[0].copy()
+        distance = min(max(distance, 0.0), self.total_length)
+        i = min(int(np.searchsorted(self.lengths, distance, side='right')) - 1, len(self.points) - 2)
+        span = self.lengths[i + 1] - self.lengths[i]
+        s = (distance - self.lengths[i]) / span if span > 0 else 0.0
+        return (1 - s) * self.points[i] + s * self.points[i + 1]
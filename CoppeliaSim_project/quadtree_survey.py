@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+from CoppeliaSim_project.config import QUADTREE_HOMOGENEITY, QUADTREE_MAX_ALTITUDE
+
+
+class QuadtreeNode:
+    """Block of grid cells [ix, ix + nx) x [iy, iy + ny) and the result of its reading."""
+
+    def __init__(self, ix, iy, nx, ny, level):
+        self.ix, self.iy = ix, iy
+        self.nx, self.ny = nx, ny
+        self.level = level  # 0 for the coarsest blocks
+        self.terrain_class = 0  # dominant class of the reading, 0 until the block is read
+        self.fractions = None  # fraction of the pixels of each class 1..3
+        self.children = []
+
+    def is_cell(self):
+        return self.nx == 1 and self.ny == 1
+
+    def split(self):
+        """Divide the block in (up to) four children, halving each side."""
+        half_x, half_y = (self.nx + 1) // 2, (self.ny + 1) // 2
+        self.children = []
+        for ix, nx in ((self.ix, half_x), (self.ix + half_x, self.nx - half_x)):
+            for iy, ny in ((self.iy, half_y), (self.iy + half_y, self.ny - half_y)):
+                if nx > 0 and ny > 0:
+                    self.children.append(QuadtreeNode(ix, iy, nx, ny, self.level + 1))
+        return self.children
+
+
+class QuadtreeSurvey:
+    """
+    Adaptive multi-resolution survey of a GridIndex.
+
+    The field is first read in coarse square blocks, from the altitude at which the sensor footprint covers the
+    whole block. Blocks whose reading is dominated by one class are accepted as homogeneous and all their cells get
+    that class; mixed blocks are split in four and their children read from a lower altitude, down to single cells.
+    """
+
+    def __init__(self, grid_index, view_angle, max_altitude=QUADTREE_MAX_ALTITUDE,
+                 homogeneity=QUADTREE_HOMOGENEITY):
+        self.grid_index = grid_index
+        self.tan_half_view = math.tan(view_angle / 2)
+        self.homogeneity = homogeneity  # minimum fraction of the dominant class to accept a block
+        # largest power of two block (in cells) the sensor can see from max_altitude
+        max_cells = max_altitude * self.tan_half_view * 2 / grid_index.cell_size
+        self.root_size = 2 ** max(int(math.floor(math.log2(max(max_cells, 1)))), 0)
+        self.roots = [QuadtreeNode(ix, iy, min(self.root_size, grid_index.nx - ix),
+                                   min(self.root_size, grid_index.ny - iy), 0)
+                      for ix in range(0, grid_index.nx, self.root_size)
+                      for iy in range(0, grid_index.ny, self.root_size)]
+        self.n_readings = 0
+
+    def altitude(self, node):
+        """Altitude from which the sensor footprint covers the block."""
+        side = max(node.nx, node.ny) * self.grid_index.cell_size
+        return side / 2 / self.tan_half_view
+
+    def waypoint(self, node):
+        """Leader configuration over the center of the block."""
+        size = self.grid_index.cell_size
+        return [(node.ix + node.nx / 2) * size, (node.iy + node.ny / 2) * size, self.altitude(node), 0, 0, 0, 1]
+
+    def record(self, node, histogram):
+        """
+        Store the reading of a block given as pixel histogram per class (index 0: unknown colours).
+
+        Returns the children to read next, empty if the block is accepted.
+        """
+        self.n_readings += 1
+        counts = np.asarray(histogram[1:], dtype=float)
+        total = counts.sum()
+        node.fractions = counts / total if total > 0 else counts
+        node.terrain_class = int(np.argmax(counts)) + 1 if total > 0 else 0
+        if node.is_cell() or (total > 0 and node.fractions.max() >= self.homogeneity):
+            self.grid_index.fill(node.ix, node.iy, node.nx, node.ny, node.terrain_class)
+            return []
+        return node.split()
+
+    def pending(self):
+        """Blocks to read, in visiting order: the roots along an S path, the children right after their parent."""
+        columns = {}
+        for node in self.roots:
+            columns.setdefault(node.ix, []).append(node)
+        order = []
+        for n_column, ix in enumerate(sorted(columns)):
+            order.extend(columns[ix] if n_column % 2 == 0 else columns[ix][::-1])
+        return order[::-1]  # used as a stack
+
+    def run(self, read_block):
+        """Survey every block with read_block(node) -> class histogram, return the number of readings."""
+        stack = self.pending()
+        while stack:
+            node = stack.pop()
+            children = self.record(node, read_block(node))
+            stack.extend(reversed(children))
+        return self.n_readings
+
+    def leaves(self):
+        """Accepted blocks of the quadtree."""
+        stack, leaves = list(self.roots), []
+        while stack:
+            node = stack.pop()
+            if node.children:
+                stack.extend(node.children)
+            else:
+                leaves.append(node)
+        return leaves
@@ -0,0 +1,217 @@
+import logging
+
+# Lua helper installed inside CoppeliaSim: it lets the bridge read or write the pose of every registered object
+# with a single remote call instead of one getObjectPosition/getObjectQuaternion round trip per object.
+BRIDGE_SCRIPT = """
+function getPoses(handles)
+    local poses = {}
+    for i = 1, #handles, 1 do
+        poses[i] = sim.getObjectPose(handles[i], sim.handle_world)
+    end
+    return poses
+end
+
+function setPoses(handles, poses)
+    for i = 1, #handles, 1 do
+        sim.setObjectPose(handles[i], poses[i], sim.handle_world)
+    end
+end
+
+function readVisionImage(handle)
+    sim.handleVisionSensor(handle)
+    local image, resolution = sim.getVisionSensorImg(handle)
+    return image, resolution
+end
+"""
+
+# Forwarded calls that neither depend on nor change object poses: they can run with writes still queued
+POSE_INDEPENDENT_CALLS = ('getPathLengths', 'getPathInterpolatedConfig', 'getSimulationTime', 'getObject',
+                          'setObjectAlias')
+# Forwarded calls that read the scene without moving anything
+POSE_READING_CALLS = ('handleVisionSensor', 'getVisionSensorImg')
+
+
+class SimBridge:
+    """
+    Drop-in proxy for the CoppeliaSim `sim` object that batches the pose traffic of a simulation step.
+
+    Object poses read in world coordinates are cached until the next `step()`, writes are queued and pushed to the
+    simulator in one bulk request right before stepping. Every other call is forwarded to the wrapped `sim` unchanged.
+    The number of remote calls is counted, so the cost of each frame can be inspected with `frame_rpc_counts`.
+    """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.handles = []  # objects whose pose is exchanged in bulk
+        self.pose_cache = {}  # handle -> [x, y, z, qx, qy, qz, qw] in world coordinates
+        self.pending_poses = {}  # handle -> pose to be written on the next flush
+        self.rpc_count = 0  # remote calls issued since the last step
+        self.total_rpc_count = 0
+        self.frame_rpc_counts = []  # remote calls issued for each simulation step
+        self.script_handle = None
+        self.install_bridge_script()
+
+    def __getattr__(self, name):
+        """Forward everything the bridge does not handle to the wrapped sim, counting the remote calls."""
+        attribute = getattr(self.sim, name)
+        if not callable(attribute):
+            return attribute
+
+        def remote_call(*args):
+            if name in POSE_INDEPENDENT_CALLS:
+                self.count_rpc()
+                return attribute(*args)
+            # the call depends on the scene: queued poses must reach the simulator first
+            self.flush()
+            self.count_rpc()
+            result = attribute(*args)
+            if name not in POSE_READING_CALLS:
+                # the call may have moved objects (parenting, model loading, ...)
+                self.pose_cache.clear()
+            return result
+
+        return remote_call
+
+    def count_rpc(self, n=1):
+        """Account for n remote calls."""
+        self.rpc_count += n
+        self.total_rpc_count += n
+
+    def install_bridge_script(self):
+        """Install the bulk pose script in the scene, falling back to one call per object if it is not possible."""
+        try:
+            self.script_handle = self.sim.createScript(self.sim.scripttype_customization, BRIDGE_SCRIPT, 0, 'lua')
+            self.count_rpc()
+            logging.info(f"Bulk pose script installed: {self.script_handle}")
+        except Exception as e:
+            self.script_handle = None
+            logging.warning(f"Bulk pose script not available, falling back to per-object calls: {e}")
+
+    def register(self, handle):
+        """Add an object to the set of poses exchanged in bulk."""
+        if handle not in self.handles and handle != -1:
+            self.handles.append(handle)
+
+    def is_world(self, relative_to):
+        return relative_to == -1 or relative_to == self.sim.handle_world
+
+    def fetch_poses(self):
+        """Read the pose of every registered object with one request and refresh the cache."""
+        if not self.handles:
+            return
+        if self.script_handle is not None:
+            poses = self.sim.callScriptFunction('getPoses', self.script_handle, self.handles)
+            self.count_rpc()
+        else:
+            poses = []
+            for handle in self.handles:
+                poses.append(self.sim.getObjectPose(handle, self.sim.handle_world))
+                self.count_rpc()
+        for handle, pose in zip(self.handles, poses):
+            # a pending write is newer than what the simulator still holds
+            if handle not in self.pending_poses:
+                self.pose_cache[handle] = list(pose)
+
+    def get_pose(self, handle):
+        """Return the world pose of an object, fetching all registered poses at once on a cache miss."""
+        if handle not in self.pose_cache:
+            self.register(handle)
+            self.fetch_poses()
+        return self.pose_cache[handle]
+
+    def set_pose(self, handle, pose):
+        """Queue a world pose write, the value is visible to subsequent reads immediately."""
+        self.register(handle)
+        self.pose_cache[handle] = list(pose)
+        self.pending_poses[handle] = self.pose_cache[handle]
+
+    def flush(self):
+        """Push every queued pose write to the simulator with one request."""
+        if not self.pending_poses:
+            return
+        handles = list(self.pending_poses.keys())
+        poses = [self.pending_poses[handle] for handle in handles]
+        if self.script_handle is not None:
+            self.sim.callScriptFunction('setPoses', self.script_handle, handles, poses)
+            self.count_rpc()
+        else:
+            for handle, pose in zip(handles, poses):
+                self.sim.setObjectPose(handle, pose, self.sim.handle_world)
+                self.count_rpc()
+        self.pending_poses.clear()
+
+    def read_vision_image(self, handle):
+        """Render a vision sensor and return its RGB image and resolution with one request."""
+        self.flush()
+        if self.script_handle is not None:
+            image, resolution = self.sim.callScriptFunction('readVisionImage', self.script_handle, handle)
+            self.count_rpc()
+            return image, resolution
+        self.sim.handleVisionSensor(handle)
+        self.count_rpc()
+        image, resolution = self.sim.getVisionSensorImg(handle)
+        self.count_rpc()
+        return image, resolution
+
+    def step(self):
+        """Flush the queued writes, advance the simulation and start a new frame."""
+        self.flush()
+        self.sim.step()
+        self.count_rpc()
+        self.frame_rpc_counts.append(self.rpc_count)
+        logging.debug(f"Remote calls for this frame: {self.rpc_count}")
+        self.rpc_count = 0
+        # the simulator moved the objects, cached poses are stale
+        self.pose_cache.clear()
+
+    def average_rpc_per_frame(self):
+        """Return the mean number of remote calls per simulation step."""
+        if not self.frame_rpc_counts:
+            return 0
+        return sum(self.frame_rpc_counts) / len(self.frame_rpc_counts)
+
+    # --- sim API calls served from the pose cache ---
+
+    def getObjectPosition(self, handle, relative_to):
+        if not self.is_world(relative_to):
+            self.flush()
+            self.count_rpc()
+            return self.sim.getObjectPosition(handle, relative_to)
+        return self.get_pose(handle)[0:3]
+
+    def getObjectQuaternion(self, handle, relative_to):
+        if not self.is_world(relative_to):
+            self.flush()
+            self.count_rpc()
+            return self.sim.getObjectQuaternion(handle, relative_to)
+        return self.get_pose(handle)[3:7]
+
+    def getObjectPose(self, handle, relative_to):
+        if not self.is_world(relative_to):
+            self.flush()
+            self.count_rpc()
+            return self.sim.getObjectPose(handle, relative_to)
+        return list(self.get_pose(handle))
+
+    def setObjectPosition(self, handle, arg1, arg2):
+        # both the (handle, position, relativeTo) and the legacy (handle, relativeTo, position) forms are in use
+        position, relative_to = (arg2, arg1) if isinstance(arg1, int) else (arg1, arg2)
+        if not self.is_world(relative_to):
+            self.flush()
+            self.count_rpc()
+            self.sim.setObjectPosition(handle, position, relative_to)
+            self.pose_cache.pop(handle, None)
+            return
+        pose = self.get_pose(handle)
+        self.set_pose(handle, list(position[0:3]) + pose[3:7])
+
+    def setObjectQuaternion(self, handle, arg1, arg2):
+        quaternion, relative_to = (arg2, arg1) if isinstance(arg1, int) else (arg1, arg2)
+        if not self.is_world(relative_to):
+            self.flush()
+            self.count_rpc()
+            self.sim.setObjectQuaternion(handle, quaternion, relative_to)
+            self.pose_cache.pop(handle, None)
+            return
+        pose = self.get_pose(handle)
+        self.set_pose(handle, pose[0:3] + list(quaternion[0:4]))
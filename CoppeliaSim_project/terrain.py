@@ -1,17 +1,60 @@
+import hashlib
+import logging
 import os
+import shutil
 
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.colors import LinearSegmentedColormap
-from math import exp
+from matplotlib.colors import LinearSegmentedColormap, Normalize
+from matplotlib.ticker import MaxNLocator
+from PIL import Image
 import matplotlib
 matplotlib.use('Agg')  # Use a non-interactive backend
 
+from CoppeliaSim_project.config import TERRAIN_CACHE_DIR, TEXTURE_SIZE, TERRAIN_VERSION
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# a relative cache directory is in the repository root, whatever the working directory of the process
+TERRAIN_CACHE_PATH = os.path.abspath(os.path.join(BASE_DIR, '..', TERRAIN_CACHE_DIR))
+
+
+# Terrain generated last, read by the sensors that sample the field instead of rendering it
+current_terrain = None
+
+
+def get_current_terrain():
+    """Return the terrain generated last, None if no terrain exists yet."""
+    return current_terrain
+
+
+def contour_bands(Z, cmap, n_levels=3):
+    """
+    Return the levels and the RGB colour of each band of contourf(Z, levels=n_levels, cmap=cmap).
+
+    Same rules as matplotlib: the levels are the "nice" ticks of MaxNLocator cut to the range of Z and every band
+    takes the colour of its middle value, normalized between the first and the last level.
+    """
+    levels = MaxNLocator(n_levels + 1, min_n_ticks=1).tick_values(Z.min(), Z.max())
+    under = np.nonzero(levels < Z.min())[0]
+    over = np.nonzero(levels > Z.max())[0]
+    levels = levels[(under[-1] if len(under) else 0):(over[0] + 1 if len(over) else len(levels))]
+    layers = 0.5 * (levels[:-1] + levels[1:])
+    colors = cmap(Normalize(levels[0], levels[-1])(layers))[:, 0:3]
+    return levels, np.round(colors * 255).astype(np.uint8)
+
+
+def texture_cache_key(seed, means, sigmas, weights, *settings):
+    """Return the name under which the texture of a field is cached."""
+    parameters = [seed, np.round(np.asarray(means, dtype=float), 12).tolist(),
+                  np.round(np.asarray(sigmas, dtype=float), 12).tolist(),
+                  np.round(np.asarray(weights, dtype=float), 12).tolist(), list(settings)]
+    return hashlib.sha1(repr(parameters).encode()).hexdigest()[:16]
+
 
 class Terrain:
-    def __init__(self, sim):
+    def __init__(self, sim, texture_path="texture.png"):
         self.sim = sim
-        self.texture_file_name = "texture.png"
+        # copy of the texture served by the web app, None: the simulator loads the cached texture itself
+        self.texture_file_name = texture_path
         self.last_color_change_time = 0
         self.colors = ["#2e7411", "#a7ee89", "#c1951c"]  # verde scuro, verde chiaro, marroncino
         self.width = 6
@@ -19,21 +62,28 @@ class Terrain:
         self.height = 0.1
         self.terrain_handle = 0
         self.texture_id = 0
+        # ground truth: GMM field sampled on a regular grid spanning the whole terrain, Z[i, j] at (x[j], y[i])
+        self.field = None
+        self.field_levels = None  # contour levels separating the colour bands of the texture
+        self.band_colors = None  # RGB colour of each band
         self.init_terrain(xlim=(-0.1, 1.1), ylim=(-0.1, 1.1), resolution=100)
 
+        global current_terrain
+        current_terrain = self
+
     def get_dimensions(self):
         return self.width, self.length
 
-    def init_terrain(self, xlim: tuple, ylim: tuple, resolution):
+    def init_terrain(self, xlim: tuple, ylim: tuple, resolution, seed=None, texture_size=TEXTURE_SIZE):
         """
-                Plots a 2D Gaussian Mixture Model (GMM) distribution over a specified range.
+                Generates a 2D Gaussian Mixture Model (GMM) field over a specified range and uses it as terrain texture.
 
                 Parameters:
-                - mean: The mean of the Gaussian distribution (x, y).
-                - sigma: The standard deviation of the Gaussian distribution.
                 - xlim: Tuple specifying the x-axis limits (xmin, xmax).
                 - ylim: Tuple specifying the y-axis limits (ymin, ymax).
                 - resolution: The number of points in each axis direction for the grid (higher means smoother).
+                - seed: Seed of the random means and weights, None uses the global numpy random state.
+                - texture_size: Side of the texture image in pixels.
                 """
         # Create a grid of points
         x = np.linspace(xlim[0], xlim[1], resolution)
@@ -45,37 +95,40 @@ class Terrain:
         sigmas = [0.3, 0.3, 0.4]  # Standard deviation = variance for each Gaussian component
         # weights = [0.25, 0.35, 0.40]  # Weights for each component, they sum to 1
 
+        random = np.random if seed is None else np.random.RandomState(seed)
+
         # Generate 3 random Gaussian means as 2D tuples (x, y)
-        means = [(np.random.uniform(xlim[0], xlim[1]), np.random.uniform(ylim[0], ylim[1])) for _ in range(3)]
+        means = [(random.uniform(xlim[0], xlim[1]), random.uniform(ylim[0], ylim[1])) for _ in range(3)]
 
         # Generate random weights and normalize them to sum to 1
-        weights = np.random.rand(3)
+        weights = random.rand(3)
         weights /= weights.sum()  # Normalize so that they sum to 1
 
         # Calculate Gaussian Mixture Model (GMM) values over the grid
-        Z = np.array([self.gauss_pdf_mixture(x, y, means, sigmas, weights) for x, y in zip(np.ravel(X), np.ravel(Y))])
-        Z = Z.reshape(X.shape)
-
-        # Create a custom colormap
+        Z = self.gauss_pdf_mixture(X, Y, means, sigmas, weights)
+        self.field = Z
         cmap = LinearSegmentedColormap.from_list("field_colors", self.colors, N=256)
-
-        # setup fig dimensions --> use the /2.54 to convert from inches to cm
-        fig = plt.figure(figsize=(100 / 2.54, 100 / 2.54))
-
-        # Plot the Gaussian Mixture Model distribution as a heatmap
-        plt.contourf(X, Y, Z, levels=3, cmap=cmap)
-
-        # remove axis from the generated map
-        plt.axis('off')
-        # save the generated figure as png file
-        plt.savefig(self.texture_file_name, format='png', bbox_inches='tight', pad_inches=0)
-
-        # Show the plot
-        # plt.show()
+        self.field_levels, self.band_colors = contour_bands(Z, cmap)
+
+        # the texture only depends on the mixture parameters: reuse the image of an identical field
+        key = texture_cache_key(seed, means, sigmas, weights, xlim, ylim, resolution, texture_size, TERRAIN_VERSION)
+        cached_texture = os.path.join(TERRAIN_CACHE_PATH, f"texture_{key}.png")
+        if not os.path.exists(cached_texture):
+            image = self.render_texture(means, sigmas, weights, xlim, ylim, texture_size)
+            os.makedirs(TERRAIN_CACHE_PATH, exist_ok=True)
+            # saved under a name of this process and renamed: the other workers never read a half-written image
+            temp_path = f"{cached_texture}.{os.getpid()}.tmp"
+            image.save(temp_path, format='png')
+            os.replace(temp_path, cached_texture)
+            logging.info(f"Terrain texture generated: {cached_texture}")
+        else:
+            logging.info(f"Terrain texture loaded from cache: {cached_texture}")
+        if self.texture_file_name is not None:
+            shutil.copyfile(cached_texture, self.texture_file_name)
 
         # Create a primitive texture shape (small plane)
         # Ensure absolute path
-        path = os.path.abspath("texture.png")
+        path = os.path.abspath(self.texture_file_name or cached_texture)
         #print("Absolute path to texture:", path)
 
         shape, self.texture_id, res = self.sim.createTexture(path, 2, [1, 1], [2, 2], [0, 0, 0], 128, None)
@@ -94,20 +147,57 @@ class Terrain:
         # moving the texture away from the scene
         self.sim.setObjectPosition(shape, [50, 50, 50], self.sim.handle_world)
 
+    def render_texture(self, means, sigmas, weights, xlim, ylim, texture_size):
+        """
+        Draw the field as the three colour texture image.
+
+        The colour bands are the filled contours matplotlib draws with contourf(levels=3) on the sampled field,
+        each pixel takes the colour of the band of the field value at its center.
+        """
+        # pixel centers, image row 0 is the top (max y) of the field
+        x = xlim[0] + (np.arange(texture_size) + 0.5) * (xlim[1] - xlim[0]) / texture_size
+        y = ylim[1] - (np.arange(texture_size) + 0.5) * (ylim[1] - ylim[0]) / texture_size
+        X, Y = np.meshgrid(x, y)
+        bands = np.digitize(self.gauss_pdf_mixture(X, Y, means, sigmas, weights), self.field_levels[1:-1], right=True)
+        return Image.fromarray(self.band_colors[bands], 'RGB')
+
+    def sample_field(self, x, y):
+        """Value of the field at world points (x, y), bilinear interpolation of the stored field array."""
+        rows, cols = self.field.shape
+        # the field grid spans the terrain plane, from (0, 0) to (width, length)
+        u = np.clip(np.asarray(x, dtype=float) / self.width * (cols - 1), 0, cols - 1)
+        v = np.clip(np.asarray(y, dtype=float) / self.length * (rows - 1), 0, rows - 1)
+        j = np.minimum(u.astype(int), cols - 2)
+        i = np.minimum(v.astype(int), rows - 2)
+        du, dv = u - j, v - i
+        f = self.field
+        return ((f[i, j] * (1 - du) + f[i, j + 1] * du) * (1 - dv) +
+                (f[i + 1, j] * (1 - du) + f[i + 1, j + 1] * du) * dv)
+
+    def field_colors(self, x, y):
+        """Texture colour (RGB bytes) at world points (x, y)."""
+        return self.band_colors[np.digitize(self.sample_field(x, y), self.field_levels[1:-1], right=True)]
+
+    def footprint_colors(self, x, y, half_size, samples):
+        """Texture colours on a samples x samples grid over the square footprint centered in (x, y)."""
+        offsets = (np.arange(samples) + 0.5) / samples * 2 * half_size - half_size
+        X, Y = np.meshgrid(np.clip(x + offsets, 0, self.width), np.clip(y + offsets, 0, self.length))
+        return self.field_colors(X, Y)
+
     def gauss_pdf_mixture(self, x, y, means, sigmas, weights):
         """
-        Calculate the value of a Gaussian Mixture Model (GMM) at point (x, y).
+        Calculate the value of a Gaussian Mixture Model (GMM) at point (x, y), x and y can be arrays of points.
 
         Parameters:
         - means: List of tuples, where each tuple is a mean (xt, yt) for a Gaussian component.
         - sigmas: List of standard deviations for each Gaussian component.
         - weights: List of weights for each Gaussian component (must sum to 1).
         """
-        result = 0
-        for mean, sigma, weight in zip(means, sigmas, weights):
-            xt, yt = mean
-            # Gaussian 2D formula
-            temp = ((x - xt) ** 2 + (y - yt) ** 2) / (2 * sigma ** 2)
-            gaussian_val = exp(-temp) / (2 * np.pi * sigma ** 2)
-            result += weight * gaussian_val
-        return result
+        x = np.asarray(x, dtype=float)[..., np.newaxis]
+        y = np.asarray(y, dtype=float)[..., np.newaxis]
+        means = np.asarray(means, dtype=float)
+        sigmas = np.asarray(sigmas, dtype=float)
+        # Gaussian 2D formula, broadcast over the points (leading axes) and the components (last axis)
+        temp = ((x - means[:, 0]) ** 2 + (y - means[:, 1]) ** 2) / (2 * sigmas ** 2)
+        gaussian_val = np.exp(-temp) / (2 * np.pi * sigmas ** 2)
+        return (gaussian_val * np.asarray(weights, dtype=float)).sum(axis=-1)
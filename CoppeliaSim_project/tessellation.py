@@ -1,17 +1,80 @@
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
 import logging
 
+import shapely
 from matplotlib import patches
-from shapely.geometry import Polygon
-from scipy.spatial import Voronoi
+from scipy.spatial import Voronoi, cKDTree
 
-np.random.seed(42)
+from CoppeliaSim_project.config import LLOYD_ITERATIONS, TESSELLATION, TESSELLATION_PLOTS
+from CoppeliaSim_project.coverage_planner import priority_at
+from CoppeliaSim_project.grid_index import GridIndex
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+# Images of the diagnostic plots, written in the working directory
+PLOT_FILES = {'voronoi': "voronoi_tessellation.png", 'grid': "grid_tessellation.png"}
+
+
+class TerrainDimensions:
+    """Stand-in for the terrain with only its dimensions, used to send a tessellation to another process."""
+
+    def __init__(self, width, length):
+        self.width, self.length = width, length
+
+    def get_dimensions(self):
+        return self.width, self.length
+
+
+def save_tessellation_plot(tessellation, kind):
+    """Draw a tessellation and save it to its PLOT_FILES image."""
+    plt.switch_backend('Agg')  # the worker only writes images
+    if kind == 'voronoi':
+        tessellation.plot_voronoi()
+    else:
+        tessellation.plot_grid()
+        plt.savefig(PLOT_FILES['grid'])
+    plt.close('all')
+
+
+def plot_in_background(tessellation, kind):
+    """
+    Render the diagnostic plot of a tessellation in a worker process, off the mission start path.
+
+    Returns the process, None if it could not be started: the plot is then skipped and the mission goes on.
+    """
+    # spawn: the worker does not inherit the simulator connection or the web server threads
+    process = multiprocessing.get_context('spawn').Process(target=save_tessellation_plot, args=(tessellation, kind),
+                                                           daemon=True)
+    try:
+        process.start()
+    except Exception as e:  # e.g. started during the bootstrapping of a script without a __main__ guard
+        logging.warning(f"Tessellation plot skipped, the plot process could not be started: {' '.join(str(e).split())}")
+        return None
+    return process
+
+
+def voronoi_regions(points, bounds):
+    """
+    Voronoi regions of points clipped to the rectangle bounds = (xmin, ymin, xmax, ymax), in the order of points.
+
+    Every region is kept: the unbounded ones at the border are closed against the rectangle. All the geometry work
+    is done in bulk by the shapely 2.0 array functions.
+    """
+    bbox = shapely.box(*bounds)
+    seeds = shapely.points(np.asarray(points, dtype=float))
+    regions = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(seeds), extend_to=bbox))
+    # voronoi_polygons does not keep the order of the points: match every point with the region containing it
+    point_index, region_index = shapely.STRtree(regions).query(seeds, predicate='intersects')
+    first = np.unique(point_index, return_index=True)[1]
+    ordered = np.empty(len(seeds), dtype=object)
+    ordered[point_index[first]] = regions[region_index[first]]
+    return shapely.intersection(ordered, bbox)
+
+
 class Tessellation:
     terrain = None
     clipped_regions = None
@@ -25,25 +88,80 @@ class Tessellation:
         self.squares = []
         self.grid_size = grid_size
         self.priority_matrix = priority_matrix
+        self.grid_index = None
+
+    def __getstate__(self):
+        """Pickle without the terrain (it holds the simulator), plots only need its dimensions."""
+        state = self.__dict__.copy()
+        state['terrain'] = TerrainDimensions(*self.terrain.get_dimensions())
+        return state
 
     def generate_voronoi(self):
         """Generate Voronoi tessellation."""
         vor = Voronoi(self.points)
         return vor
 
-    def clip_voronoi(self, vor):
-        """Ritaglia le regioni di Voronoi all'interno dei limiti del terreno."""
-        (xmin, ymin, xmax, ymax) = (0, 0, self.width, self.height)
-        bbox = Polygon([(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin)])  # Limiti del terreno
-        regions = []
-        for region_index in vor.regions:
-            if not region_index or -1 in region_index:  # Salta regioni infinite o vuote
-                continue
-            polygon = Polygon([vor.vertices[i] for i in region_index if i >= 0])
-            clipped = polygon.intersection(bbox)  # Ritaglia il poligono
-            if not clipped.is_empty:
-                regions.append(clipped)
-        return regions
+    def clip_voronoi(self, vor=None):
+        """
+        Ritaglia le regioni di Voronoi all'interno dei limiti del terreno, regioni di bordo comprese.
+
+        The regions are computed in bulk from self.points, vor is only accepted for compatibility.
+        """
+        regions = voronoi_regions(self.points, (0, 0, self.width, self.height))
+        return [region for region in regions if not region.is_empty]
+
+    def priority_density(self, x, y):
+        """
+        Density of the Lloyd relaxation at (x, y), uniform without priorities.
+
+        Region areas of a weighted centroidal Voronoi scale with density^(-1/2), the density is the square of
+        4 - priority so that the area of the regions is inversely proportional to it (priority 1 = high).
+        """
+        if self.priority_matrix is None:
+            return np.ones(np.shape(x))
+        return (4 - priority_at(self.priority_matrix, x, y, self.grid_size)) ** 2
+
+    def lloyd_relaxation(self, iterations=30, samples_per_region=16, tolerance=1e-3, resample=True):
+        """
+        Move the points to the density-weighted centroids of their regions (weighted centroidal Voronoi).
+
+        The density follows the priority map, so the regions get smaller where the priority is higher. The
+        centroids are computed on a regular sampling of the terrain, each sample belonging to the region of its
+        nearest point. Lloyd iterations only move the points locally, with resample the points are first drawn
+        from the density of the relaxed tessellation. Returns the number of iterations done.
+        """
+        # sampling step giving about samples_per_region samples per region, at least 100 x 100 samples in total
+        n_samples = max(samples_per_region * len(self.points), 10000)
+        spacing = np.sqrt(self.width * self.height / n_samples)
+        nx_samples = max(int(self.width / spacing), 1)
+        ny_samples = max(int(self.height / spacing), 1)
+        X, Y = np.meshgrid((np.arange(nx_samples) + 0.5) * self.width / nx_samples,
+                           (np.arange(ny_samples) + 0.5) * self.height / ny_samples)
+        samples = np.column_stack((X.ravel(), Y.ravel()))
+        density = self.priority_density(samples[:, 0], samples[:, 1]).astype(float)
+        n_points = len(self.points)
+
+        if resample:
+            # the points of a weighted centroidal Voronoi are distributed as density^(1/2)
+            probability = np.sqrt(density) / np.sqrt(density).sum()
+            chosen = np.random.choice(len(samples), n_points, replace=False, p=probability)
+            self.points = samples[chosen] + np.random.uniform(-spacing / 2, spacing / 2, (n_points, 2))
+
+        iteration, shift = 0, 0.0  # iterations=0: the points are only resampled
+        for iteration in range(1, iterations + 1):
+            _, owner = cKDTree(self.points).query(samples)
+            mass = np.bincount(owner, density, minlength=n_points)
+            centroids = self.points.copy()
+            filled = mass > 0
+            for axis in range(2):
+                moment = np.bincount(owner, density * samples[:, axis], minlength=n_points)
+                centroids[filled, axis] = moment[filled] / mass[filled]
+            shift = np.max(np.linalg.norm(centroids - self.points, axis=1))
+            self.points = centroids
+            if shift < tolerance:
+                break
+        logging.info(f"Lloyd relaxation: {iteration} iterations, last shift {shift:.5f}")
+        return iteration
 
     def get_region_centers(self):
         """Calcola i centri (centroidi) delle regioni di Voronoi."""
@@ -79,18 +197,13 @@ class Tessellation:
         plt.xlim(0, self.width)
         plt.ylim(0, self.height)
         plt.gca().set_aspect('equal')
-        plt.savefig("voronoi_tessellation.png")
+        plt.savefig(PLOT_FILES['voronoi'])
 
     def apply_grid(self):
         """Apply a grid tessellation to the terrain."""
         width, height = self.terrain.get_dimensions()
-        x_coords = np.arange(0, width, self.grid_size)
-        y_coords = np.arange(0, height, self.grid_size)
-
-        for x in x_coords:
-            for y in y_coords:
-                square = self.create_square(x, y)
-                self.squares.append(square)
+        self.grid_index = GridIndex(width, height, self.grid_size, self.priority_matrix)
+        self.squares = self.grid_index.squares()
 
     def plot_grid(self):
         """Plot the grid tessellation."""
@@ -106,27 +219,8 @@ class Tessellation:
         return self.squares
 
     def get_grid_centers(self):
-        """Calculate and return the center points of the grid squares."""
-        self.centers = []  # Clear the list of centers
-        n_squares = len(self.squares)
-        for i in range(n_squares):
-
-            x_center = (self.squares[i][0][0] + self.squares[i][2][0]) / 2
-            y_center = (self.squares[i][0][1] + self.squares[i][2][1]) / 2
-            print(x_center, y_center)
-
-            col = i // 6
-            if col % 2 == 0:
-                row = 5 - (i % 6)
-
-            else:
-                row = i % 6
-
-            priority_value = self.priority_matrix[row][col]
-            center = [x_center, y_center, 4-priority_value, 0, 0, 0, 1]
-            self.centers.append(center)
-
-        print(self.centers)
+        """Calculate and return the center points of the grid squares, the altitude is 4 - priority."""
+        self.centers = self.grid_index.waypoints().tolist()
         return self.centers
 
     def plot_centers(self, ax):
@@ -155,22 +249,29 @@ class Tessellation:
         return [(x, y), (x + self.grid_size, y), (x + self.grid_size, y + self.grid_size), (x, y + self.grid_size)]
 
 
-def apply_tessellation(terrain, priority_matrix):
-    """Apply tessellation to the given terrain."""
-
-    # Voronoi
-    tessellation_voronoi = Tessellation(terrain, 40, 1, priority_matrix)
-    vor = tessellation_voronoi.generate_voronoi()
-    tessellation_voronoi.clipped_regions = tessellation_voronoi.clip_voronoi(vor)
-    tessellation_voronoi.plot_voronoi()
+def apply_tessellation(terrain, priority_matrix, kind=TESSELLATION, plots=TESSELLATION_PLOTS):
+    """
+    Apply the selected tessellation ('grid' or 'voronoi') to the given terrain.
 
-    # regular
+    Only the selected tessellation is built. Its diagnostic plot is rendered by a worker process with
+    plots='background', or skipped with plots='off' (it can be rendered later with save_tessellation_plot).
+    """
     grid_size = 1
-    tessellation_regular = Tessellation(terrain, 40, grid_size, priority_matrix)
-    tessellation_regular.apply_grid()
-    tessellation_regular.plot_grid()
-    squares = tessellation_regular.get_grid_squares()
-    logging.info(f"Grid squares: {squares}")
-    centers = tessellation_regular.get_grid_centers()
-    logging.info(f"Grid centers: {centers}")
-    return tessellation_regular, tessellation_voronoi
+    width, height = terrain.get_dimensions()
+    if kind == 'voronoi':
+        tessellation = Tessellation(terrain, 40, grid_size, priority_matrix)
+        if LLOYD_ITERATIONS > 0:
+            tessellation.lloyd_relaxation(LLOYD_ITERATIONS)
+        tessellation.clipped_regions = tessellation.clip_voronoi()
+        tessellation.get_region_centers()
+        # the sensed classes are still stored on the regular grid
+        tessellation.grid_index = GridIndex(width, height, grid_size, priority_matrix)
+    else:
+        tessellation = Tessellation(terrain, 40, grid_size, priority_matrix)
+        tessellation.apply_grid()
+        tessellation.get_grid_centers()
+    logging.debug(f"Tessellation centers: {tessellation.centers}")
+
+    if plots == 'background':
+        plot_in_background(tessellation, kind)
+    return tessellation
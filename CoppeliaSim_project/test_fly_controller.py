@@ -0,0 +1,44 @@
+import numpy as np
+
+from CoppeliaSim_project.benchmarks import create_swarm, lattice_offsets
+from CoppeliaSim_project.fly_controller import FlyController, formation_distance_matrix
+
+
+def test_sparse_formation_matches_dense():
+    # drones start 30 m apart, farther than dist_max: the graph comes from the desired distances, not the positions
+    sim, drones = create_swarm(16, spacing=30.0)
+    offsets = lattice_offsets(16)
+    dense = FlyController(sim, drones)
+    sparse_fc = FlyController(sim, drones, sparse_mode=True)
+    converted = FlyController(sim, drones, sparse_mode=True)
+    for fc in (dense, sparse_fc, converted):
+        fc.dist_max = 1.5  # lattice neighbours and diagonals only
+
+    targets = dense.formation_control(0.0001, formation_distance_matrix(offsets), 0)
+    assert np.allclose(sparse_fc.formation_control(0.0001, formation_distance_matrix(offsets, 1.5), 0), targets)
+    # a dense matrix is converted once and gives the same graph
+    assert np.allclose(converted.formation_control(0.0001, formation_distance_matrix(offsets), 0), targets)
+    assert sparse_fc.matrix_adj.nnz == np.count_nonzero(dense.matrix_adj) > 0
+
+
+def test_incremental_laplacian_matches_rebuild():
+    sim, drones = create_swarm(20)
+    offsets = lattice_offsets(20)
+    desired = formation_distance_matrix(offsets)
+    fc = FlyController(sim, drones)
+    fc.incremental_drone_limit = 2
+    fc.matrix_interdrones_distance = desired
+    fc.update_matrices('f')
+    fc.update_matrices('f')  # nothing moved
+    for drone, shift in ((drones[3], 0.3), (drones[11], -0.2)):
+        x, y, z = sim.getObjectPosition(drone.target_handle, sim.handle_world)
+        sim.setObjectPosition(drone.target_handle, [x + shift, y - shift, z], sim.handle_world)
+    fc.update_matrices('f')
+    assert fc.topology_cache_stats() == {'hits': 1, 'incremental': 1, 'misses': 1}
+
+    rebuilt = FlyController(sim, drones)
+    rebuilt.matrix_interdrones_distance = desired
+    rebuilt.update_matrices('f')
+    for name in ('matrix_adj', 'matrix_delta', 'matrix_laplacian', 'matrix_norm'):
+        assert np.allclose(getattr(fc, name), getattr(rebuilt, name)), name
+    assert np.isclose(fc.spectral_radius_bound(), rebuilt.spectral_radius_bound())
@@ -0,0 +1,28 @@
+import numpy as np
+
+from CoppeliaSim_project.tessellation import Tessellation, TerrainDimensions
+
+
+def priority_field(n=6):
+    """Priority matrix of a 6 x 6 terrain, high priority (1) in the left third and low (3) elsewhere."""
+    matrix = np.full((n, n), 3)
+    matrix[:, :n // 3] = 1  # matrix columns run along X
+    return matrix.tolist()
+
+
+def test_lloyd_relaxation_without_iterations():
+    np.random.seed(0)
+    tessellation = Tessellation(TerrainDimensions(6, 6), 40, 1, priority_field())
+    assert tessellation.lloyd_relaxation(0) == 0
+    assert tessellation.points.shape == (40, 2)
+
+
+def test_lloyd_relaxation_follows_priorities():
+    np.random.seed(0)
+    tessellation = Tessellation(TerrainDimensions(6, 6), 40, 1, priority_field())
+    iterations = tessellation.lloyd_relaxation(30)
+    assert 1 <= iterations <= 30
+    points = tessellation.points
+    assert np.all((points >= 0) & (points <= 6))
+    # smaller regions where the priority is high: the left third holds more than a third of the points
+    assert np.count_nonzero(points[:, 0] < 2) > len(points) / 3
@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from CoppeliaSim_project.config import N_DRONES, TRAJECTORY_CHUNK_RECORDS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAJECTORY_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'data', 'trajectories'))
+
+
+def record_dtype(n_drones=N_DRONES):
+    """Fixed layout of the record of one simulation frame."""
+    return np.dtype([
+        ('frame', np.uint32),
+        ('time', np.float64),  # simulation time
+        ('positions', np.float32, (n_drones, 3)),
+        ('formation_error', np.float32),
+        ('sub_steps', np.uint16),  # formation control iterations of the frame
+        ('sensor', np.float32, (n_drones,)),  # reading taken at the end of the frame, NaN if none
+        ('cell', np.int16, (n_drones, 2)),  # cell (ix, iy) the reading was stored in, -1 if none
+    ])
+
+
+def new_run_id():
+    return time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+
+
+class TrajectoryRecorder:
+    """
+    Append-only recorder of the frames of a mission, in a memory-mapped binary file per run.
+
+    The file grows by chunks of chunk_records records and only the chunk being written is mapped, so the memory
+    used does not depend on the length of the run. A JSON file next to it holds the record layout and the number
+    of records, updated at every chunk and when the run is closed.
+    """
+
+    def __init__(self, run_id=None, n_drones=N_DRONES, directory=TRAJECTORY_DIR,
+                 chunk_records=TRAJECTORY_CHUNK_RECORDS):
+        self.run_id = run_id or new_run_id()
+        self.n_drones = n_drones
+        self.dtype = record_dtype(n_drones)
+        self.chunk_records = chunk_records
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, f'{self.run_id}.bin')
+        self.meta_path = os.path.join(directory, f'{self.run_id}.json')
+        open(self.data_path, 'wb').close()
+        self.count = 0
+        self.chunk = None  # memmap of the chunk being written
+        self.chunk_start = 0  # index of its first record
+        self.save_meta(finished=False)
+
+    def map_chunk(self):
+        """Flush the full chunk and map the next one, growing the file."""
+        if self.chunk is not None:
+            self.chunk.flush()
+            del self.chunk
+        self.chunk_start = self.count
+        self.chunk = np.memmap(self.data_path, dtype=self.dtype, mode='r+',
+                               offset=self.chunk_start * self.dtype.itemsize, shape=(self.chunk_records,))
+        self.save_meta(finished=False)
+
+    def record_frame(self, sim_time, positions, formation_error=0.0, sub_steps=0):
+        """Append the record of a simulation frame, positions = [[x, y, z], ...] of every drone."""
+        if self.chunk is None or self.count - self.chunk_start == self.chunk_records:
+            self.map_chunk()
+        record = self.chunk[self.count - self.chunk_start]
+        record['frame'] = self.count
+        record['time'] = sim_time
+        record['positions'] = positions
+        record['formation_error'] = formation_error
+        record['sub_steps'] = sub_steps
+        record['sensor'] = np.nan
+        record['cell'] = -1
+        self.count += 1
+
+    def record_reading(self, drone_index, value, cell=None):
+        """Attach a sensor reading of one drone to the last frame."""
+        if self.count == 0:
+            return
+        record = self.chunk[self.count - 1 - self.chunk_start]
+        record['sensor'][drone_index] = value
+        if cell is not None:
+            record['cell'][drone_index] = cell
+
+    def save_meta(self, finished):
+        meta = {'run_id': self.run_id, 'n_drones': self.n_drones, 'dtype': self.dtype.descr, 'count': self.count,
+                'finished': finished}
+        temp_path = self.meta_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self.meta_path)
+
+    def close(self):
+        """Flush the last chunk and cut the file to the records written."""
+        if self.chunk is not None:
+            self.chunk.flush()
+            del self.chunk
+            self.chunk = None
+        with open(self.data_path, 'r+b') as f:
+            f.truncate(self.count * self.dtype.itemsize)
+        self.save_meta(finished=True)
+
+
+def list_runs(directory=TRAJECTORY_DIR):
+    """Metadata of the recorded runs, most recent first."""
+    if not os.path.isdir(directory):
+        return []
+    runs = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                runs.append(json.load(f))
+    return runs
+
+
+def open_trajectory(run_id, directory=TRAJECTORY_DIR):
+    """Map the records of a run read-only, nothing is loaded until the records are accessed."""
+    with open(os.path.join(directory, f'{run_id}.json')) as f:
+        meta = json.load(f)
+    dtype = np.dtype([tuple(field) for field in meta['dtype']])
+    if meta['count'] == 0:
+        return meta, np.zeros(0, dtype=dtype)
+    return meta, np.memmap(os.path.join(directory, f'{run_id}.bin'), dtype=dtype, mode='r', shape=(meta['count'],))
+
+
+def trajectory_slice(records, start=None, end=None, max_points=None):
+    """
+    Records with start <= time <= end, downsampled to at most max_points evenly spaced records.
+
+    The frames are in time order, so the range is found with a binary search on the mapped file and only the
+    selected records are read.
+    """
+    times = records['time']
+    first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+    last = len(records) if end is None else int(np.searchsorted(times, end, side='right'))
+    step = 1
+    if max_points and last - first > max_points:
+        step = math.ceil((last - first) / max_points)
+    return np.array(records[first:last:step])
+
+
+def records_to_dict(records):
+    """Columns of the records as JSON-friendly lists, NaN readings become None."""
+    columns = {}
+    for name in records.dtype.names:
+        values = records[name]
+        if values.dtype.kind == 'f':
+            values = values.astype(np.float64).astype(object)
+            values[np.isnan(records[name])] = None
+        columns[name] = values.tolist()
+    return columns
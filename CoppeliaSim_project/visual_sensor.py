@@ -1,10 +1,67 @@
+import math
+
+import numpy as np
 from colormath.color_objects import sRGBColor, HSVColor
 from colormath.color_conversions import convert_color
 
+from CoppeliaSim_project.config import SENSOR_MODE
+from CoppeliaSim_project.terrain import get_current_terrain
+
+# Hue intervals [deg] of the terrain classes, checked in this order (see VisualSensor.read_sensor)
+HUE_CLASSES = [(93, 110, 1), (67, 93, 2), (37, 67, 3)]
+N_CLASSES = 4  # class 0 collects the pixels whose colour does not belong to any terrain class
+LUT_BITS = 6  # bits per channel of the quantized RGB -> class lookup table
+
+class_lut = None
+
+
+def rgb_to_hue(rgb):
+    """Hue in degrees of an array of RGB colours in [0, 1], same convention as colormath's HSVColor."""
+    rgb = np.asarray(rgb, dtype=float)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    var_max = rgb.max(axis=-1)
+    var_min = rgb.min(axis=-1)
+    delta = np.where(var_max > var_min, var_max - var_min, 1)
+    hue = np.where(var_max == r, (60 * (g - b) / delta + 360) % 360,
+                   np.where(var_max == g, 60 * (b - r) / delta + 120, 60 * (r - g) / delta + 240))
+    return np.where(var_max > var_min, hue, 0)
+
+
+def classify_hue(hue):
+    """Terrain class of each hue value, 0 if the hue does not belong to any class."""
+    classes = np.zeros(np.shape(hue), dtype=np.uint8)
+    for low, high, terrain_class in reversed(HUE_CLASSES):
+        # reversed so that the first matching interval wins, like the if-elif chain
+        classes[(hue >= low) & (hue <= high)] = terrain_class
+    return classes
+
+
+def get_class_lut():
+    """Build once the table giving the terrain class of every quantized RGB colour."""
+    global class_lut
+    if class_lut is None:
+        levels = 2 ** LUT_BITS
+        # centre of each quantization bin
+        values = (np.arange(levels) + 0.5) / levels
+        r, g, b = np.meshgrid(values, values, values, indexing='ij')
+        class_lut = classify_hue(rgb_to_hue(np.stack((r, g, b), axis=-1))).ravel()
+    return class_lut
+
+
+def classify_image(image):
+    """Per-class pixel histogram of an RGB byte image (array of shape (..., 3), dtype uint8)."""
+    pixels = np.asarray(image, dtype=np.uint8).reshape(-1, 3) >> (8 - LUT_BITS)
+    index = (pixels[:, 0].astype(np.intp) << (2 * LUT_BITS)) | (pixels[:, 1].astype(np.intp) << LUT_BITS) \
+        | pixels[:, 2]
+    return np.bincount(get_class_lut()[index], minlength=N_CLASSES)
+
 
 class VisualSensor:
-    def __init__(self, sim):
+    def __init__(self, sim, mode=SENSOR_MODE):
         self.sim = sim
+        # 'average': classify the average colour of the image, 'image': classify every pixel of a single render,
+        # 'virtual': classify the average colour of the terrain field under the sensor, without rendering
+        self.mode = mode
         self.bit_coded_options = [
             1,  # Sensor will be explicitly handled (data measured only when manually requested)
             1,  # Sensor is in perspective operative mode
@@ -47,7 +104,58 @@ class VisualSensor:
         self.handle_sensor = self.sim.createVisionSensor(self.sensor_options, self.sensor_int_param,
                                                          self.sensor_float_param)
 
+    def read_image(self):
+        """Render the sensor once and return its RGB image as an array of shape (resY, resX, 3)."""
+        if hasattr(self.sim, 'read_vision_image'):
+            # render and image transfer in a single request through the SimBridge
+            image, resolution = self.sim.read_vision_image(self.handle_sensor)
+        else:
+            self.sim.handleVisionSensor(self.handle_sensor)
+            image, resolution = self.sim.getVisionSensorImg(self.handle_sensor)
+        return np.frombuffer(image, dtype=np.uint8).reshape(resolution[1], resolution[0], 3)
+
+    def read_sensor_histogram(self):
+        """
+        Classify every pixel of a single render (of the terrain field in 'virtual' mode).
+
+        Returns the dominant terrain class and the histogram of the pixels per class (index 0 counts the pixels
+        with a colour out of every class).
+        """
+        image = self.virtual_footprint_colors() if self.mode == 'virtual' else self.read_image()
+        histogram = classify_image(image)
+        if histogram[1:].sum() == 0:
+            print("too strange color found: ")
+            return (image.reshape(-1, 3).mean(axis=0) / 255).tolist(), histogram
+        return int(np.argmax(histogram[1:]) + 1), histogram
+
+    def virtual_footprint_colors(self):
+        """Terrain field colours under the sensor, sampled at the sensor resolution over its ground footprint."""
+        terrain = get_current_terrain()
+        position = self.sim.getObjectPosition(self.handle_sensor, self.sim.handle_world)
+        half_size = max(position[2] * math.tan(self.sensor_float_param[2] / 2), 1e-3)
+        return terrain.footprint_colors(position[0], position[1], half_size, self.sensor_int_param[0])
+
+    def read_virtual_sensor(self):
+        """
+        Compute the reading from the ground truth terrain field instead of rendering.
+
+        The footprint of the sensor on the ground is given by its altitude and view angle, the field colours are
+        sampled over it at the sensor resolution and their average is classified like the rendered average colour.
+        """
+        rgb = self.virtual_footprint_colors().reshape(-1, 3).mean(axis=0) / 255
+        terrain_class = int(classify_hue(rgb_to_hue(rgb)))
+        if terrain_class == 0:
+            print("too strange color found: ")
+            return rgb.tolist()
+        return terrain_class
+
     def read_sensor(self):
+        if self.mode == 'image':
+            terrain_class, histogram = self.read_sensor_histogram()
+            return terrain_class
+        if self.mode == 'virtual':
+            return self.read_virtual_sensor()
+
         # Read the state of the vision sensor and return the detected data
         detection_count, aux_packet, aux_packet2 = self.sim.handleVisionSensor(self.handle_sensor)
 
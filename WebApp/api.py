@@ -1,8 +1,12 @@
 # api.py
+import atexit
 import json
 import os
 import threading
 
+from CoppeliaSim_project import config
+from WebApp.telemetry import TelemetryStream
+
 file_lock = threading.Lock()
 
 def ensure_directory_exists(file_path):
@@ -36,52 +40,87 @@ def get_priority_matrix(file_path):
             
 # api.js
 # api.py
-from threading import Lock
 
 file_path = "simulation_end.txt"
 
-# Assicuriamoci che il file esista con un valore predefinito
-if not os.path.exists(file_path):
-    with open(file_path, "w") as file:
-        file.write("False")  # Valore predefinito
+# Posizioni dei droni e fine della simulazione in memoria: il ciclo di controllo le pubblica senza lock e senza
+# scrivere su disco, i file simulation_end.txt e coordinates.txt sono salvati da un thread a parte.
+# Sono creati da start_telemetry alla prima scrittura o all'avvio del server, non all'import del modulo.
+store = None
+# Telemetria della missione in memoria, inviata ai client dallo stream /telemetry-stream
+telemetry = None
+snapshot_writer = None
+telemetry_lock = threading.Lock()
+
+
+def start_telemetry():
+    """Crea la telemetria in memoria e avvia il thread dei salvataggi alla prima chiamata, restituisce lo stream."""
+    global store, telemetry, snapshot_writer
+    with telemetry_lock:
+        if telemetry is None:
+            from WebApp.telemetry_store import SnapshotWriter, TelemetryStore
+            store = TelemetryStore(shared_name=config.TELEMETRY_SHARED_MEMORY)
+            if config.TELEMETRY_SHARED_MEMORY is not None:
+                atexit.register(store.close, unlink=True)
+            telemetry = TelemetryStream(store)
+            # senza intervallo (processi dei job) i file della pagina web non vengono scritti
+            if config.TELEMETRY_SNAPSHOT_INTERVAL is not None:
+                # Assicuriamoci che il file esista con un valore predefinito
+                if not os.path.exists(file_path):
+                    with open(file_path, "w") as file:
+                        file.write("False")  # Valore predefinito
+                snapshot_writer = SnapshotWriter(store, save_snapshot, config.TELEMETRY_SNAPSHOT_INTERVAL)
+                snapshot_writer.start()
+    return telemetry
+
 
-# Lock per sincronizzare l'accesso alla variabile
-simulation_end_lock = Lock()
+def set_simulation_end(value, grid=None):
+    start_telemetry()
+    store.ended = value
+    if snapshot_writer is not None:
+        snapshot_writer.flush()  # la fine della simulazione va su disco subito
+    print(f"simulation_end è stato impostato a: {value}")
+    if value:
+        telemetry.publish_end(grid)
 
-def set_simulation_end(value):
-    with simulation_end_lock:
-        # Scriviamo il valore nel file
-        with open(file_path, "w") as file:
-            file.write(str(value))  # Salviamo il valore come stringa
-        print(f"simulation_end è stato impostato a: {value}")
+def publish_cells(ix, iy, nx, ny, value):
+    """Invia ai client la classe decisa per un blocco di celle."""
+    start_telemetry().publish_cells(ix, iy, nx, ny, value)
 
 def get_simulation_end():
-    with simulation_end_lock:
-        # Leggiamo il valore dal file
-        with open(file_path, "r") as file:
-            value = file.read().strip()  # Rimuoviamo eventuali spazi bianchi
-        return value.lower() == 'true'  # Converto la stringa in un valore booleano
-
-list1_lock = Lock()
-list2_lock = Lock()
-list3_lock = Lock()
-
-# Le liste da modificare
-list1 = [0.0, 0.0, 0.]
-list2 = [0.0, 0.0, 0.0]
-list3 = [0.0, 0.0, 0.0]
+    if store is None:
+        return False
+    return store.ended
+
+def reset_mission():
+    """Azzera la telemetria prima di una nuova simulazione."""
+    start_telemetry()
+    store.ended = False
+    telemetry.reset()
+    if snapshot_writer is not None:
+        snapshot_writer.flush()
+
 # Nome del file in cui salviamo le liste
 file_name = "coordinates.txt"
 
+def write_file(path, text):
+    """Scrive il file in modo atomico, chi lo legge non vede mai un file scritto a metà."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
 def save_coordinates_to_file(list1, list2, list3):
     """
     Salva le coordinate in un file di testo.
     """
-    with open(file_name, "w") as file:
-        # Scriviamo ogni lista su una riga separata
-        file.write("list1: " + str(list1) + "\n")
-        file.write("list2: " + str(list2) + "\n")
-        file.write("list3: " + str(list3) + "\n")
+    # Scriviamo ogni lista su una riga separata
+    write_file(file_name, "list1: " + str(list1) + "\n" + "list2: " + str(list2) + "\n" + "list3: " + str(list3) + "\n")
+
+def save_snapshot(positions, ended):
+    """Salva su disco lo stato della telemetria (chiamata dal thread dei salvataggi)."""
+    save_coordinates_to_file(*positions.tolist())
+    write_file(file_path, str(ended))
 
 def load_coordinates_from_file():
     """
@@ -102,21 +141,25 @@ def load_coordinates_from_file():
 
 def set_coordinates(lista1, lista2, lista3):
     """
-    Funzione che salva le tre liste in un file di testo in modo thread-safe.
+    Pubblica le posizioni dei tre droni, chiamata dal ciclo di controllo (unico scrittore).
 
     :param lista1: Lista di 3 float da aggiornare
     :param lista2: Lista di 3 float da aggiornare
     :param lista3: Lista di 3 float da aggiornare
     """
-    with list1_lock, list2_lock, list3_lock:
-        # Salviamo le nuove liste nel file
-        save_coordinates_to_file(lista1, lista2, lista3)
+    if store is None:
+        start_telemetry()
+    store.write((lista1, lista2, lista3))
 
 def get_coordinates():
     """
-    Funzione che legge le tre liste dal file di testo in modo thread-safe.
     Restituisce i valori correnti di list1, list2 e list3.
+    Prima che la simulazione pubblichi delle posizioni sono lette dal file di testo.
     """
-    with list1_lock, list2_lock, list3_lock:
-        list1, list2, list3 = load_coordinates_from_file()
-        return list1, list2, list3
\ No newline at end of file
+    if store is None:
+        return load_coordinates_from_file()
+    version, positions = store.read()
+    if version == 0:
+        return load_coordinates_from_file()
+    list1, list2, list3 = positions.tolist()
+    return list1, list2, list3
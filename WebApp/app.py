@@ -1,22 +1,26 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory
 import os
 import threading
 import json
 import sys
 from os.path import abspath, dirname
-import matplotlib
 
-from CoppeliaSim_project.main import main
-from CoppeliaSim_project.main_tractors import main_tractors
+# only the configuration is imported here: the simulation stack (matplotlib, scipy, shapely, the ZMQ client, ...)
+# is loaded by load_simulation_stack when the first mission starts, so the web server is up in a fraction of the time
+from CoppeliaSim_project.config import SIM_BACKEND, PREWARM_SIMULATION, TELEMETRY_PUSH_HZ, SIM_ENDPOINTS, \
+    SURVEY_MODE
 
-matplotlib.use('TkAgg')
 # Aggiungi il percorso di CoppeliaSim_project a sys.path
 sys.path.append(abspath(dirname(__file__) + '/../coppeliasim_project'))
 
 # Importa la funzione main dal file main.py per avviare la simulazione di CoppeliaSim
 
 
-import api
+# stesso modulo importato dalla simulazione, così la telemetria in memoria è condivisa
+from WebApp import api
+from WebApp.mission_store import MissionStore
+from WebApp.result_cache import ResultCache, mission_key
+from WebApp.scheduler import MissionScheduler
 
 app = Flask(__name__)
 
@@ -39,6 +43,17 @@ simulation_running = threading.Event()
 simulation_tractors_thread = None
 simulation_tractors_running = threading.Event()
 
+# Coda delle missioni richieste tramite /jobs, eseguite in parallelo sui simulatori di SIM_ENDPOINTS
+scheduler = MissionScheduler(SIM_ENDPOINTS)
+SURVEY_MODES = ('single', 'swath', 'quadtree')
+
+def load_simulation_stack():
+    """Import the simulation entry points, the first call loads every heavy dependency."""
+    from CoppeliaSim_project.main import main
+    from CoppeliaSim_project.main_tractors import main_tractors
+    return main, main_tractors
+
+
 def ensure_directory_exists(file_path):
     """Crea la directory per il file se non esiste."""
     directory = os.path.dirname(file_path)
@@ -67,7 +82,10 @@ def save_priorities():
         return jsonify({'error': 'Nessuna priorità fornita'}), 400
     priorities = data['priorities']
     save_matrix(priorities)
-    start_simulation()
+    response, status = start_simulation()
+    if status == 200 and response.get_json().get('cached'):
+        # risultato già calcolato per lo stesso campo: la pagina lo riceve subito
+        return response, status
     return jsonify({'status': 'Matrice ricevuta con successo'}), 200
 
 @app.route('/deploy-tractors', methods=['POST'])
@@ -78,8 +96,18 @@ def deploy_tractors():
 
 @app.route('/start-simulation', methods=['POST'])
 def start_simulation():
+    global simulation_thread
+
+    # the backend can be chosen per request: ?backend=headless or {"backend": "headless"}
+    data = request.get_json(silent=True) or {}
+    backend = request.args.get('backend', data.get('backend', SIM_BACKEND))
+    if backend not in ('coppeliasim', 'headless'):
+        return jsonify({'error': f'Backend non supportato: {backend}'}), 400
+
+    if simulation_running.is_set():
+        return jsonify({'error': 'La simulazione è già in esecuzione'}), 400
 
-    # reset all the info saved inside the .txt files
+    # reset all the info saved inside the .txt files, only once no mission is running
     with open("simulation_end.txt", "w") as file:
         file.write("False")  # Valore predefinito
     with open("coordinates.txt", "w") as file:
@@ -88,27 +116,70 @@ def start_simulation():
         file.write("list2: " + str([0,0,0]) + "\n")
         file.write("list3: " + str([0,0,0]) + "\n")
 
-    global simulation_thread
+    api.reset_mission()
+
     print(\
         "Avvio della simulazione. Attendere qualche minuto per il completamento della simulazione.")
 
-    if simulation_running.is_set():
-        return jsonify({'error': 'La simulazione è già in esecuzione'}), 400
+    # stesso campo, stesse impostazioni: il risultato in cache è servito subito, ?force=1 rilancia la simulazione
+    force = request.args.get('force', data.get('force', False)) in (True, 1, '1', 'true')
+    cache_key = mission_key(api.get_priority_matrix(FILE_PATH), backend, SURVEY_MODE)
+    cached = None if force else lookup_cached_result(cache_key)
+    if cached is not None:
+        grid, run_id = cached
+        publish_cached_result(grid, run_id)
+        return jsonify({'status': 'Risultato della stessa missione già disponibile', 'cached': True, 'run_id': run_id,
+                        'trajectory': f'/trajectory/{run_id}' if run_id else None}), 200
 
     def run_simulation():
         try:
-            simulation_running.set()
-            main()
+            main, _ = load_simulation_stack()
+            result = main(backend)
+            if result is not None:
+                store_cached_result(cache_key, result)
         except Exception as e:
             print(f"Errore durante l'esecuzione della simulazione: {e}")
         finally:
             simulation_running.clear()
 
+    # set here and not in the thread, so a second request arriving right after this one is already refused
+    simulation_running.set()
     # Avvia un thread per la simulazione
     simulation_thread = threading.Thread(target=run_simulation, daemon=True)
     simulation_thread.start()
     return jsonify({'status': 'Simulazione avviata con successo'}), 200
 
+def lookup_cached_result(cache_key):
+    """Risultato in cache per la chiave della missione (matrice elaborata, id della traiettoria), None se assente."""
+    cache = ResultCache()
+    try:
+        return cache.get(cache_key)
+    finally:
+        cache.close()
+
+
+def store_cached_result(cache_key, result):
+    cache = ResultCache()
+    try:
+        cache.put(cache_key, result['grid'], result['run_id'])
+    finally:
+        cache.close()
+
+
+def publish_cached_result(grid, run_id):
+    """Pubblica un risultato in cache come se la simulazione fosse appena terminata."""
+    from CoppeliaSim_project.trajectory_recorder import open_trajectory
+    api.save_matrix_processed(FILE_PATH_PROCESSED, grid)
+    try:
+        # ultime posizioni dei droni registrate nella traiettoria
+        _, records = open_trajectory(run_id)
+        if len(records):
+            api.set_coordinates(*records[-1]['positions'].tolist())
+    except (FileNotFoundError, TypeError):
+        pass
+    api.set_simulation_end(True, grid)
+
+
 @app.route('/start-tractors', methods=['POST'])
 def start_tractors():
 
@@ -120,6 +191,7 @@ def start_tractors():
     def run_tractors():
         try:
             simulation_tractors_running.set()
+            _, main_tractors = load_simulation_stack()
             main_tractors()
         except Exception as e:
             print(f"Errore durante l'esecuzione della simulazione: {e}")
@@ -167,6 +239,18 @@ def get_processed_matrix():
                 return jsonify({'error': 'Nessuna matrice elaborata disponibile'}), 404
   
             
+@app.route('/telemetry-stream', methods=['GET'])
+def telemetry_stream():
+    """
+    Stream server-sent events della missione: 'positions' dei droni, 'cells' classificate, 'start'/'end' della
+    missione e 'snapshot' dello stato per i client nuovi o rimasti indietro. ?rate= limita gli invii al secondo.
+    """
+    rate = request.args.get('rate', TELEMETRY_PUSH_HZ, type=float)
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(api.start_telemetry().follow(rate, last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/get-texture', methods=['GET'])
 def get_texture():
     """Endpoint per restituire l'immagine texture.png."""
@@ -180,6 +264,137 @@ def get_texture():
         return jsonify({'error': 'File texture.png non trovato'}), 404
 
 
+@app.route('/get-tessellation-plot/<kind>', methods=['GET'])
+def get_tessellation_plot(kind):
+    """Endpoint per restituire il grafico della tassellazione ('grid' o 'voronoi') disegnato in background."""
+    file_names = {'voronoi': 'voronoi_tessellation.png', 'grid': 'grid_tessellation.png'}
+    if kind not in file_names:
+        return jsonify({'error': f'Tassellazione non supportata: {kind}'}), 400
+    plot_path = os.path.join(BASE_DIR, file_names[kind])
+    if os.path.exists(plot_path):
+        return send_from_directory(BASE_DIR, file_names[kind])
+    else:
+        return jsonify({'error': f'File {file_names[kind]} non trovato'}), 404
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Accoda una missione: {"matrix": [[...]], "survey_mode": "single"}. Senza matrice si usa quella salvata.
+    Restituisce l'id del job, il suo stato si legge da /jobs/<id>.
+    """
+    data = request.get_json(silent=True) or {}
+    survey_mode = data.get('survey_mode', 'single')
+    if survey_mode not in SURVEY_MODES:
+        return jsonify({'error': f'Modalità non supportata: {survey_mode}'}), 400
+    matrix = data.get('matrix')
+    if matrix is None:
+        matrix = api.get_priority_matrix(FILE_PATH)
+        if matrix is None:
+            return jsonify({'error': 'Nessuna matrice delle priorità disponibile'}), 400
+    job_id = scheduler.submit(matrix, survey_mode)
+    return jsonify({'job_id': job_id, 'status': f'/jobs/{job_id}', 'result': f'/jobs/{job_id}/result'}), 202
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Endpoint per lo stato di tutti i job."""
+    return jsonify(scheduler.list())
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Endpoint per lo stato di un job: queued (con la posizione in coda), running, done o failed."""
+    status = scheduler.status(job_id)
+    if status is None:
+        return jsonify({'error': f'Job {job_id} non trovato'}), 404
+    return jsonify(status)
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Endpoint per il risultato di un job terminato: matrice elaborata, frame e id della traiettoria."""
+    status = scheduler.status(job_id)
+    if status is None:
+        return jsonify({'error': f'Job {job_id} non trovato'}), 404
+    if status['state'] != 'done':
+        return jsonify({'error': f'Job {job_id} non terminato', 'state': status['state']}), 409
+    result = scheduler.result(job_id)
+    if result is None:
+        return jsonify({'error': f'Risultato del job {job_id} non trovato'}), 404
+    return jsonify(result)
+
+
+@app.route('/missions', methods=['GET'])
+def list_missions():
+    """
+    Endpoint per l'elenco delle missioni, dalla più recente: ?since= e ?until= (timestamp) selezionano l'intervallo,
+    ?input_hash= le missioni sullo stesso campo, ?limit= e ?offset= la pagina. Le matrici non sono incluse.
+    """
+    store = MissionStore()
+    try:
+        missions = store.list(request.args.get('since', type=float), request.args.get('until', type=float),
+                              request.args.get('input_hash'), min(request.args.get('limit', 100, type=int), 1000),
+                              request.args.get('offset', 0, type=int))
+        return jsonify({'total': store.count(), 'missions': missions})
+    finally:
+        store.close()
+
+
+@app.route('/missions/<mission_id>', methods=['GET'])
+def get_mission(mission_id):
+    """Endpoint per una missione: priorità, matrice elaborata, tempi e riferimento alla traiettoria."""
+    store = MissionStore()
+    try:
+        mission = store.get(mission_id)
+    finally:
+        store.close()
+    if mission is None:
+        return jsonify({'error': f'Missione {mission_id} non trovata'}), 404
+    return jsonify(mission)
+
+
+@app.route('/missions/compare', methods=['GET'])
+def compare_missions():
+    """Endpoint per confrontare due missioni: ?first=<id>&second=<id>, restituisce le celle diverse."""
+    store = MissionStore()
+    try:
+        comparison = store.compare(request.args.get('first'), request.args.get('second'))
+    finally:
+        store.close()
+    if comparison is None:
+        return jsonify({'error': 'Missioni non trovate o senza risultato'}), 404
+    return jsonify(comparison)
+
+
+@app.route('/trajectories', methods=['GET'])
+def get_trajectories():
+    """Endpoint per l'elenco delle missioni registrate (id, numero di frame, missione terminata)."""
+    from CoppeliaSim_project.trajectory_recorder import list_runs
+    return jsonify([{'run_id': run['run_id'], 'count': run['count'], 'finished': run['finished']}
+                    for run in list_runs()])
+
+
+@app.route('/trajectory/<run_id>', methods=['GET'])
+def get_trajectory(run_id):
+    """
+    Endpoint per il replay di una missione: ?start= e ?end= (tempo di simulazione) selezionano l'intervallo,
+    ?max_points= lo sottocampiona. Il file è mappato in memoria, sono letti solo i frame restituiti.
+    """
+    # numpy è caricato solo alla prima richiesta, non all'avvio del server
+    from CoppeliaSim_project.trajectory_recorder import open_trajectory, trajectory_slice, records_to_dict
+    if not run_id.replace('-', '').isalnum():
+        return jsonify({'error': f'Missione non valida: {run_id}'}), 400
+    try:
+        meta, records = open_trajectory(run_id)
+    except FileNotFoundError:
+        return jsonify({'error': f'Missione {run_id} non trovata'}), 404
+    selected = trajectory_slice(records, request.args.get('start', type=float), request.args.get('end', type=float),
+                                request.args.get('max_points', type=int))
+    return jsonify({'run_id': run_id, 'count': meta['count'], 'finished': meta['finished'],
+                    'returned': len(selected), 'frames': records_to_dict(selected)})
+
+
 @app.route('/stop-drones', methods=['POST'])
 def stop_drones():
     """Stops the drones and shuts down the simulation."""
@@ -202,5 +417,12 @@ def shutdown():
 
 
 if __name__ == '__main__':
+    api.start_telemetry()
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # i job rimasti in coda alla chiusura precedente ripartono, solo nel processo del server e non nel reloader
+        scheduler.resume()
+    if PREWARM_SIMULATION:
+        # carica la simulazione in background mentre il server risponde già alle richieste
+        threading.Thread(target=load_simulation_stack, daemon=True).start()
     # Avvia il server Flask sul thread principale
     app.run(debug=True)
@@ -0,0 +1,68 @@
+"""Import-time budget of the web server, measured with `python -X importtime`."""
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # La cartella 'WebApp'
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, '..'))
+
+# maximum import time the web server module adds to a bare `import flask`, as a fraction of the flask import: both
+# slow down together on a loaded machine, so the check measures the module and not the load
+IMPORT_BUDGET_RATIO = 0.5
+BASELINE_MODULE = 'flask'
+RUNS = 3  # the fastest of RUNS imports is kept, the others are disturbed by the machine
+# packages of the simulation stack, they must be loaded only when a mission starts
+HEAVY_PACKAGES = ('numpy', 'matplotlib', 'scipy', 'shapely', 'colormath', 'networkx', 'PIL',
+                  'coppeliasim_zmqremoteapi_client')
+
+
+def measure_import_time(module='app'):
+    """
+    Import module in a fresh interpreter with -X importtime.
+
+    Returns the cumulative import time in microseconds of every module imported, by name.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, env.get('PYTHONPATH')]))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=BASE_DIR, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Import di {module} fallito:\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+def fastest_import_ms(module, runs=RUNS):
+    """Fastest of runs imports of module in fresh interpreters, in ms, with the timings of that run."""
+    timings = min((measure_import_time(module) for _ in range(runs)), key=lambda timings: timings[module])
+    return timings[module] / 1000, timings
+
+
+def check_import_budget(module='app', ratio=IMPORT_BUDGET_RATIO, baseline=BASELINE_MODULE):
+    """
+    Check that module adds at most ratio times the import time of baseline and imports no simulation package,
+    print a report.
+    """
+    baseline_ms, _ = fastest_import_ms(baseline)
+    total_ms, timings = fastest_import_ms(module)
+    added_ms = total_ms - baseline_ms
+    budget_ms = ratio * baseline_ms
+    heavy = sorted(name for name in timings if name.split('.')[0] in HEAVY_PACKAGES)
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[1:6]
+    print(f"import {module}: {total_ms:.0f} ms, {added_ms:.0f} ms over import {baseline} ({baseline_ms:.0f} ms, "
+          f"budget {budget_ms:.0f} ms), {len(timings)} modules")
+    for name, cumulative in slowest:
+        print(f"    {name}: {cumulative / 1000:.0f} ms")
+    if heavy:
+        print(f"Moduli pesanti importati all'avvio: {', '.join(heavy[:10])}")
+    return added_ms <= budget_ms and not heavy
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check_import_budget() else 1)
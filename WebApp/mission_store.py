@@ -0,0 +1,188 @@
+# mission_store.py
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # La cartella 'WebApp'
+MISSIONS_DB_PATH = os.path.abspath(os.path.join(BASE_DIR, '..', 'data', 'missions.db'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS missions (
+    id TEXT PRIMARY KEY,  -- run id, also the name of the trajectory file
+    started REAL NOT NULL,
+    finished REAL NOT NULL,
+    state TEXT NOT NULL,  -- 'done' or 'failed'
+    input_hash TEXT NOT NULL,
+    priorities TEXT NOT NULL,
+    terrain_seed INTEGER,
+    tessellation TEXT,
+    survey_mode TEXT,
+    planner TEXT,
+    backend TEXT,
+    result TEXT,
+    frames INTEGER,
+    timings TEXT,
+    trajectory TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS missions_started ON missions (started);
+CREATE INDEX IF NOT EXISTS missions_input_hash ON missions (input_hash, started);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,  -- also the id of the mission run by the job
+    state TEXT NOT NULL,  -- 'queued', 'running', 'done' or 'failed'
+    survey_mode TEXT NOT NULL,
+    priorities TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    endpoint TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, submitted);
+"""
+
+# columns returned when listing missions, the matrices are left out
+SUMMARY_COLUMNS = ('id', 'started', 'finished', 'state', 'input_hash', 'terrain_seed', 'tessellation', 'survey_mode',
+                   'planner', 'backend', 'frames', 'trajectory')
+JSON_COLUMNS = ('priorities', 'result', 'timings')
+JOB_COLUMNS = ('id', 'state', 'survey_mode', 'submitted', 'started', 'finished', 'endpoint', 'error')
+
+
+def input_hash(priorities, terrain_seed, tessellation):
+    """Hash of the inputs of a mission: missions with the same hash surveyed the same field."""
+    key = json.dumps({'priorities': priorities, 'terrain_seed': terrain_seed, 'tessellation': tessellation},
+                     sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class MissionStore:
+    """
+    Every mission run, in a SQLite database indexed by start time and by input hash.
+
+    Listing returns summaries only, so thousands of runs can be browsed without loading their matrices. The
+    mission requests queued by the scheduler are kept in the jobs table, so they survive a restart of the server.
+    """
+
+    def __init__(self, path=None):
+        path = path or MISSIONS_DB_PATH  # read at every call, the scheduler workers can point it elsewhere
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")  # the web app reads while the missions write
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, mission_id, started, priorities, terrain_seed, tessellation, survey_mode, planner, backend,
+            result=None, frames=None, timings=None, trajectory=None, error=None, finished=None):
+        """Store a mission, failed if it has no result."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO missions (id, started, finished, state, input_hash, priorities, terrain_seed, "
+                "tessellation, survey_mode, planner, backend, result, frames, timings, trajectory, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (mission_id, started, finished or time.time(), 'done' if result is not None else 'failed',
+                 input_hash(priorities, terrain_seed, tessellation), json.dumps(priorities), terrain_seed,
+                 tessellation, survey_mode, planner, backend, json.dumps(result) if result is not None else None,
+                 frames, json.dumps(timings) if timings is not None else None, trajectory, error))
+
+    def list(self, since=None, until=None, input_hash=None, limit=100, offset=0):
+        """Summaries of the missions started in [since, until], most recent first."""
+        conditions, parameters = [], []
+        if since is not None:
+            conditions.append("started >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("started <= ?")
+            parameters.append(until)
+        if input_hash is not None:
+            conditions.append("input_hash = ?")
+            parameters.append(input_hash)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self.connection.execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM missions {where}ORDER BY started DESC LIMIT ? OFFSET ?",
+            parameters + [limit, offset]).fetchall()
+        return [dict(zip(SUMMARY_COLUMNS, row)) for row in rows]
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM missions").fetchone()[0]
+
+    def get(self, mission_id):
+        """Whole record of a mission, None if it is unknown."""
+        cursor = self.connection.execute("SELECT * FROM missions WHERE id = ?", (mission_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        mission = dict(zip([column[0] for column in cursor.description], row))
+        for column in JSON_COLUMNS:
+            if mission[column] is not None:
+                mission[column] = json.loads(mission[column])
+        return mission
+
+    def compare(self, first_id, second_id):
+        """Cells where the results of two missions differ, as [ix, iy, first value, second value]."""
+        first, second = self.get(first_id), self.get(second_id)
+        if first is None or second is None or first['result'] is None or second['result'] is None:
+            return None
+        differences = [[ix, iy, a, b]
+                       for ix, (column_a, column_b) in enumerate(zip(first['result'], second['result']))
+                       for iy, (a, b) in enumerate(zip(column_a, column_b)) if a != b]
+        return {'first': first_id, 'second': second_id, 'same_input': first['input_hash'] == second['input_hash'],
+                'differences': differences}
+
+    def add_job(self, job_id, priorities, survey_mode, submitted=None):
+        """Store a queued mission request."""
+        with self.connection:
+            self.connection.execute("INSERT INTO jobs (id, state, survey_mode, priorities, submitted) "
+                                    "VALUES (?, 'queued', ?, ?, ?)",
+                                    (job_id, survey_mode, json.dumps(priorities), submitted or time.time()))
+
+    def update_job(self, job_id, state, **fields):
+        """Change the state of a job and the fields given (started, finished, endpoint, error)."""
+        columns = [column for column in fields if column in JOB_COLUMNS[4:]]
+        assignments = ''.join(f", {column} = ?" for column in columns)
+        with self.connection:
+            self.connection.execute(f"UPDATE jobs SET state = ?{assignments} WHERE id = ?",
+                                    [state] + [fields[column] for column in columns] + [job_id])
+
+    def get_job(self, job_id):
+        """State of a job, with the number of jobs queued before it; None if it is unknown."""
+        row = self.connection.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?",
+                                      (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        job['position'] = None
+        if job['state'] == 'queued':
+            job['position'] = self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = 'queued' AND submitted < ?", (job['submitted'],)).fetchone()[0]
+        return job
+
+    def list_jobs(self, limit=100):
+        """States of the most recent jobs."""
+        rows = self.connection.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs ORDER BY submitted DESC LIMIT ?",
+                                       (limit,)).fetchall()
+        return [dict(zip(JOB_COLUMNS, row)) for row in rows]
+
+    def unfinished_jobs(self):
+        """Jobs queued or running, with their priority matrix, oldest first."""
+        rows = self.connection.execute("SELECT id, survey_mode, priorities FROM jobs "
+                                       "WHERE state IN ('queued', 'running') ORDER BY submitted").fetchall()
+        return [{'id': job_id, 'survey_mode': survey_mode, 'matrix': json.loads(priorities)}
+                for job_id, survey_mode, priorities in rows]
+
+
+def record_mission(**mission):
+    """Store a mission in the default database, errors are only reported: the mission result is already saved."""
+    try:
+        store = MissionStore()
+        try:
+            store.add(**mission)
+        finally:
+            store.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Errore durante il salvataggio della missione: {e}")
@@ -0,0 +1,90 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from CoppeliaSim_project import config
+from CoppeliaSim_project.config import RESULT_CACHE_MAX_ENTRIES
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # La cartella 'WebApp'
+RESULT_CACHE_PATH = os.path.abspath(os.path.join(BASE_DIR, '..', 'data', 'result_cache.db'))
+
+# settings that change the result of a mission or its recorded trajectory, part of the cache key; the terrain
+# generator itself is hard-coded in terrain.py, its changes are tracked by TERRAIN_VERSION
+RESULT_SETTINGS = ('N_DRONES', 'GRID_SIZE', 'TOLERANCE', 'DRONE_VELOCITY', 'SUB_DIVIDER', 'ADAPTIVE_SUB_STEPS',
+                   'MAX_SUB_STEPS', 'SPARSE_FORMATION', 'SENSOR_MODE', 'PATH_PLANNER', 'TESSELLATION',
+                   'LLOYD_ITERATIONS', 'QUADTREE_HOMOGENEITY', 'QUADTREE_MAX_ALTITUDE', 'RANDOM_SEED', 'TEXTURE_SIZE',
+                   'TERRAIN_VERSION')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    run_id TEXT,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+"""
+
+
+def mission_key(priorities, backend, survey_mode):
+    """
+    Content hash of everything a mission result depends on: the priority matrix, the backend and survey mode, and
+    the terrain, tessellation, planner and controller settings. None if the terrain is not seeded, as every
+    mission then surveys a different field.
+    """
+    if config.RANDOM_SEED is None:
+        return None
+    inputs = {'priorities': priorities, 'backend': backend, 'survey_mode': survey_mode,
+              'settings': {name: getattr(config, name) for name in RESULT_SETTINGS}}
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Mission results by content hash, in a SQLite database with least-recently-used eviction.
+
+    At most max_entries results are kept; a result refers to the recorded trajectory of the mission by its run id.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, key):
+        """Cached result of key and its run id, None on a miss. A hit makes the entry the most recently used."""
+        if key is None:
+            return None
+        with self.connection:
+            row = self.connection.execute("SELECT result, run_id FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                                    (time.time(), key))
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, result, run_id=None):
+        """Store a result and evict the least recently used entries over the cap."""
+        if key is None:
+            return
+        now = time.time()
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO results (key, result, run_id, created, last_used) "
+                                    "VALUES (?, ?, ?, ?, ?)", (key, json.dumps(result), run_id, now, now))
+            self.connection.execute("DELETE FROM results WHERE key IN (SELECT key FROM results "
+                                    "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
@@ -0,0 +1,148 @@
+# scheduler.py
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+
+from WebApp import mission_store
+from WebApp.mission_store import MissionStore, MISSIONS_DB_PATH
+
+
+def run_job(endpoint, job):
+    """
+    Run the mission of a job and return its result.
+
+    The priority matrix is passed to the mission and no file of the web page is written (processed matrix,
+    texture, coordinates, end flag), so the missions never share a file; the result is returned and stored in the
+    mission database under the job id.
+    """
+    from CoppeliaSim_project.main import main
+    return main(endpoint, job['survey_mode'], run_id=job['id'], processed_path=None, priority_matrix=job['matrix'],
+                texture_path=None)
+
+
+def endpoint_worker(endpoint, jobs, events, store_path=MISSIONS_DB_PATH):
+    """
+    Process serving the missions of one simulator endpoint, one at a time.
+
+    Jobs are taken from the queue shared by all the endpoints, so a free simulator always picks the next one.
+    The simulation stack is imported once per process, not once per mission; the missions are recorded in the
+    database at store_path.
+    """
+    mission_store.MISSIONS_DB_PATH = store_path
+    # set before the simulation stack is imported: the positions of a job stay in the memory of its process (a
+    # shared memory block has a single writer), coordinates.txt and the tessellation plots of the web page are not
+    # overwritten
+    from CoppeliaSim_project import config
+    config.TELEMETRY_SHARED_MEMORY = None
+    config.TELEMETRY_SNAPSHOT_INTERVAL = None
+    config.TESSELLATION_PLOTS = 'off'
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        events.put((job['id'], 'running', {'endpoint': endpoint, 'started': time.time()}))
+        try:
+            result = run_job(endpoint, job)
+            if result is None:
+                events.put((job['id'], 'failed', {'error': 'Missione interrotta, vedi il log del simulatore',
+                                                  'finished': time.time()}))
+            else:
+                events.put((job['id'], 'done', {'finished': time.time()}))
+        except Exception as e:
+            traceback.print_exc()
+            events.put((job['id'], 'failed', {'error': str(e), 'finished': time.time()}))
+
+
+class MissionScheduler:
+    """
+    Queue of mission requests dispatched over a pool of simulator endpoints.
+
+    Each endpoint ('headless', 'coppeliasim' or 'host:port' of a CoppeliaSim instance) is served by a worker
+    process, so several missions run in parallel and the others wait in the queue. Job states are kept in the jobs
+    table of the mission database, updated by a collector thread, and the result of a job is the mission stored
+    under its id: a restart of the server loses neither. Jobs left queued or running are queued again by start().
+    """
+
+    def __init__(self, endpoints, store_path=MISSIONS_DB_PATH):
+        self.endpoints = list(endpoints)
+        self.store_path = store_path  # mission database, shared with the missions run by the workers
+        self.store = None  # opened by the first call, not when the web app is imported
+        self.lock = threading.Lock()
+        self.context = multiprocessing.get_context('spawn')
+        self.queue = self.context.Queue()
+        self.events = self.context.Queue()
+        self.workers = []
+
+    def open_store(self):
+        """Mission database of the scheduler (lock held)."""
+        if self.store is None:
+            self.store = MissionStore(self.store_path)
+        return self.store
+
+    def start(self):
+        """Start a worker process per endpoint and the collector thread, the first call only."""
+        with self.lock:
+            if self.workers:
+                return
+            # jobs of a previous run of the server, interrupted ones start again
+            for job in self.open_store().unfinished_jobs():
+                self.store.update_job(job['id'], 'queued', started=None, endpoint=None)
+                self.queue.put(job)
+            for endpoint in self.endpoints:
+                worker = self.context.Process(target=endpoint_worker,
+                                              args=(endpoint, self.queue, self.events, self.store_path),
+                                              daemon=True, name=f"simulator-{endpoint}")
+                worker.start()
+                self.workers.append(worker)
+        threading.Thread(target=self.collect, daemon=True, name="scheduler-collector").start()
+
+    def resume(self):
+        """Start the workers if jobs of a previous run are still waiting."""
+        with self.lock:
+            pending = bool(self.open_store().unfinished_jobs())
+        if pending:
+            self.start()
+
+    def submit(self, matrix, survey_mode):
+        """Queue a mission, return its job id."""
+        self.start()
+        job_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.open_store().add_job(job_id, matrix, survey_mode)
+        self.queue.put({'id': job_id, 'matrix': matrix, 'survey_mode': survey_mode})
+        return job_id
+
+    def collect(self):
+        """Apply the state changes reported by the workers."""
+        while True:
+            job_id, state, fields = self.events.get()
+            with self.lock:
+                self.store.update_job(job_id, state, **fields)
+
+    def status(self, job_id):
+        """Job state with its position in the queue, None for an unknown id."""
+        with self.lock:
+            return self.open_store().get_job(job_id)
+
+    def result(self, job_id):
+        """Result of a finished job: sensed grid, number of frames and id of the recorded trajectory."""
+        with self.lock:
+            mission = self.open_store().get(job_id)
+        if mission is None or mission['result'] is None:
+            return None
+        return {'grid': mission['result'], 'frames': mission['frames'], 'run_id': mission['trajectory']}
+
+    def list(self):
+        with self.lock:
+            return self.open_store().list_jobs()
+
+    def shutdown(self):
+        """Let the workers finish the running missions and stop."""
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
@@ -1,80 +1,168 @@
 import json
 import time
-import threading
+import multiprocessing
 import os
+import sys
+import tempfile
+
+from WebApp.work_queue import WorkQueue
 
 # Percorso dei file
 FILE_PATH = os.path.join('data', 'matrices.json')
-PROCESSED_FILE_PATH = os.path.join('data', 'processed_matrices.json')
-file_lock = threading.Lock()
+PROCESSED_FILE_PATH = os.path.join('data', 'processed_matrices.jsonl')  # una riga JSON per matrice elaborata
+QUEUE_PATH = os.path.join('data', 'matrices_queue.db')  # coda delle matrici da elaborare e risultati
+N_WORKERS = max(os.cpu_count() or 1, 1)
+BATCH_SIZE = 32  # matrici prese dalla coda per ogni transazione
+MAX_IDLE_SLEEP = 1.0  # attesa massima tra due controlli della coda vuota
+SYNC_INTERVAL = 1.0  # secondi tra due letture di matrices.json e due esportazioni dei risultati
+
+
+def transpose_matrix(matrix):
+    return [list(row) for row in zip(*matrix)]
 
 def process_matrix(matrix):
     # Funzione fittizia per elaborare la matrice
     print("Elaborazione della matrice:", matrix)
     # Aggiungi qui la logica di elaborazione
     # Ad esempio, calcoliamo la trasposta
-    transposed = [list(row) for row in zip(*matrix)]
+    transposed = transpose_matrix(matrix)
     print("Matrice trasposta:", transposed)
     return transposed
 
-def read_and_process_matrices():
-    while True:
-        with file_lock:
-            try:
-                # Legge le matrici dal file
-                if not os.path.exists(FILE_PATH):
-                    # Se il file non esiste, aspetta e riprova
-                    time.sleep(1)
-                    continue
-
-                with open(FILE_PATH, 'r') as f:
-                    data = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                # Se il file non esiste o è vuoto, aspetta e riprova
-                time.sleep(1)
-                continue
+def load_json(file_path):
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
 
-            if not data:
-                # Se non ci sono matrici da processare, aspetta e riprova
-                time.sleep(1)
-                continue
+def is_json_queue(data):
+    # il file della web app contiene una sola matrice (lista di righe di numeri): non è una coda
+    return isinstance(data, list) and bool(data) and isinstance(data[0], list) and bool(data[0]) \
+        and isinstance(data[0][0], list)
 
-            # Prende la prima matrice dalla lista
-            matrix = data.pop(0)
+def import_json_queue(queue, file_path=FILE_PATH):
+    """
+    Sposta nella coda le matrici della lista del vecchio file JSON.
 
-            # Aggiorna il file con le matrici rimanenti
-            with open(FILE_PATH, 'w') as f:
-                json.dump(data, f)
+    Il file viene prima rinominato in modo atomico e poi letto: le matrici scritte nel frattempo dai produttori
+    finiscono in un nuovo matrices.json, letto al giro successivo, invece di essere cancellate.
+    """
+    draining_path = file_path + '.draining'
+    if not os.path.exists(draining_path):  # altrimenti un'importazione interrotta va prima completata
+        if not is_json_queue(load_json(file_path)):
+            return 0
+        try:
+            os.replace(file_path, draining_path)
+        except FileNotFoundError:
+            return 0
+    data = load_json(draining_path)
+    if not is_json_queue(data):
+        # la web app ha scritto la sua matrice tra la lettura e il rename: torna al suo posto se non è già stata
+        # riscritta
+        if os.path.exists(file_path):
+            os.remove(draining_path)
+        else:
+            os.replace(draining_path, file_path)
+        return 0
+    added = queue.enqueue(data)
+    os.remove(draining_path)
+    print(f" [x] {added} matrici spostate nella coda")
+    return added
 
-        # Elabora la matrice fuori dal blocco con il lock
-        result = process_matrix(matrix)
+def export_results(queue, file_path=PROCESSED_FILE_PATH, batch_size=1000):
+    """
+    Aggiunge in fondo a processed_matrices.jsonl i risultati nuovi della coda, una riga JSON per matrice.
 
-        # Salva il risultato in un altro file (opzionale)
-        save_processed_matrix(matrix, result)
+    Il file non viene mai riletto né riscritto. L'ultimo risultato esportato è salvato nella coda, così dopo un
+    riavvio si riparte da lì: solo un'interruzione tra la scrittura e il salvataggio ripete l'ultimo gruppo.
+    """
+    results = queue.results(queue.get_cursor(file_path), batch_size)
+    if not results:
+        return 0
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(file_path, 'a') as f:
+        f.writelines(json.dumps({'original': item['original'], 'result': item['result']}) + '\n'
+                     for item in results)
+    queue.set_cursor(file_path, results[-1]['id'])
+    print(f" [x] {len(results)} risultati aggiunti al file delle matrici elaborate")
+    return len(results)
 
-        # Attende un breve intervallo prima di controllare nuovamente
-        time.sleep(1)
+def worker(queue_path=QUEUE_PATH, process=process_matrix, batch_size=BATCH_SIZE, stop_when_empty=False):
+    """
+    Processo che elabora le matrici della coda a gruppi di batch_size.
 
-def save_processed_matrix(original, result):
-    with file_lock:
-        try:
-            # Legge le matrici elaborate esistenti dal file
-            with open(PROCESSED_FILE_PATH, 'r') as f:
-                processed_data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Se il file non esiste o è vuoto, inizializza una lista vuota
-            processed_data = []
-
-        # Aggiunge la matrice originale e il risultato
-        processed_data.append({
-            'original': original,
-            'result': result
-        })
-
-        # Salva la lista aggiornata nel file
-        with open(PROCESSED_FILE_PATH, 'w') as f:
-            json.dump(processed_data, f)
-        print(" [x] Risultato salvato nel file delle matrici elaborate")
+    Ogni risultato viene aggiunto alla tabella dei risultati senza riscrivere quelli precedenti; con la coda vuota
+    il processo aspetta sempre di più, fino a MAX_IDLE_SLEEP secondi.
+    """
+    queue = WorkQueue(queue_path)
+    name = f"{os.uname().nodename}-{os.getpid()}" if hasattr(os, 'uname') else str(os.getpid())
+    idle_sleep = 0.01
+    try:
+        while True:
+            items = queue.claim(name, batch_size)
+            if not items:
+                if stop_when_empty and queue.counts()['pending'] == 0:
+                    return
+                time.sleep(idle_sleep)
+                idle_sleep = min(idle_sleep * 2, MAX_IDLE_SLEEP)
+                continue
+            idle_sleep = 0.01
+            queue.complete([(item_id, matrix, process(matrix)) for item_id, matrix in items])
+    finally:
+        queue.close()
+
+def read_and_process_matrices(n_workers=N_WORKERS, queue_path=QUEUE_PATH):
+    """
+    Avvia n_workers processi che consumano la coda delle matrici.
+
+    Il processo principale continua a spostare nella coda le matrici aggiunte a matrices.json e a esportare i
+    risultati in processed_matrices.jsonl, ogni SYNC_INTERVAL secondi; i produttori possono anche usare direttamente
+    WorkQueue.enqueue.
+    """
+    queue = WorkQueue(queue_path)
+    import_json_queue(queue)
+    print(f" [x] Coda {queue_path}: {queue.counts()}, {n_workers} processi")
+    processes = [multiprocessing.Process(target=worker, args=(queue_path,)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    try:
+        while any(process.is_alive() for process in processes):
+            import_json_queue(queue)
+            while export_results(queue):
+                pass
+            time.sleep(SYNC_INTERVAL)
+    finally:
+        queue.close()
+
+def benchmark_throughput(n_items=5000, workers=(1, 2, 4), size=6):
+    """Misura le matrici elaborate al secondo dalla coda con diversi numeri di processi."""
+    matrix = [[(row * size + col) % 3 + 1 for col in range(size)] for row in range(size)]
+    results = {}
+    for n_workers in workers:
+        with tempfile.TemporaryDirectory() as directory:
+            queue_path = os.path.join(directory, 'queue.db')
+            queue = WorkQueue(queue_path)
+            queue.enqueue([matrix] * n_items)
+            start = time.perf_counter()
+            processes = [multiprocessing.Process(target=worker, args=(queue_path, transpose_matrix),
+                                                 kwargs={'stop_when_empty': True}) for _ in range(n_workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+            counts = queue.counts()
+            queue.close()
+        results[n_workers] = n_items / elapsed
+        print(f"{n_workers} processi: {n_items} matrici in {elapsed:.2f} s, {results[n_workers]:.0f} matrici/s "
+              f"({counts['done']} completate)")
+    return results
 
 if __name__ == '__main__':
-    read_and_process_matrices()
+    if '--benchmark' in sys.argv:
+        benchmark_throughput()
+    else:
+        read_and_process_matrices()
@@ -0,0 +1,110 @@
+# telemetry.py
+import json
+import threading
+import time
+from collections import deque
+
+from CoppeliaSim_project.config import TELEMETRY_PUSH_HZ, TELEMETRY_BUFFER_SIZE
+
+HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments on an idle stream
+
+
+def format_event(kind, data, event_id=None):
+    """Format a server-sent event."""
+    message = f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+    return f"id: {event_id}\n{message}" if event_id is not None else message
+
+
+class TelemetryStream:
+    """
+    In-memory feed of the mission telemetry for the web clients.
+
+    Cell classifications and mission start/end events are kept in a ring buffer with increasing ids. Drone
+    positions are read from the TelemetryStore of the control loop: only the latest ones are sent, each client
+    receives them at most once per push period.
+    A client that falls behind the ring buffer gets a snapshot of the whole grid instead of the lost events.
+    """
+
+    def __init__(self, store, capacity=TELEMETRY_BUFFER_SIZE):
+        self.store = store
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=capacity)  # (id, kind, data)
+        self.last_id = 0
+        self.cells = {}  # (ix, iy) -> class, every cell decided in the current mission
+        self.ended = False
+        self.grid = None  # final grid of the mission
+
+    def publish(self, kind, data):
+        with self.lock:
+            self.last_id += 1
+            self.events.append((self.last_id, kind, data))
+
+    def reset(self):
+        """Start a new mission: forget the cells and the end of the previous one."""
+        with self.lock:
+            self.cells = {}
+            self.ended = False
+            self.grid = None
+        self.publish('start', {})
+
+    def publish_cells(self, ix, iy, nx, ny, value):
+        """Announce the class of the block of cells [ix, ix + nx) x [iy, iy + ny)."""
+        with self.lock:
+            for i in range(ix, ix + nx):
+                for j in range(iy, iy + ny):
+                    self.cells[(i, j)] = value
+        self.publish('cells', {'ix': ix, 'iy': iy, 'nx': nx, 'ny': ny, 'value': value})
+
+    def publish_end(self, grid):
+        with self.lock:
+            self.ended = True
+            self.grid = grid
+        self.publish('end', {'grid': grid})
+
+    def snapshot(self):
+        """State of the mission for a client that lost events."""
+        cells = [{'ix': i, 'iy': j, 'value': value} for (i, j), value in self.cells.items()]
+        return {'cells': cells, 'ended': self.ended, 'grid': self.grid}
+
+    def follow(self, rate=TELEMETRY_PUSH_HZ, last_event_id=None):
+        """
+        Generate the server-sent events of one client, at most rate pushes per second.
+
+        Each push carries the latest positions (if they changed) and the buffered events the client has not seen.
+        """
+        period = 1.0 / max(rate, 0.1)
+        positions_seen = 0
+        last_write = time.monotonic()
+        yield "retry: 2000\n\n"
+        if last_event_id is None:
+            # a new client starts from the state of the current mission
+            with self.lock:
+                cursor = self.last_id
+                snapshot = self.snapshot()
+            yield format_event('snapshot', snapshot, cursor)
+        else:
+            cursor = last_event_id
+        while True:
+            with self.lock:
+                oldest = self.events[0][0] if self.events else self.last_id + 1
+                if cursor + 1 < oldest:
+                    # the client fell behind the ring buffer: coalesce the lost events in a snapshot
+                    pending = [(self.last_id, 'snapshot', self.snapshot())]
+                else:
+                    pending = [event for event in self.events if event[0] > cursor]
+                cursor = self.last_id
+
+            messages = [format_event(kind, data, event_id) for event_id, kind, data in pending]
+            positions_version, positions = self.store.read()
+            if positions_version != positions_seen:
+                x, y, z = positions.T.tolist()
+                messages.append(format_event('positions', {'x': x, 'y': y, 'z': z}))
+                positions_seen = positions_version
+            if messages:
+                yield "".join(messages)
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write >= HEARTBEAT_INTERVAL:
+                # keep-alive, it also detects the clients that went away
+                yield ": heartbeat\n\n"
+                last_write = time.monotonic()
+            time.sleep(period)
@@ -0,0 +1,114 @@
+# telemetry_store.py
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HEADER_SLOTS = 2  # uint64 slots before the positions: sequence number, simulation end flag
+
+
+class TelemetryStore:
+    """
+    Latest drone positions and end of the mission, written by the control loop and read by any thread.
+
+    There is a single writer, so no lock is taken: the writer makes the sequence number odd, writes the positions
+    and makes it even again (seqlock); readers retry when the number is odd or changed during their copy. The store
+    can live in a multiprocessing.shared_memory block, so that another process can attach to it by name.
+    """
+
+    def __init__(self, n_drones=3, shared_name=None):
+        size = (HEADER_SLOTS + n_drones * 3) * 8
+        self.shm = None
+        if shared_name is None:
+            buffer = bytearray(size)
+        else:
+            try:
+                self.shm = shared_memory.SharedMemory(name=shared_name, create=True, size=size)
+            except FileExistsError:
+                # block left by a previous run, reused as it is
+                self.shm = shared_memory.SharedMemory(name=shared_name)
+            buffer = self.shm.buf
+        self.header = np.ndarray((HEADER_SLOTS,), dtype=np.uint64, buffer=buffer)
+        self.positions = np.ndarray((n_drones, 3), dtype=np.float64, buffer=buffer, offset=HEADER_SLOTS * 8)
+
+    @classmethod
+    def attach(cls, shared_name, n_drones=3):
+        """Open the store created by another process."""
+        store = cls.__new__(cls)
+        store.shm = shared_memory.SharedMemory(name=shared_name)
+        store.header = np.ndarray((HEADER_SLOTS,), dtype=np.uint64, buffer=store.shm.buf)
+        store.positions = np.ndarray((n_drones, 3), dtype=np.float64, buffer=store.shm.buf,
+                                     offset=HEADER_SLOTS * 8)
+        return store
+
+    def write(self, points):
+        """Publish the positions [[x, y, z], ...] of the drones (control loop only)."""
+        sequence = self.header[0]
+        self.header[0] = sequence + 1  # odd: write in progress
+        self.positions[:] = points
+        self.header[0] = sequence + 2
+
+    def read(self):
+        """Return (version, positions copy), version 0 means no positions were written yet."""
+        while True:
+            sequence = int(self.header[0])
+            if sequence % 2 == 0:
+                positions = self.positions.copy()
+                if int(self.header[0]) == sequence:
+                    return sequence // 2, positions
+            time.sleep(0)
+
+    @property
+    def version(self):
+        return int(self.header[0]) // 2
+
+    @property
+    def ended(self):
+        return bool(self.header[1])
+
+    @ended.setter
+    def ended(self, value):
+        self.header[1] = 1 if value else 0
+
+    def close(self, unlink=False):
+        """Release the shared memory block, unlink it in the process that created it."""
+        if self.shm is not None:
+            # the views must go before the buffer can be released
+            del self.header, self.positions
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+            self.shm = None
+
+
+class SnapshotWriter(threading.Thread):
+    """
+    Background thread saving the store to disk with write(positions, ended), at most once per interval.
+
+    Nothing is written while the store does not change; flush() asks for an immediate write.
+    """
+
+    def __init__(self, store, write, interval):
+        super().__init__(daemon=True, name="telemetry-snapshot")
+        self.store = store
+        self.write = write
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.saved = None  # (version, ended) on disk
+
+    def flush(self):
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            version, positions = self.store.read()
+            state = (version, self.store.ended)
+            if state != self.saved:
+                try:
+                    self.write(positions, state[1])
+                    self.saved = state
+                except OSError as e:
+                    print(f"Errore durante il salvataggio della telemetria: {e}")
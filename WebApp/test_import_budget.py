@@ -0,0 +1,6 @@
+from WebApp.import_budget import check_import_budget
+
+
+def test_web_server_import_budget():
+    # the web server must start without the simulation stack, see load_simulation_stack in app.py
+    assert check_import_budget()
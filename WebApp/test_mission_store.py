@@ -0,0 +1,29 @@
+from WebApp.mission_store import MissionStore, input_hash
+
+PRIORITIES = [[1, 2], [3, 1]]
+
+
+def add_mission(store, mission_id, started, priorities=PRIORITIES, result=None):
+    store.add(mission_id, started, priorities, terrain_seed=42, tessellation='grid', survey_mode='single',
+              planner='s_path', backend='headless', result=result, finished=started + 1)
+
+
+def test_time_range_and_hash_queries(tmp_path):
+    store = MissionStore(str(tmp_path / 'missions.db'))
+    add_mission(store, 'a', 100, result=[[1, 1], [2, 3]])
+    add_mission(store, 'b', 200, result=[[1, 2], [2, 3]])
+    add_mission(store, 'c', 300, priorities=[[3, 3], [3, 3]])
+
+    assert [mission['id'] for mission in store.list()] == ['c', 'b', 'a']
+    assert [mission['id'] for mission in store.list(since=150, until=300)] == ['c', 'b']
+    same_input = store.list(input_hash=input_hash(PRIORITIES, 42, 'grid'))
+    assert [mission['id'] for mission in same_input] == ['b', 'a']
+    assert 'result' not in same_input[0]  # summaries only
+
+    assert store.get('a')['result'] == [[1, 1], [2, 3]]
+    assert store.get('c')['state'] == 'failed'
+    assert store.get('unknown') is None
+    comparison = store.compare('a', 'b')
+    assert comparison['same_input'] and comparison['differences'] == [[0, 1, 1, 2]]
+    store.close()
+
@@ -0,0 +1,67 @@
+import json
+import time
+
+from CoppeliaSim_project import config
+from CoppeliaSim_project.config import SURVEY_MODE
+from WebApp import app as web_app
+from WebApp.result_cache import ResultCache, mission_key
+
+PRIORITIES = [[1, 2], [3, 1]]
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'), max_entries=2)
+    cache.put('a', [[1]], 'run-a')
+    time.sleep(0.02)
+    cache.put('b', [[2]])
+    time.sleep(0.02)
+    assert cache.get('a') == ([[1]], 'run-a')  # a is now the most recently used
+    time.sleep(0.02)
+    cache.put('c', [[3]])
+    assert cache.get('b') is None
+    assert len(cache) == 2 and cache.get('a') is not None and cache.get('c') is not None
+    cache.close()
+
+
+def test_mission_key(monkeypatch):
+    key = mission_key(PRIORITIES, 'headless', 'single')
+    assert key == mission_key(PRIORITIES, 'headless', 'single')
+    assert key != mission_key(PRIORITIES, 'coppeliasim', 'single')
+    monkeypatch.setattr(config, 'N_DRONES', config.N_DRONES + 1)
+    assert key != mission_key(PRIORITIES, 'headless', 'single')
+    # every mission surveys a different field without a seed: nothing is cached
+    monkeypatch.setattr(config, 'RANDOM_SEED', None)
+    assert mission_key(PRIORITIES, 'headless', 'single') is None
+
+
+def test_force_runs_a_cached_mission_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, 'RANDOM_SEED', 42)
+    monkeypatch.setattr(web_app, 'FILE_PATH', str(tmp_path / 'matrices.json'))
+    monkeypatch.setattr(web_app, 'FILE_PATH_PROCESSED', str(tmp_path / 'processed_matrices.json'))
+    monkeypatch.setattr(web_app, 'ResultCache', lambda: ResultCache(str(tmp_path / 'cache.db')))
+    runs = []
+
+    def fake_main(backend):
+        runs.append(backend)
+        return {'grid': [[len(runs)]], 'frames': 1, 'run_id': None}
+
+    monkeypatch.setattr(web_app, 'load_simulation_stack', lambda: (fake_main, None))
+    with open(web_app.FILE_PATH, 'w') as f:
+        json.dump(PRIORITIES, f)
+    client = web_app.app.test_client()
+
+    def start(query):
+        response = client.post('/start-simulation' + query)
+        assert response.status_code == 200
+        if not response.get_json().get('cached'):
+            web_app.simulation_thread.join(timeout=10)
+        return response.get_json()
+
+    assert 'cached' not in start('?backend=headless')
+    assert start('?backend=headless')['cached'] and runs == ['headless']
+    assert 'cached' not in start('?backend=headless&force=1') and len(runs) == 2
+    # the forced run replaced the cached result
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    assert cache.get(mission_key(PRIORITIES, 'headless', SURVEY_MODE))[0] == [[2]]
+    cache.close()
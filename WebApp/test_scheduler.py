@@ -0,0 +1,55 @@
+import time
+
+from WebApp.mission_store import MissionStore
+from WebApp.scheduler import MissionScheduler
+
+PRIORITIES = [[(row + col) % 3 + 1 for col in range(6)] for row in range(6)]
+
+
+def wait_for(scheduler, job_id, timeout=300):
+    """State of a job once it is no longer queued or running."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = scheduler.status(job_id)
+        if job['state'] in ('done', 'failed'):
+            return job
+        time.sleep(0.2)
+    raise TimeoutError(job_id)
+
+
+def test_job_states_in_the_store(tmp_path):
+    store = MissionStore(str(tmp_path / 'missions.db'))
+    store.add_job('first', PRIORITIES, 'single', submitted=1)
+    store.add_job('second', PRIORITIES, 'swath', submitted=2)
+    assert store.get_job('second')['position'] == 1
+
+    store.update_job('first', 'running', started=3, endpoint='headless')
+    assert store.get_job('second')['position'] == 0
+    assert [job['id'] for job in store.unfinished_jobs()] == ['first', 'second']
+
+    store.update_job('first', 'done', finished=4)
+    job = store.get_job('first')
+    assert (job['state'], job['endpoint'], job['position']) == ('done', 'headless', None)
+    assert [job['id'] for job in store.unfinished_jobs()] == ['second']
+    store.close()
+
+
+def test_interrupted_job_runs_after_a_restart(tmp_path):
+    store_path = str(tmp_path / 'missions.db')
+    # job left running by a previous server
+    store = MissionStore(store_path)
+    store.add_job('interrupted', PRIORITIES, 'single')
+    store.update_job('interrupted', 'running', started=time.time(), endpoint='headless')
+    store.close()
+
+    scheduler = MissionScheduler(['headless'], store_path=store_path)
+    try:
+        scheduler.resume()
+        job = wait_for(scheduler, 'interrupted')
+        assert job['state'] == 'done', job['error']
+        assert [job['id'] for job in scheduler.list()] == ['interrupted']
+        result = scheduler.result('interrupted')
+        assert len(result['grid']) == len(PRIORITIES) and result['frames'] > 0
+        assert scheduler.result('unknown') is None and scheduler.status('unknown') is None
+    finally:
+        scheduler.shutdown()
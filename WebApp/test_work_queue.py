@@ -0,0 +1,62 @@
+import json
+import os
+
+from WebApp.script_parallel import export_results, import_json_queue, worker
+from WebApp.work_queue import WorkQueue
+
+
+def test_claim_complete_and_cursor(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    assert queue.enqueue([[[1, 2]], [[3, 4]], [[5, 6]]]) == 3
+
+    # every item goes to one worker only, in queue order
+    first = queue.claim('a', batch_size=2)
+    second = queue.claim('b', batch_size=2)
+    assert [payload for _, payload in first] == [[[1, 2]], [[3, 4]]]
+    assert [payload for _, payload in second] == [[[5, 6]]]
+    assert queue.claim('c') == []
+    assert queue.counts() == {'pending': 0, 'running': 3, 'done': 0}
+
+    queue.complete([(item_id, payload, 'ok') for item_id, payload in first])
+    assert queue.counts() == {'pending': 0, 'running': 1, 'done': 2}
+    results = queue.results()
+    assert [result['original'] for result in results] == [[[1, 2]], [[3, 4]]]
+
+    # a reader resumes after the last result it has seen
+    assert queue.get_cursor('export') == 0
+    queue.set_cursor('export', results[-1]['id'])
+    queue.complete([(item_id, payload, 'ok') for item_id, payload in second])
+    assert [result['original'] for result in queue.results(queue.get_cursor('export'))] == [[[5, 6]]]
+    queue.close()
+
+
+def test_items_of_a_dead_worker_are_claimed_again(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'), claim_timeout=-1)
+    queue.enqueue([[[1]]])
+    (item_id, _), = queue.claim('dead')
+    assert queue.claim('alive') == [(item_id, [[1]])]
+    queue.close()
+
+
+def test_json_queue_import_and_export(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    matrices_path, processed_path = str(tmp_path / 'matrices.json'), str(tmp_path / 'processed.jsonl')
+    # a single matrix, as written by the web app, is not a queue and stays in place
+    with open(matrices_path, 'w') as f:
+        json.dump([[1, 2], [3, 4]], f)
+    assert import_json_queue(queue, matrices_path) == 0
+    assert os.path.exists(matrices_path)
+
+    with open(matrices_path, 'w') as f:
+        json.dump([[[1, 2], [3, 4]], [[5]]], f)
+    assert import_json_queue(queue, matrices_path) == 2
+    assert not os.path.exists(matrices_path)
+    worker(queue.path, stop_when_empty=True)
+
+    # results are appended once, one JSON line each
+    assert export_results(queue, processed_path) == 2
+    assert export_results(queue, processed_path) == 0
+    with open(processed_path) as f:
+        assert [json.loads(line) for line in f] == [{'original': [[1, 2], [3, 4]], 'result': [[1, 3], [2, 4]]},
+                                                     {'original': [[5]], 'result': [[5]]}]
+    queue.close()
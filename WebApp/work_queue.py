@@ -0,0 +1,122 @@
+# work_queue.py
+import json
+import os
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',  -- 'pending', 'running' or 'done'
+    worker TEXT,
+    claimed REAL,
+    enqueued REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_state ON items (state, id);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    name TEXT PRIMARY KEY,  -- reader of the results, e.g. an export to a file
+    last_id INTEGER NOT NULL  -- last result id it has seen
+);
+"""
+
+
+class WorkQueue:
+    """
+    Durable queue of JSON items in a SQLite database in WAL mode, shared by several worker processes.
+
+    Workers claim batches of pending items in a write transaction, so every item goes to one worker only, and
+    append their results in the results table: nothing already written is rewritten. Items claimed by a worker
+    that died are given back to the queue after claim_timeout seconds.
+    """
+
+    def __init__(self, path, claim_timeout=300):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.claim_timeout = claim_timeout
+        # autocommit mode: the transactions are opened explicitly
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # durable at every checkpoint, safe in WAL mode
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def enqueue(self, payloads):
+        """Append items to the queue, return the number of items added."""
+        now = time.time()
+        rows = [(json.dumps(payload), now) for payload in payloads]
+        with self.transaction():
+            self.connection.executemany("INSERT INTO items (payload, enqueued) VALUES (?, ?)", rows)
+        return len(rows)
+
+    def claim(self, worker, batch_size=1):
+        """Take up to batch_size pending items for worker, return [(item_id, payload), ...] in queue order."""
+        now = time.time()
+        with self.transaction():
+            self.connection.execute("UPDATE items SET state = 'pending', worker = NULL "
+                                    "WHERE state = 'running' AND claimed < ?", (now - self.claim_timeout,))
+            rows = self.connection.execute("SELECT id, payload FROM items WHERE state = 'pending' ORDER BY id "
+                                           "LIMIT ?", (batch_size,)).fetchall()
+            self.connection.executemany("UPDATE items SET state = 'running', worker = ?, claimed = ? WHERE id = ?",
+                                        [(worker, now, item_id) for item_id, _ in rows])
+        return [(item_id, json.loads(payload)) for item_id, payload in rows]
+
+    def complete(self, results):
+        """Store the results [(item_id, payload, result), ...] and mark their items done."""
+        now = time.time()
+        with self.transaction():
+            self.connection.executemany("INSERT INTO results (item_id, payload, result, finished) VALUES (?, ?, ?, ?)",
+                                        [(item_id, json.dumps(payload), json.dumps(result), now)
+                                         for item_id, payload, result in results])
+            self.connection.executemany("UPDATE items SET state = 'done' WHERE id = ?",
+                                        [(item_id,) for item_id, _, _ in results])
+
+    def counts(self):
+        """Number of items in each state."""
+        rows = self.connection.execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall()
+        return {'pending': 0, 'running': 0, 'done': 0, **dict(rows)}
+
+    def results(self, after_id=0, limit=100):
+        """Results appended after the result id after_id, oldest first."""
+        rows = self.connection.execute("SELECT id, item_id, payload, result, finished FROM results WHERE id > ? "
+                                       "ORDER BY id LIMIT ?", (after_id, limit)).fetchall()
+        return [{'id': result_id, 'item_id': item_id, 'original': json.loads(payload), 'result': json.loads(result),
+                 'finished': finished} for result_id, item_id, payload, result, finished in rows]
+
+    def get_cursor(self, name):
+        """Last result id seen by the reader name, 0 if it has seen none."""
+        row = self.connection.execute("SELECT last_id FROM cursors WHERE name = ?", (name,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def set_cursor(self, name, last_id):
+        with self.transaction():
+            self.connection.execute("INSERT OR REPLACE INTO cursors (name, last_id) VALUES (?, ?)", (name, last_id))
+
+    def transaction(self):
+        return Transaction(self.connection)
+
+
+class Transaction:
+    """Write transaction taken at the start (BEGIN IMMEDIATE), so that concurrent claims never deadlock."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False